@@ -1,12 +1,10 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, session, send_file
 import csv
-import subprocess
 import os
 import sys
 import uuid
 import logging
 import signal
-import datetime
 from werkzeug.utils import secure_filename
 from functools import lru_cache
 from threading import Thread
@@ -14,6 +12,18 @@ from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 import json
 import time
+from job_queue import JobQueue, PRIORITY_LEVELS, DEFAULT_PRIORITY
+from job_backend import create_backend
+from job_runtime import list_artifacts, JOBS_DIR, ARTIFACTS_SUBDIR, CANCELLED_EXIT_CODE
+from job_runner import run_automation_job, request_job_cancel, step_history, credential_pool, admission, AUTOMATION_LOG
+from job_admission import chain_gates, ADMISSION_ENABLED
+from job_concurrency import AIMDController, AIMD_ENABLED, AIMD_MAX_CONCURRENCY
+from job_retention import RetentionSweeper
+from portal_guard import portal_guard, job_gate
+from tenants import get_tenant, tenant_roster, list_tenants, DEFAULT_TENANT
+from roster import snapshot_personnel, load_roster, invalid_expiries, expiry_problem
+from permit_batches import split_personnel, new_batch_id, batch_report, PERMIT_CHUNK_SIZE
+from selector_cache import selector_report
 
 # Configure logging
 logging.basicConfig(
@@ -37,13 +47,18 @@ app.config.update(
     PERMANENT_SESSION_LIFETIME=3600  # 1 hour
 )
 
-# Thread pool for automation processes
-executor = ThreadPoolExecutor(max_workers=int(os.environ.get('MAX_WORKERS', 4)))
-current_process = None
+# Thread pool for automation processes (MAX_WORKERS is the starting limit with AIMD)
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 4))
+executor = ThreadPoolExecutor(max_workers=max(MAX_WORKERS, AIMD_MAX_CONCURRENCY) if AIMD_ENABLED else MAX_WORKERS)
+
+# Job queue storage: in-memory runs jobs here, a shared backend leaves them to worker.py
+job_backend = create_backend()
 
 def cleanup_resources():
     """Cleanup resources on shutdown."""
     try:
+        job_queue.stop()
+        retention_sweeper.stop()
         executor.shutdown(wait=True)
         logger.info("Resources cleaned up successfully")
     except Exception as e:
@@ -147,16 +162,17 @@ def read_csv_data(csv_path):
         logger.error(f"Error getting CSV data: {e}")
         return []
 
-def get_category_csv_path(category):
-    """Get CSV path for specific category."""
-    category_mapping = {
-        'ikh': 'personnel_list_ALL.csv',
-        'ikk-api': 'personnel_list_IA.csv',
-        'ikk-ruang-terbatas': 'personnel_list_IR.csv',
-        'ikk-ketinggian': 'personnel_list_IK.csv'
-    }
+def current_tenant():
+    """Get the tenant selected in this session."""
+    return session.get('tenant') or DEFAULT_TENANT
+
+def get_category_csv_path(category, tenant=None):
+    """Get the tenant's CSV path for a specific category."""
+    try:
+        csv_file = tenant_roster(tenant or current_tenant(), category)
+    except KeyError:
+        return None
     
-    csv_file = category_mapping.get(category)
     if csv_file and os.path.exists(csv_file):
         return csv_file
     return None
@@ -260,16 +276,15 @@ def upload():
         ensure_upload_dir()
         filename = secure_filename(file.filename)
         
-        # Handle category-specific uploads
-        if category in ['ikk-api', 'ikk-ruang-terbatas', 'ikk-ketinggian']:
-            category_mapping = {
-                'ikk-api': 'personnel_list_IA.csv',
-                'ikk-ruang-terbatas': 'personnel_list_IR.csv',
-                'ikk-ketinggian': 'personnel_list_IK.csv'
-            }
-            file_path = category_mapping[category]
-        elif category == 'ikh':
-            file_path = 'personnel_list_ALL.csv'
+        # Handle category-specific uploads (replace the tenant's roster)
+        roster = None
+        if category in ['ikh', 'ikk-api', 'ikk-ruang-terbatas', 'ikk-ketinggian']:
+            try:
+                roster = tenant_roster(current_tenant(), category)
+            except KeyError:
+                return jsonify({'status': 'error', 'message': f'Unknown tenant: {current_tenant()}'}), 400
+        if roster:
+            file_path = roster
         else:
             unique_name = f"{uuid.uuid4().hex}_{filename}"
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_name)
@@ -281,12 +296,40 @@ def upload():
         get_csv_files_cached.cache_clear()
         read_csv_data_cached.cache_clear()
         
-        return jsonify({'status': 'success', 'message': 'File uploaded successfully'})
+        # Parse and validate the roster now, so bad rows show up before a run
+        _, problems = load_roster(file_path)
+        message = 'File uploaded successfully'
+        if problems:
+            message += f' ({len(problems)} rows need attention)'
+        return jsonify({'status': 'success', 'message': message, 'problems': list(problems)})
             
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         return jsonify({'status': 'error', 'message': 'Upload failed'}), 500
 
+@app.route('/tenants', methods=['GET'])
+def get_tenants():
+    """List tenant profiles and the one selected in this session."""
+    try:
+        return jsonify({'status': 'success', 'tenants': list_tenants(), 'current': current_tenant()})
+    except ValueError as e:
+        logger.error(f"Error loading tenants: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/select_tenant', methods=['POST'])
+def select_tenant():
+    """Select the tenant whose rosters and company data are used."""
+    data = request.get_json()
+    tenant = data.get('tenant') if data else None
+    try:
+        get_tenant(tenant)
+    except KeyError as e:
+        return jsonify({'status': 'error', 'message': str(e.args[0])}), 400
+    session['tenant'] = tenant
+    session.pop('csv_path', None)
+    read_csv_data_cached.cache_clear()
+    return jsonify({'status': 'success', 'message': f'Tenant {tenant} selected'})
+
 @app.route('/select_csv', methods=['POST'])
 def select_csv():
     """Select CSV file."""
@@ -313,131 +356,35 @@ def select_csv():
 def clear_log_file():
     """Clear automation log file."""
     try:
-        open('automation.log', 'w').close()
+        open(AUTOMATION_LOG, 'w').close()
     except Exception:
         pass
 
-def run_automation_process(script_path, csv_path, selected_indices, selected_date, selected_shift, mode):
-    """Run automation process."""
-    global current_process
-    try:
-        env = os.environ.copy()
-        env['DISPLAY'] = os.environ.get('DISPLAY', ':0')
-        env['PLAYWRIGHT_HEADLESS'] = os.environ.get('PLAYWRIGHT_HEADLESS', 'true')
-        env['PYTHONUNBUFFERED'] = '1'
-        
-        # Build command based on script type
-        if 'ikk_automation.py' in script_path:
-            category_map = {
-                'IKK-API': 'IA',
-                'IKK-RUANG-TERBATAS': 'IR', 
-                'IKK-KETINGGIAN': 'IK'
-            }
-            category = category_map.get(mode, 'IA')
-            
-            # Use today's date if no selected_date provided
-            work_date = selected_date if selected_date else datetime.datetime.now().strftime('%d/%m/%Y')
-            
-            process_args = [
-                'python3', 
-                script_path, 
-                category,
-                work_date,
-                'MELTING REPAIR',
-                str(selected_shift or 1)
-            ]
-            if selected_indices and len(selected_indices) > 0:
-                process_args.extend([str(i) for i in selected_indices])
-        else:
-            # IKH script format
-            process_args = ['python3', script_path, csv_path]
-            
-            if selected_indices and len(selected_indices) > 0:
-                process_args.extend([str(i) for i in selected_indices])
-            
-            if selected_date:
-                process_args.append(f"--date={selected_date}")
-                
-            if selected_shift:
-                process_args.append(f"--shift={selected_shift}")
-        
-        logger.info(f"Starting {mode} automation with command: {' '.join(process_args)}")
-        
-        # Initialize log with detailed information
-        log_path = 'automation.log'
-        with open(log_path, 'w', encoding='utf-8') as log_file:
-            log_file.write(f"🚀 {mode} AUTOMATION STARTED\n")
-            log_file.write("="*50 + "\n")
-            log_file.write(f"📂 Category: {category if 'ikk_automation.py' in script_path else 'IKH'}\n")
-            log_file.write(f"📄 CSV File: {csv_path}\n")
-            log_file.write(f"📅 Date: {selected_date}\n")
-            log_file.write(f"⏰ Shift: {selected_shift}\n")
-            log_file.write(f"🔧 Script: {script_path}\n")
-            log_file.write(f"💻 Command: {' '.join(process_args)}\n")
-            log_file.write("="*50 + "\n\n")
-            log_file.flush()
-        
-        # Start process with line buffering for real-time output
-        with open(log_path, 'a', encoding='utf-8') as log_file:
-            current_process = subprocess.Popen(
-                process_args, 
-                stdout=log_file, 
-                stderr=subprocess.STDOUT, 
-                text=True, 
-                env=env,
-                bufsize=1,  # Line buffering for real-time output
-                universal_newlines=True
-            )
-            
-            try:
-                return_code = current_process.wait(timeout=1800)  # 30 minutes
-                
-                if return_code == 0:
-                    log_file.write(f"\n🎉 {mode} COMPLETED SUCCESSFULLY!\n")
-                    log_file.write("="*50 + "\n")
-                    log_file.write(f"✅ Process finished with exit code: {return_code}\n")
-                    log_file.write(f"⏰ Completion time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    log_file.write("="*50 + "\n")
-                else:
-                    log_file.write(f"\n❌ PROCESS FAILED!\n")
-                    log_file.write("="*50 + "\n")
-                    log_file.write(f"🔥 Exit code: {return_code}\n")
-                    log_file.write(f"⏰ Failure time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    log_file.write("="*50 + "\n")
-                    
-            except subprocess.TimeoutExpired:
-                if current_process:
-                    current_process.terminate()
-                    try:
-                        current_process.wait(timeout=10)
-                    except subprocess.TimeoutExpired:
-                        current_process.kill()
-                        
-                log_file.write(f"\n⏰ PROCESS TIMED OUT!\n")
-                log_file.write("="*50 + "\n")
-                log_file.write(f"🕐 Timeout after 30 minutes\n")
-                log_file.write(f"⏰ Timeout time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                log_file.write("="*50 + "\n")
-                
-    except Exception as e:
-        logger.error(f"Automation process error: {e}")
-        try:
-            with open('automation.log', 'a', encoding='utf-8') as log_file:
-                log_file.write(f"\nError: {str(e)}\n")
-        except:
-            pass
-    finally:
-        if current_process and current_process.poll() is None:
-            try:
-                current_process.terminate()
-            except:
-                pass
+# Adaptive limit for jobs running at once (AIMD on step latency and failures)
+concurrency = AIMDController(step_history, initial=MAX_WORKERS) if AIMD_ENABLED else None
+
+# Priority and fair-share scheduler in front of the thread pool
+job_queue = JobQueue(executor, run_automation_job, max_running=MAX_WORKERS,
+                     canceller=request_job_cancel, cancelled_exit_code=CANCELLED_EXIT_CODE,
+                     backend=job_backend, dispatch=not job_backend.shared,
+                     gate=chain_gates(job_gate, admission.gate if ADMISSION_ENABLED else None),
+                     concurrency=concurrency, credentials=credential_pool)
+portal_guard.attach(job_backend)
+if not credential_pool.accounts:
+    logger.warning("No portal accounts configured (PORTAL_ACCOUNTS or PORTAL_ACCOUNTS_FILE) - jobs will wait")
+job_queue.start()
+
+# Age and size limits for the per-job artifact directories
+retention_sweeper = RetentionSweeper(job_queue.active_job_ids)
+retention_sweeper.start()
 
 @app.route('/process', methods=['POST'])
 def process():
     """Process automation request."""
     try:
-        clear_log_file()
+        # Only reset the shared log when nothing else is queued or running
+        if not job_queue.has_active_jobs():
+            clear_log_file()
         
         data = request.get_json()
         if not data:
@@ -448,13 +395,28 @@ def process():
         mode = data.get('mode', 'IKH')
         selected_date = data.get('selected_date', '')
         selected_shift = data.get('selected_shift', 1)
+        priority = data.get('priority', DEFAULT_PRIORITY)
+        tenant = data.get('tenant') or current_tenant()
+        dry_run = bool(data.get('dry_run', False))
+        chunk_size = data.get('chunk_size', PERMIT_CHUNK_SIZE)
+        
+        if priority not in PRIORITY_LEVELS:
+            return jsonify({'status': 'error', 'message': f'Invalid priority: {priority}'}), 400
+        
+        if type(chunk_size) is not int or chunk_size < 0:  # JSON true/false are ints too
+            return jsonify({'status': 'error', 'message': f'Invalid chunk_size: {chunk_size}'}), 400
+        
+        try:
+            get_tenant(tenant)
+        except KeyError as e:
+            return jsonify({'status': 'error', 'message': str(e.args[0])}), 400
         
-        # Determine CSV path based on mode
+        # Determine CSV path based on mode and tenant
         if mode.startswith('IKK-'):
             category = mode.replace('IKK-', '').lower().replace('_', '-')
-            csv_path = get_category_csv_path(f'ikk-{category}')
+            csv_path = get_category_csv_path(f'ikk-{category}', tenant)
         elif mode == 'IKH':
-            csv_path = get_category_csv_path('ikh')
+            csv_path = get_category_csv_path('ikh', tenant)
         else:
             csv_path = get_csv_path()
         
@@ -465,14 +427,68 @@ def process():
         if not csv_path or not os.path.exists(csv_path):
             return jsonify({'status': 'error', 'message': 'No valid CSV file found'}), 400
         
+        # Snapshot the selected personnel: the job no longer depends on the CSV
+        personnel = snapshot_personnel(csv_path, selected_indices)
+        if not personnel:
+            return jsonify({'status': 'error', 'message': 'No valid personnel (name and NIK) in the selected rows'}), 400
+        bad_dates = invalid_expiries(personnel)
+        if bad_dates:
+            return jsonify({
+                'status': 'error',
+                'message': f'{len(bad_dates)} selected personnel have a missing or unreadable certificate expiry date',
+                'problems': [{'row': person['row'], 'name': person['name'], 'nik': person['nik'],
+                              'error': expiry_problem(person)}
+                             for person in bad_dates]
+            }), 400
+        
         script_path = f"static/{'ikh' if mode == 'IKH' else 'ikk'}_automation.py"
         if not os.path.exists(script_path):
             return jsonify({'status': 'error', 'message': f'Automation script not found: {script_path}'}), 500
         
-        # Submit to thread pool
-        executor.submit(run_automation_process, script_path, csv_path, selected_indices, selected_date, selected_shift, mode)
+        # Submit to job queue, one permit per chunk of a large selection
+        chunks = split_personnel(personnel, chunk_size)
+        batch_id = new_batch_id() if len(chunks) > 1 else None
+        # Requests for the same permit (the area is fixed per category) may share one
+        coalesce_key = None
+        if not batch_id and data.get('coalesce', True):
+            coalesce_key = '|'.join(str(part) for part in (mode, tenant, selected_date, selected_shift, dry_run))
+        jobs = []
+        for part, chunk in enumerate(chunks, 1):
+            jobs.append(job_queue.submit(
+                mode,
+                {
+                    'script_path': script_path,
+                    'csv_path': csv_path,
+                    'selected_indices': [person['row'] for person in chunk] if batch_id else selected_indices,
+                    'selected_date': selected_date,
+                    'selected_shift': selected_shift,
+                    'mode': mode,
+                    'tenant': tenant,
+                    'dry_run': dry_run,
+                    'personnel': chunk
+                },
+                priority=priority,
+                personnel_count=len(chunk),
+                tenant=tenant,
+                batch={'id': batch_id, 'part': part, 'parts': len(chunks)} if batch_id else None,
+                coalesce_key=coalesce_key
+            ))
+        job = jobs[0]
         
-        return jsonify({'status': 'success', 'message': 'Automation started successfully'}), 200
+        if batch_id:
+            message = f"Split into {len(jobs)} permits of up to {chunk_size} personnel (batch {batch_id})"
+        elif job['merged_into']:
+            message = f"Merged into permit {job['merged_into']} with matching date and shift"
+        elif job['status'] == 'running':
+            message = 'Automation started successfully'
+        else:
+            message = f"Automation queued at position {job['queue_position']}"
+        if dry_run:
+            message = f"Dry run: {message[0].lower()}{message[1:]}"
+        response = {'status': 'success', 'message': message, 'job': job}
+        if batch_id:
+            response.update(batch_id=batch_id, jobs=jobs)
+        return jsonify(response), 200
         
     except Exception as e:
         logger.error(f"Process start failed: {e}")
@@ -480,37 +496,135 @@ def process():
 
 @app.route('/stop_process', methods=['POST'])
 def stop_process():
-    """Stop the currently running automation process."""
-    global current_process
+    """Cancel all running automation jobs (cooperatively, see /jobs/<job_id>/cancel)."""
     try:
-        if current_process and current_process.poll() is None:
-            current_process.terminate()
-            try:
-                current_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                current_process.kill()
-                current_process.wait()
-            
-            logger.info("Automation process stopped by user")
-            
-            try:
-                with open('automation.log', 'a', encoding='utf-8') as log_file:
-                    log_file.write('\nProcess stopped by user\n')
-            except Exception as e:
-                logger.error(f"Error writing stop message: {e}")
-            
-            return jsonify({'status': 'success', 'message': 'Process stopped successfully'})
-        else:
+        job_ids = job_queue.running_job_ids()
+        if not job_ids:
             return jsonify({'status': 'info', 'message': 'No process running'})
+        
+        for job_id in job_ids:
+            job_queue.cancel(job_id)
+        
+        logger.info(f"Stop requested by user for jobs: {', '.join(job_ids)}")
+        
+        try:
+            with open(AUTOMATION_LOG, 'a', encoding='utf-8') as log_file:
+                log_file.write('\nStop requested by user - finishing current step\n')
+        except Exception as e:
+            logger.error(f"Error writing stop message: {e}")
+        
+        return jsonify({'status': 'success', 'message': 'Stop requested', 'jobs': job_ids})
     except Exception as e:
         logger.error(f"Error stopping process: {e}")
         return jsonify({'status': 'error', 'message': f'Error stopping process: {str(e)}'}), 500
 
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List queued, running and recently finished jobs."""
+    return jsonify({'status': 'success', 'jobs': job_queue.list_jobs()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get status, queue position, estimated start time and artifacts of one job."""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    # Merged requests share the artifacts of their permit
+    job['artifacts'] = list_artifacts(os.path.join(JOBS_DIR, job['merged_into'] or job_id))
+    return jsonify({'status': 'success', 'job': job})
+
+@app.route('/jobs/<job_id>/artifacts/<filename>', methods=['GET'])
+def get_job_artifact(job_id, filename):
+    """Download one artifact (e.g. a failure screenshot) of a job."""
+    job = job_queue.get_job(job_id)
+    if job and job.get('merged_into'):
+        job_id = job['merged_into']
+    path = os.path.join(JOBS_DIR, secure_filename(job_id), ARTIFACTS_SUBDIR, secure_filename(filename))
+    if not os.path.isfile(path):
+        return jsonify({'status': 'error', 'message': 'Artifact not found'}), 404
+    return send_file(os.path.abspath(path))
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Consolidated report of a split roster: status per permit and the permit of each NIK."""
+    report = batch_report(batch_id, job_queue.list_batch(batch_id))
+    if report is None:
+        return jsonify({'status': 'error', 'message': 'Batch not found'}), 404
+    return jsonify({'status': 'success', 'batch': report})
+
+@app.route('/workers', methods=['GET'])
+def list_workers():
+    """List worker processes pulling from a shared job queue backend."""
+    return jsonify({'status': 'success', 'shared_backend': job_backend.shared, 'workers': job_queue.list_workers()})
+
+@app.route('/concurrency', methods=['GET'])
+def get_concurrency():
+    """Adaptive concurrency limit and its recent decisions (this process)."""
+    if concurrency is None:
+        return jsonify({'status': 'success', 'enabled': False, 'limit': MAX_WORKERS})
+    return jsonify({'status': 'success', **concurrency.status()})
+
+@app.route('/admission', methods=['GET'])
+def get_admission():
+    """Free memory, CPU and learned job memory costs behind job admission (this process)."""
+    try:
+        return jsonify({'status': 'success', **admission.status()})
+    except Exception as e:
+        logger.error(f"Error reading admission status: {e}")
+        return jsonify({'status': 'error', 'message': 'Admission status unavailable'}), 500
+
+@app.route('/selectors', methods=['GET'])
+def get_selectors():
+    """Hit rates of the scripts' fallback selectors, to prune dead candidates."""
+    try:
+        return jsonify({'status': 'success', 'fields': selector_report()})
+    except Exception as e:
+        logger.error(f"Error reading selector cache: {e}")
+        return jsonify({'status': 'error', 'message': 'Selector cache unavailable'}), 500
+
+@app.route('/portal_guard', methods=['GET'])
+def get_portal_guard():
+    """Portal rate limits and circuit breaker state."""
+    try:
+        return jsonify({'status': 'success', **portal_guard.status()})
+    except Exception as e:
+        logger.error(f"Error reading portal guard: {e}")
+        return jsonify({'status': 'error', 'message': 'Portal guard unavailable'}), 500
+
+@app.route('/accounts', methods=['GET'])
+def list_accounts():
+    """Portal accounts with their leased jobs and cool-downs (no passwords)."""
+    try:
+        with job_backend.transaction(include_jobs=False) as state:
+            accounts = credential_pool.status(state)
+        return jsonify({'status': 'success', 'accounts': accounts})
+    except Exception as e:
+        logger.error(f"Error reading account leases: {e}")
+        return jsonify({'status': 'error', 'message': 'Account pool unavailable'}), 500
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a job by ID.
+    
+    Queued jobs are dropped immediately. Running jobs get a cancel token and
+    stop at their next step boundary, closing only their own browser context.
+    """
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    
+    if job['status'] == 'running':
+        message = 'Cancel requested, job will stop at the next step'
+    else:
+        message = f"Job is {job['status']}"
+    return jsonify({'status': 'success', 'message': message, 'job': job}), 202 if job['status'] == 'running' else 200
+
 @app.route('/get_log', methods=['GET'])
 def get_log():
     """Get automation log."""
     try:
-        with open('automation.log', 'r', encoding='utf-8') as log_file:
+        with open(AUTOMATION_LOG, 'r', encoding='utf-8') as log_file:
             content = log_file.read()
             return content if content else 'Starting...'
     except FileNotFoundError:
@@ -547,7 +661,7 @@ def check_completion():
         
 
         # Fallback: check automation log
-        log_file = "automation.log"
+        log_file = AUTOMATION_LOG
         if os.path.exists(log_file):
             with open(log_file, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Portal Credential Pool for Portaliano Automation
+================================================
+
+Contractor accounts are configured outside the source, either as JSON in
+the PORTAL_ACCOUNTS environment variable or in a local secrets file
+(PORTAL_ACCOUNTS_FILE, default portal_accounts.json, never committed):
+
+    [
+        {"username": "KONTRAKTOR_A", "password": "...", "max_sessions": 1},
+        {"username": "KONTRAKTOR_B", "password": "...", "cooldown_seconds": 60}
+    ]
+
+The job queue leases an account to every job it starts, so parallel jobs
+log in with different identities. An account serves at most max_sessions
+jobs at once and rests for cooldown_seconds after each session. Leases are
+kept in the queue backend, so they hold across all workers; only the
+username is stored there, the runner resolves the password locally and
+hands it to the script through PORTAL_USERNAME / PORTAL_PASSWORD. Tenant
+profiles (tenants.py) restrict which accounts their jobs may lease.
+"""
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_ENV = 'PORTAL_ACCOUNTS'
+PORTAL_ACCOUNTS_FILE = os.environ.get('PORTAL_ACCOUNTS_FILE', 'portal_accounts.json')
+ACCOUNT_MAX_SESSIONS = int(os.environ.get('ACCOUNT_MAX_SESSIONS', 1))
+ACCOUNT_COOLDOWN_SECONDS = int(os.environ.get('ACCOUNT_COOLDOWN_SECONDS', 30))
+
+# Environment variables carrying the leased account to the automation script
+USERNAME_ENV = 'PORTAL_USERNAME'
+PASSWORD_ENV = 'PORTAL_PASSWORD'
+
+LEASES_KEY = 'account_leases'
+
+
+def load_accounts():
+    """
+    Load the configured portal accounts.
+
+    Returns:
+        list: Account dicts with username, password, max_sessions and cooldown_seconds
+    """
+    raw = os.environ.get(ACCOUNTS_ENV)
+    source = ACCOUNTS_ENV
+    if not raw and os.path.exists(PORTAL_ACCOUNTS_FILE):
+        with open(PORTAL_ACCOUNTS_FILE, 'r', encoding='utf-8') as f:
+            raw = f.read()
+        source = PORTAL_ACCOUNTS_FILE
+    if not raw:
+        return []
+
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        raise ValueError(f"Invalid portal accounts in {source}: {e}")
+
+    accounts = []
+    for entry in entries:
+        if not entry.get('username') or not entry.get('password'):
+            raise ValueError(f"Portal account in {source} needs a username and a password")
+        accounts.append({
+            'username': entry['username'],
+            'password': entry['password'],
+            'max_sessions': int(entry.get('max_sessions', ACCOUNT_MAX_SESSIONS)),
+            'cooldown_seconds': int(entry.get('cooldown_seconds', ACCOUNT_COOLDOWN_SECONDS))
+        })
+    return accounts
+
+
+def portal_credentials():
+    """
+    Get the account for the running automation script.
+
+    Uses the account leased by the job queue, or the first configured
+    account when the script is run by hand.
+
+    Returns:
+        tuple: (username, password)
+
+    Raises:
+        RuntimeError: If no account is available
+    """
+    username = os.environ.get(USERNAME_ENV)
+    password = os.environ.get(PASSWORD_ENV)
+    if username and password:
+        return username, password
+
+    accounts = load_accounts()
+    if not accounts:
+        raise RuntimeError(f"No portal account configured (set {ACCOUNTS_ENV} or create {PORTAL_ACCOUNTS_FILE})")
+    return accounts[0]['username'], accounts[0]['password']
+
+
+class CredentialPool:
+    """Leases portal accounts to jobs (JobQueue credentials hook)."""
+
+    def __init__(self, accounts=None, tenant_accounts=None):
+        """
+        Args:
+            accounts (list): Account dicts, loaded from the configuration by default
+            tenant_accounts (callable): Called with a job's tenant name, returns the
+                usernames its jobs may lease (None for any account)
+        """
+        self.accounts = {account['username']: account
+                         for account in (accounts if accounts is not None else load_accounts())}
+        self.tenant_accounts = tenant_accounts
+
+    def credentials(self, username):
+        """Get (username, password) of a leased account."""
+        return username, self.accounts[username]['password']
+
+    def lease(self, job, state, now):
+        """
+        Lease an account to a job about to start. Caller holds the transaction.
+
+        Returns:
+            tuple: (username, None) or (None, reason the job has to wait)
+        """
+        if not self.accounts:
+            return None, f"No portal account configured ({ACCOUNTS_ENV} or {PORTAL_ACCOUNTS_FILE})"
+
+        allowed = self.tenant_accounts(job.get('tenant')) if self.tenant_accounts else None
+        leases = state.meta.setdefault(LEASES_KEY, {})
+        available = []
+        for username, account in self.accounts.items():
+            if allowed is not None and username not in allowed:
+                continue
+            lease = leases.get(username, {'jobs': [], 'released_at': 0})
+            if len(lease['jobs']) >= account['max_sessions']:
+                continue
+            if now - lease['released_at'] < account['cooldown_seconds']:
+                continue
+            available.append((len(lease['jobs']), lease['released_at'], username))
+        if not available:
+            if allowed is not None and not set(allowed) & set(self.accounts):
+                return None, f"No configured portal account for tenant '{job.get('tenant')}'"
+            return None, "Waiting for a free portal account"
+
+        # Least busy account first, then the one resting longest
+        _, _, username = min(available)
+        lease = leases.setdefault(username, {'jobs': [], 'released_at': 0})
+        lease['jobs'].append(job['id'])
+        return username, None
+
+    def release(self, job, state, now, used=True):
+        """
+        Return a job's account to the pool. Caller holds the transaction.
+
+        Args:
+            used (bool): The job logged in, so the account's cool-down starts now
+        """
+        username = job.get('account')
+        lease = state.meta.get(LEASES_KEY, {}).get(username)
+        if lease and job['id'] in lease['jobs']:
+            lease['jobs'].remove(job['id'])
+            if used:
+                lease['released_at'] = now
+
+    def status(self, state, now=None):
+        """Accounts with their active jobs and remaining cool-down (no passwords)."""
+        now = now or time.time()
+        leases = state.meta.get(LEASES_KEY, {})
+        accounts = []
+        for username, account in self.accounts.items():
+            lease = leases.get(username, {'jobs': [], 'released_at': 0})
+            accounts.append({
+                'username': username,
+                'max_sessions': account['max_sessions'],
+                'active_jobs': list(lease['jobs']),
+                'cooldown_remaining': round(max(0.0, account['cooldown_seconds'] - (now - lease['released_at'])), 1)
+            })
+        return accounts
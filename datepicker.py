@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Datepicker Fast Path for the Portaliano Automation Scripts
+==========================================================
+
+The portal's date inputs (IKH work date, IKK work date and certificate
+expiry) are bound to a jQuery datepicker widget. Setting a date by hand
+means opening the calendar, navigating months and clicking a day, with a
+browser round trip per probe. Instead, set_date_via_widget() finds the
+widget instance bound to the input and sets the date through its own API
+in a single evaluate():
+
+- bootstrap-datetimepicker v4 (data 'DateTimePicker', .date())
+- bootstrap-datetimepicker v2 (data 'datetimepicker', 'update')
+- bootstrap-datepicker (data 'datepicker', 'setDate')
+- jQuery UI datepicker (class hasDatepicker, 'setDate')
+
+The widget formats the value and fires its own change events, so the form
+sees the same thing as after a click. The value is verified before the
+fast path reports success; otherwise the scripts fall back to their
+calendar click methods.
+
+When the calendar has to be clicked, navigate_calendar() reads the open
+calendar's view once and takes the cheapest path to the target month:
+stepping month by month, or switching to the month/year view and clicking
+the year and month (a 2027 expiry is a handful of clicks instead of one
+per month). The whole path runs in a single evaluate().
+
+Every way of setting a date (widget API, calendar clicks, JavaScript,
+fill) is a named strategy run by set_date_with_strategies(). The strategy
+that worked is remembered per field and portal page fingerprint in
+DATE_STRATEGY_FILE and tried first next time, skipping the attempts that
+fail on this portal anyway. A remembered strategy that fails is replaced
+by the one that works instead (or forgotten if none does).
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+
+# Winning date strategy per field and page fingerprint, shared by all runs
+DATE_STRATEGY_FILE = os.environ.get('DATE_STRATEGY_FILE', 'date_strategies.json')
+
+# Month names the widgets may render (English and Indonesian, first three letters)
+MONTH_ABBREVIATIONS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'mei': 5, 'jun': 6, 'jul': 7,
+    'aug': 8, 'agu': 8, 'sep': 9, 'oct': 10, 'okt': 10, 'nov': 11, 'dec': 12, 'des': 12
+}
+
+# Date formats the widgets render: DD/MM/YYYY, YYYY-MM-DD and DD-Mon-YYYY
+NUMERIC_DATE = re.compile(r'^(\d{1,2})([/.-])(\d{1,2})\2(\d{4})$')
+ISO_DATE = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$')
+NAMED_MONTH_DATE = re.compile(r'^(\d{1,2})[-\s]([A-Za-z]{3,})[-\s,]+(\d{4})$')
+
+# Sets the date through the widget bound to the input (or a wrapping .input-group/.date)
+WIDGET_SET_DATE_SCRIPT = """
+({inputId, day, month, year}) => {
+    const input = document.getElementById(inputId);
+    if (!input) return {ok: false, reason: 'input not found'};
+    const $ = window.jQuery;
+    if (!$) return {ok: false, reason: 'no jQuery'};
+    const target = new Date(year, month - 1, day);
+    const field = $(input);
+    const holders = [field, field.parent(), field.closest('.input-group'), field.closest('.date')];
+    let widget = null;
+    for (const holder of holders) {
+        if (!holder.length) continue;
+        const v4 = holder.data('DateTimePicker');
+        if (v4 && typeof v4.date === 'function') {
+            v4.date(window.moment ? window.moment(target) : target);
+            widget = 'DateTimePicker';
+        } else if (holder.data('datetimepicker')) {
+            holder.datetimepicker('update', target);
+            widget = 'datetimepicker';
+        } else if (holder.data('datepicker')) {
+            holder.datepicker('setDate', target);
+            widget = 'datepicker';
+        }
+        if (widget) break;
+    }
+    if (!widget && field.hasClass('hasDatepicker')) {
+        field.datepicker('setDate', target);
+        widget = 'jquery-ui';
+    }
+    if (!widget) return {ok: false, reason: 'no datepicker widget bound'};
+    field.trigger('change');
+    return {ok: true, widget: widget, value: input.value};
+}
+"""
+
+
+def date_value_matches(value, day, month, year):
+    """
+    Check that a date input's value shows the target date in one of the portal's formats.
+
+    Fields are read by position, never guessed: DD/MM/YYYY (or with - or .),
+    DD-Mon-YYYY (or DD Mon YYYY, English or Indonesian month names) and ISO
+    YYYY-MM-DD. The year must be the full four digits.
+
+    Args:
+        value (str): Input value, e.g. "05/08/2027", "05-Aug-2027" or "2027-08-05"
+        day, month, year (int): Target date
+    """
+    value = (value or '').strip()
+    numeric, iso, named = NUMERIC_DATE.match(value), ISO_DATE.match(value), NAMED_MONTH_DATE.match(value)
+    if numeric:
+        shown = (int(numeric.group(1)), int(numeric.group(3)), int(numeric.group(4)))
+    elif iso:
+        shown = (int(iso.group(3)), int(iso.group(2)), int(iso.group(1)))
+    elif named:
+        shown = (int(named.group(1)), MONTH_ABBREVIATIONS.get(named.group(2)[:3].lower()), int(named.group(3)))
+    else:
+        return False
+    return shown == (day, month, year)
+
+
+def set_date_via_widget(page, input_id, date_str):
+    """
+    Fast path: set a date through the datepicker widget's own API (one evaluate).
+
+    Args:
+        page: Playwright page
+        input_id (str): ID of the date input
+        date_str (str): Date as DD/MM/YYYY
+
+    Returns:
+        bool: True if the input now holds the date; False to use the calendar methods
+    """
+    try:
+        day, month, year = (int(part) for part in date_str.split('/'))
+        result = page.evaluate(WIDGET_SET_DATE_SCRIPT,
+                               {'inputId': input_id, 'day': day, 'month': month, 'year': year})
+    except Exception as e:
+        print(f"⚠️ Datepicker widget API failed for {input_id}: {e}")
+        return False
+
+    if not result.get('ok'):
+        print(f"ℹ️ Datepicker fast path unavailable for {input_id}: {result.get('reason')}")
+        return False
+    if not date_value_matches(result.get('value'), day, month, year):
+        print(f"⚠️ Datepicker {result['widget']} set '{result.get('value')}' instead of {date_str}")
+        return False
+    print(f"⚡ Date set via {result['widget']} widget API: {result['value']}")
+    return True
+
+
+# Reads the open calendar's view and, given a plan, performs it in one go. The widgets
+# re-render synchronously on click, so every action sees the updated view.
+CALENDAR_SCRIPT = """
+(plan) => {
+    const visible = (el) => el && el.offsetParent !== null;
+    const jqui = document.getElementById('ui-datepicker-div');
+    const isJqui = visible(jqui);
+    const view = () => isJqui ? jqui : Array.from(document.querySelectorAll(
+        '.datepicker-days, .datepicker-months, .datepicker-years, .datepicker-decades')).find(visible);
+    const find = (selector) => {
+        const current = view();
+        const el = current && current.querySelector(selector);
+        return el && !el.classList.contains('disabled') ? el : null;
+    };
+    const read = () => {
+        if (isJqui) {
+            const month = jqui.querySelector('.ui-datepicker-month');
+            const year = jqui.querySelector('.ui-datepicker-year');
+            const selects = !!(month && year && month.tagName === 'SELECT' && year.tagName === 'SELECT');
+            const title = jqui.querySelector('.ui-datepicker-title');
+            return {widget: 'jquery-ui', selects: selects, header: title ? title.textContent : '',
+                    month: selects ? Number(month.value) + 1 : null, year: selects ? Number(year.value) : null};
+        }
+        const days = Array.from(document.querySelectorAll('.datepicker-days')).find(visible);
+        if (!days) return {widget: null};
+        const header = days.querySelector('.picker-switch, .datepicker-switch');
+        return {widget: 'bootstrap', selects: false, header: header ? header.textContent : '',
+                month: null, year: null};
+    };
+    const setSelect = (selector, value) => {
+        const select = jqui.querySelector(selector);
+        if (!select || !Array.from(select.options).some((option) => option.value === String(value))) return false;
+        select.value = String(value);
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+        return true;
+    };
+    const nav = {
+        prev: isJqui ? '.ui-datepicker-prev' : 'th.prev',
+        next: isJqui ? '.ui-datepicker-next' : 'th.next'
+    };
+    for (const step of plan) {
+        if (step.action === 'prev' || step.action === 'next') {
+            for (let i = 0; i < step.count; i++) {
+                const button = find(nav[step.action]);
+                if (!button) return {error: `no ${step.action} button`};
+                button.click();
+            }
+        } else if (step.action === 'switch') {
+            const header = find('.picker-switch, .datepicker-switch');
+            if (!header) return {error: 'no view switch'};
+            header.click();
+        } else if (step.action === 'year') {
+            // Page through decades until the year is shown (year views differ per widget)
+            let cell = null;
+            for (let page = 0; page < 20 && !cell; page++) {
+                const years = Array.from(view().querySelectorAll('span.year'));
+                cell = years.find((span) => span.textContent.trim() === String(step.value));
+                if (cell || !years.length) break;
+                const first = Number(years[0].textContent);
+                const button = find(step.value < first ? nav.prev : nav.next);
+                if (!button) break;
+                button.click();
+            }
+            if (!cell) return {error: `year ${step.value} not shown`};
+            cell.click();
+        } else if (step.action === 'month') {
+            const months = view() ? view().querySelectorAll('span.month') : [];
+            if (months.length !== 12) return {error: 'no month view'};
+            months[step.value - 1].click();
+        } else if (step.action === 'select') {
+            if (!setSelect('.ui-datepicker-year', step.year)) return {error: `year ${step.year} not selectable`};
+            if (!setSelect('.ui-datepicker-month', step.month - 1)) return {error: 'month not selectable'};
+        }
+    }
+    return read();
+}
+"""
+
+
+def parse_calendar_header(text):
+    """
+    Read the displayed month and year from a calendar header like "Agustus 2027" or "Aug 2027".
+
+    Returns:
+        tuple: (month, year), or None if the header does not show both
+    """
+    year = re.search(r'\b(\d{4})\b', text or '')
+    months = [MONTH_ABBREVIATIONS[word[:3]] for word in re.findall(r'[a-z]+', (text or '').lower())
+              if word[:3] in MONTH_ABBREVIATIONS]
+    if not year or not months:
+        return None
+    return months[0], int(year.group(1))
+
+
+def plan_calendar_navigation(current_month, current_year, target_month, target_year,
+                             views=True, selects=False):
+    """
+    Pick the cheapest way from the displayed month to the target month.
+
+    Candidates (cost in clicks):
+    - step: prev/next once per month
+    - month view: header to the month view, prev/next once per year, click the month
+    - year view: header twice to the year view, page decades, click the year, then the month
+    - selects (jQuery UI with month/year dropdowns): set both dropdowns
+
+    Args:
+        views (bool): The widget has month/year views behind its header (bootstrap pickers)
+        selects (bool): The widget shows month/year dropdowns (jQuery UI)
+
+    Returns:
+        tuple: (plan, clicks) where plan is a list of CALENDAR_SCRIPT actions
+    """
+    months_diff = (target_year * 12 + target_month) - (current_year * 12 + current_month)
+    if months_diff == 0:
+        return [], 0
+    if selects:
+        return [{'action': 'select', 'month': target_month, 'year': target_year}], 2
+
+    direction = 'next' if months_diff > 0 else 'prev'
+    candidates = [([{'action': direction, 'count': abs(months_diff)}], abs(months_diff))]
+    if views:
+        years_diff = target_year - current_year
+        month_view = [{'action': 'switch'}]
+        if years_diff:
+            month_view.append({'action': 'next' if years_diff > 0 else 'prev', 'count': abs(years_diff)})
+        month_view.append({'action': 'month', 'value': target_month})
+        candidates.append((month_view, 2 + abs(years_diff)))
+
+        decades = abs(target_year // 10 - current_year // 10)
+        year_view = [{'action': 'switch'}, {'action': 'switch'},
+                     {'action': 'year', 'value': target_year}, {'action': 'month', 'value': target_month}]
+        candidates.append((year_view, 4 + decades))
+    return min(candidates, key=lambda candidate: candidate[1])
+
+
+def _view_month_year(view):
+    if view.get('month') and view.get('year'):
+        return view['month'], view['year']
+    return parse_calendar_header(view.get('header'))
+
+
+def navigate_calendar(page, target_month, target_year):
+    """
+    Bring the open calendar to the target month along the cheapest path.
+
+    Reads the view once, plans with plan_calendar_navigation() and performs the
+    whole plan in a second evaluate(), instead of a click and a wait per month.
+
+    Returns:
+        bool: True if the calendar now shows the target month; False to use the
+        month-by-month navigation
+    """
+    try:
+        view = page.evaluate(CALENDAR_SCRIPT, [])
+        current = _view_month_year(view) if view.get('widget') else None
+        if not current:
+            print(f"ℹ️ Calendar view not readable ({view.get('header') or view.get('widget')}), stepping instead")
+            return False
+
+        plan, clicks = plan_calendar_navigation(current[0], current[1], target_month, target_year,
+                                                views=view['widget'] == 'bootstrap', selects=view['selects'])
+        if not plan:
+            print(f"✅ Calendar already at {target_month}/{target_year}")
+            return True
+        route = ', '.join(step['action'] + (f" x{step['count']}" if 'count' in step else '') for step in plan)
+        print(f"🧭 Calendar {current[0]}/{current[1]} → {target_month}/{target_year}: {route} ({clicks} clicks)")
+        result = page.evaluate(CALENDAR_SCRIPT, plan)
+    except Exception as e:
+        print(f"⚠️ Planned calendar navigation failed: {e}")
+        return False
+
+    if result.get('error'):
+        print(f"⚠️ Planned calendar navigation stopped: {result['error']}")
+        return False
+    reached = _view_month_year(result)
+    if reached != (target_month, target_year):
+        print(f"⚠️ Planned calendar navigation reached {reached}, expected {target_month}/{target_year}")
+        return False
+    print(f"✅ Calendar at {target_month}/{target_year}")
+    return True
+
+
+# Identifies the portal page build around a date field: path, field markup and script bundles
+PAGE_FINGERPRINT_SCRIPT = """
+(inputId) => {
+    const input = document.getElementById(inputId);
+    const scripts = Array.from(document.scripts)
+        .map((script) => script.src.split('/').pop().split('?')[0]).filter(Boolean).sort();
+    return [location.pathname, input ? input.className : '',
+            input && input.parentElement ? input.parentElement.className : '', scripts.join(',')].join('|');
+}
+"""
+
+INPUT_VALUE_SCRIPT = "(inputId) => { const el = document.getElementById(inputId); return el ? el.value : null; }"
+
+
+def page_fingerprint(page, input_id):
+    """Short hash of the page build around a date field (changes when the portal is redeployed)."""
+    try:
+        return hashlib.sha1(page.evaluate(PAGE_FINGERPRINT_SCRIPT, input_id).encode('utf-8')).hexdigest()[:12]
+    except Exception:
+        return 'unknown'
+
+
+def _load_strategies(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_strategy(cache_file, key, winner):
+    # Re-read before writing: parallel jobs share the file
+    cache = _load_strategies(cache_file)
+    entry = cache.get(key)
+    if winner is None:
+        cache.pop(key, None)
+    elif entry and entry.get('strategy') == winner:
+        entry['successes'] = entry.get('successes', 0) + 1
+        entry['updated_at'] = time.time()
+    else:
+        cache[key] = {'strategy': winner, 'successes': 1, 'updated_at': time.time()}
+    try:
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"⚠️ Could not save date strategies: {e}")
+
+
+def set_date_with_strategies(page, input_id, date_str, strategies, cache_file=DATE_STRATEGY_FILE):
+    """
+    Set a date field with the first strategy that works, remembered strategy first.
+
+    A strategy counts only if it reports success and the field then holds the
+    date (checked with date_value_matches()).
+
+    Args:
+        page: Playwright page
+        input_id (str): ID of the date input
+        date_str (str): Date as DD/MM/YYYY
+        strategies (list): (name, callable) pairs in default order; each callable
+            takes no arguments and returns True when it set the date
+
+    Returns:
+        bool: True if the field holds the date
+    """
+    day, month, year = (int(part) for part in date_str.split('/'))
+    key = f"{input_id}@{page_fingerprint(page, input_id)}"
+    cached = _load_strategies(cache_file).get(key, {}).get('strategy')
+    if cached in dict(strategies):
+        print(f"🧠 Trying remembered date strategy '{cached}' first for {input_id}")
+        strategies = sorted(strategies, key=lambda strategy: strategy[0] != cached)
+
+    for name, strategy in strategies:
+        try:
+            done = strategy()
+            value = page.evaluate(INPUT_VALUE_SCRIPT, input_id) if done else None
+        except Exception as e:
+            print(f"⚠️ Date strategy '{name}' failed: {e}")
+            done, value = False, None
+        if done and date_value_matches(value, day, month, year):
+            print(f"✅ Date {date_str} set with strategy '{name}'")
+            _record_strategy(cache_file, key, name)
+            return True
+        if name == cached:
+            print(f"📉 Remembered date strategy '{name}' failed, demoting it")
+
+    print(f"❌ No date strategy could set {input_id} to {date_str}")
+    _record_strategy(cache_file, key, None)
+    return False
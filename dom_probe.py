@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Batched DOM Probing for the Portaliano Automation Scripts
+=========================================================
+
+Fallback selector lists used to be probed one locator call at a time
+(count(), then is_visible() per element, then input_value()), each a
+browser round trip. probe_selectors() sends the whole candidate list to
+the page in a single evaluate() and returns, per selector:
+
+    {"selector": "td.day:has-text('5')", "count": 3, "visible": 1,
+     "index": 2, "value": null, "text": "5", "enabled": true}
+
+- count / visible: matching elements and how many of them are visible
+- index: position of the first visible match (for locator(selector).nth(index))
+- value / text / enabled: of the first visible match (or the first match)
+- select elements also report selected_index and their options
+
+Playwright's :has-text() and :text() filters are applied as a
+case-insensitive substring match on the element's text, like Playwright
+does. Selectors the page cannot evaluate come back with an "error".
+"""
+
+PROBE_SCRIPT = """
+(selectors) => {
+    const normalize = (text) => (text || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const isVisible = (el) => {
+        if (el.tagName === 'OPTION' || el.tagName === 'OPTGROUP') el = el.closest('select') || el;
+        const style = getComputedStyle(el);
+        return style.visibility !== 'hidden' && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    };
+    const textFilter = /:(has-text|text)\\((['"])(.*?)\\2\\)/g;
+    return selectors.map((selector) => {
+        const result = {selector: selector, count: 0, visible: 0, index: null,
+                        value: null, text: null, enabled: null};
+        const texts = [];
+        let nested = false;
+        const css = selector.replace(textFilter, (match, kind, quote, text, offset) => {
+            // Text filters are only emulated on the last compound of the selector
+            const tail = selector.slice(offset + match.length).replace(/\\([^)]*\\)|\\[[^\\]]*\\]/g, '');
+            if (/[\\s>+~]/.test(tail)) nested = true;
+            texts.push(normalize(text));
+            return '';
+        });
+        let elements;
+        try {
+            if (nested) throw new Error('text filter before a combinator');
+            elements = Array.from(document.querySelectorAll(css.trim() || '*'));
+        } catch (e) {
+            result.error = e.message;
+            return result;
+        }
+        if (texts.length) {
+            elements = elements.filter((el) => texts.every((text) => normalize(el.textContent).includes(text)));
+        }
+        result.count = elements.length;
+        elements.forEach((el, index) => {
+            if (!isVisible(el)) return;
+            if (result.index === null) result.index = index;
+            result.visible++;
+        });
+        const el = elements[result.index === null ? 0 : result.index];
+        if (el) {
+            result.value = el.value === undefined ? null : el.value;
+            result.text = el.textContent.trim();
+            result.enabled = !el.disabled;
+            if (el.tagName === 'SELECT') {
+                result.selected_index = el.selectedIndex;
+                result.options = Array.from(el.options).map((option) => ({value: option.value, text: option.text}));
+            }
+        }
+        return result;
+    });
+}
+"""
+
+
+def probe_selectors(page, candidates):
+    """
+    Probe candidate selectors in one round trip.
+
+    Args:
+        page: Playwright page
+        candidates (list): Selectors in probing order
+
+    Returns:
+        list: One result dict per selector, in the given order
+    """
+    return page.evaluate(PROBE_SCRIPT, list(candidates))
+
+
+def first_visible(results):
+    """The first probe result with a visible match, or None."""
+    return next((result for result in results if result['visible']), None)
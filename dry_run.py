@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Dry Run for the Portaliano Automation Scripts
+=============================================
+
+With --dry-run the scripts perform every step up to, but not including,
+the " Submit" click. Instead of submitting they:
+
+- capture the complete form state (every field of the request form and its
+  modals, plus the rows of the personnel/area/tool tables) into the
+  form_state.json artifact,
+- write a per-step timing report (step_timings.json artifact and log),
+- close the browser context, discarding the unsubmitted form.
+
+This lets speed profiles be benchmarked and rosters be validated against
+the live form without filing a permit.
+"""
+
+import json
+import time
+from collections import OrderedDict
+
+from job_runtime import artifact_path, start_step, step_timings
+
+DRY_RUN_FLAG = '--dry-run'
+FORM_STATE_ARTIFACT = 'form_state.json'
+TIMINGS_ARTIFACT = 'step_timings.json'
+
+# Collects every field whose ID starts with the form prefix and the rows of visible tables
+FORM_STATE_SCRIPT = """
+(prefix) => {
+    const fields = {};
+    document.querySelectorAll('input, select, textarea').forEach((el) => {
+        if (!el.id || !el.id.startsWith(prefix)) return;
+        const field = {tag: el.tagName.toLowerCase(), type: el.type || null, value: el.value,
+                       visible: el.offsetParent !== null};
+        if (el.type === 'checkbox' || el.type === 'radio') field.checked = el.checked;
+        if (el.tagName === 'SELECT' && el.selectedIndex >= 0) {
+            field.text = el.options[el.selectedIndex].text;
+        }
+        fields[el.id] = field;
+    });
+    const tables = {};
+    document.querySelectorAll('table').forEach((table, index) => {
+        if (table.offsetParent === null) return;
+        const rows = Array.from(table.querySelectorAll('tbody tr'))
+            .map((row) => Array.from(row.cells).map((cell) => cell.innerText.trim()))
+            .filter((cells) => cells.some((text) => text));
+        if (rows.length) tables[table.id || `table_${index}`] = rows;
+    });
+    return {url: location.href, fields: fields, tables: tables};
+}
+"""
+
+
+def capture_form_state(page, id_prefix, state=None):
+    """
+    Capture the form state and save it as the form_state.json artifact.
+
+    Args:
+        page: Playwright page with the filled request form
+        id_prefix (str): Prefix of the form's element IDs, e.g. "ahmgawpm002_"
+        state (dict): Snapshot already taken (e.g. by the pre-submit form check)
+
+    Returns:
+        dict: url, fields (ID -> value/checked/visible) and tables (ID -> rows)
+    """
+    if state is None:
+        state = page.evaluate(FORM_STATE_SCRIPT, id_prefix)
+        state['captured_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    with open(artifact_path(FORM_STATE_ARTIFACT), 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    filled = sum(1 for field in state['fields'].values() if field['value'] or field.get('checked'))
+    rows = sum(len(table) for table in state['tables'].values())
+    print(f"📋 Form state captured: {filled}/{len(state['fields'])} fields filled, {rows} table rows")
+    return state
+
+
+def timing_report():
+    """
+    Write the per-step timing report (step_timings.json artifact and log).
+
+    Returns:
+        dict: total seconds, per-step summary (count, total, average, max) and
+        every step run in order
+    """
+    timings = step_timings()
+    summary = OrderedDict()
+    for entry in timings:
+        # Failed attempts and waits are summed apart from the step itself, e.g. "login failed_attempt"
+        name = f"{entry['step']} {entry['kind']}" if entry.get('kind') else entry['step']
+        step = summary.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        step['count'] += 1
+        step['total'] = round(step['total'] + entry['duration'], 3)
+        step['max'] = max(step['max'], entry['duration'])
+    for step in summary.values():
+        step['average'] = round(step['total'] / step['count'], 3)
+    report = {
+        'total': round(sum(entry['duration'] for entry in timings), 3),
+        'steps': summary,
+        'timings': timings
+    }
+    with open(artifact_path(TIMINGS_ARTIFACT), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print("⏱️ STEP TIMINGS")
+    print("=" * 60)
+    for name, step in summary.items():
+        print(f"   {name:<24} {step['count']:>3}x  total {step['total']:>7.2f}s  "
+              f"avg {step['average']:>6.2f}s  max {step['max']:>6.2f}s")
+    print(f"   {'total':<24}       {report['total']:>7.2f}s")
+    print("=" * 60)
+    return report
+
+
+def finish_dry_run(page, id_prefix, state=None):
+    """
+    End a dry run in place of the submit step: capture the form state and
+    report the step timings. The caller then closes the browser context,
+    which discards the unsubmitted form.
+
+    Args:
+        page: Playwright page with the filled request form
+        id_prefix (str): Prefix of the form's element IDs
+        state (dict): Form snapshot of the pre-submit check, reused if given
+    """
+    # Closes the timing of the last real step
+    start_step('dry_run')
+    print("🧪 DRY RUN - stopping before Submit")
+    capture_form_state(page, id_prefix, state)
+    timing_report()
+    print("🧪 Dry run complete - form discarded without submitting")
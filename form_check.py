@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Pre-Submit Form Check for the Portaliano Automation Scripts
+===========================================================
+
+Instead of reading fields back one at a time after each step (date input,
+shift select, category, ...) and not checking the personnel at all, the
+scripts describe what the finished form must contain and check_form()
+compares it with a single snapshot of the form (dry_run.FORM_STATE_SCRIPT:
+every field with the form prefix plus the rows of the visible tables):
+
+    expected = {
+        'fields': {
+            'ahmgawpm002_tanggal_pekerjaan_request_kontraktor': {'date': '05/08/2025', 'owner': 'set_date'},
+            'ahmgawpm002_shift_request_kontraktor': {'value': '2', 'owner': 'set_shift'},
+            'ahmgawpm002_checkbox_persetujuan': {'checked': True, 'owner': 'accept_terms'}
+        },
+        'rows': [
+            {'cells': ['3201010101010001'], 'owner': 'add_personnel', 'key': '3201010101010001'},
+            {'cells': ['G'], 'owner': 'add_area'}
+        ]
+    }
+
+Field rules: value (exact), date (the portal's date formats, see
+datepicker.date_value_matches), option (the selected value equals one of
+the texts, or the selected label starts with one as a whole token, so
+"Shift 1" matches "Shift 1 (06:00-14:00)" but "1" never matches "Shift 2"),
+checked. A row rule needs a distinct table row having a cell equal to each
+of its texts (case-insensitive), so two people or tools need two rows.
+
+The result is a list of mismatches:
+
+    {'kind': 'field', 'target': '<id>', 'owner': 'set_shift',
+     'expected': '2', 'actual': '1', 'reason': 'mismatch'}
+
+verify_form() runs the check before Submit. Owners with a repair action
+(e.g. re-run set_shift, re-add the missing people) are repaired once and
+the form is checked again. Remaining mismatches are logged and saved in
+the form_check.json artifact and raise FormMismatch, so a wrong permit is
+never submitted (FORM_CHECK_MODE=warn submits anyway). Dry runs pass
+mode='warn': they never submit and only report the mismatches.
+"""
+
+import os
+import re
+import json
+import time
+
+from datepicker import date_value_matches
+from dry_run import FORM_STATE_SCRIPT
+from job_runtime import artifact_path
+
+# block: raise FormMismatch before Submit; warn: log mismatches and submit anyway
+FORM_CHECK_MODE = os.environ.get('FORM_CHECK_MODE', 'block')
+FORM_CHECK_ARTIFACT = 'form_check.json'
+
+
+class FormMismatch(Exception):
+    """Raised (block mode) when the form still differs from the job before Submit."""
+
+    def __init__(self, mismatches):
+        targets = ', '.join(f"{m['owner'] or m['kind']}:{m['target']}" for m in mismatches)
+        super().__init__(f"Form differs from the job in {len(mismatches)} place(s): {targets}")
+        self.mismatches = mismatches
+
+
+def _normalize(text):
+    return ' '.join(str(text).split()).lower()
+
+
+def option_matches(text, value, label):
+    """Check a selected option: its value equals the text, or its label is (or begins with) the whole text."""
+    label = _normalize(label or '')
+    return value == str(text) or re.match(rf'{re.escape(_normalize(text))}(?!\w)', label) is not None
+
+
+def _field_mismatch(field_id, rule, field):
+    # (expected, actual, reason) of a field that breaks its rule, or None
+    if field is None:
+        expected = next((rule[key] for key in ('value', 'date', 'option', 'checked') if key in rule), None)
+        return expected, None, 'missing'
+    value = field['value']
+    if 'value' in rule and value != str(rule['value']):
+        return str(rule['value']), value, 'mismatch'
+    if 'date' in rule:
+        day, month, year = (int(part) for part in rule['date'].split('/'))
+        if not date_value_matches(value, day, month, year):
+            return rule['date'], value, 'mismatch'
+    if 'option' in rule:
+        texts = [str(text) for text in rule['option']]
+        if not any(option_matches(text, value, field.get('text')) for text in texts):
+            return texts, field.get('text') or value, 'mismatch'
+    if 'checked' in rule and bool(field.get('checked')) != rule['checked']:
+        return rule['checked'], bool(field.get('checked')), 'mismatch'
+    return None
+
+
+def diff_form_state(state, expected):
+    """
+    Compare a form snapshot with the expected form.
+
+    Args:
+        state (dict): Snapshot from FORM_STATE_SCRIPT (fields, tables)
+        expected (dict): fields (ID -> rule) and rows (list of row rules)
+
+    Returns:
+        list: Mismatch dicts (kind, target, owner, expected, actual, reason)
+    """
+    mismatches = []
+    for field_id, rule in expected.get('fields', {}).items():
+        found = _field_mismatch(field_id, rule, state['fields'].get(field_id))
+        if found:
+            want, actual, reason = found
+            mismatches.append({'kind': 'field', 'target': field_id, 'owner': rule.get('owner'),
+                               'expected': want, 'actual': actual, 'reason': reason})
+
+    # Each expected row claims a distinct table row
+    rows = [{_normalize(cell) for cell in row} for table in state['tables'].values() for row in table]
+    claimed = set()
+    for rule in expected.get('rows', []):
+        cells = {_normalize(cell) for cell in rule['cells']}
+        match = next((index for index, row in enumerate(rows) if index not in claimed and cells <= row), None)
+        if match is None:
+            mismatches.append({'kind': 'row', 'target': rule.get('key') or ' | '.join(rule['cells']),
+                               'owner': rule.get('owner'), 'expected': rule['cells'], 'actual': None,
+                               'reason': 'missing'})
+        else:
+            claimed.add(match)
+    return mismatches
+
+
+def check_form(page, id_prefix, expected):
+    """
+    Snapshot the form in one call and diff it against the expected form.
+
+    Returns:
+        tuple: (state, mismatches)
+    """
+    state = page.evaluate(FORM_STATE_SCRIPT, id_prefix)
+    state['captured_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return state, diff_form_state(state, expected)
+
+
+def verify_form(page, id_prefix, expected, repairs=None, mode=None):
+    """
+    Check the form before Submit, repair the owners of mismatches once and check again.
+
+    Args:
+        page: Playwright page with the filled request form
+        id_prefix (str): Prefix of the form's element IDs
+        expected (dict): Expected fields and rows (see module docstring)
+        repairs (dict): Owner -> callable(mismatches of that owner)
+        mode (str): 'block' or 'warn' (default: FORM_CHECK_MODE)
+
+    Returns:
+        tuple: (state, remaining mismatches)
+
+    Raises:
+        FormMismatch: The mode is block and mismatches remain
+    """
+    mode = mode or FORM_CHECK_MODE
+    state, mismatches = check_form(page, id_prefix, expected)
+    repaired = []
+    for owner in dict.fromkeys(m['owner'] for m in mismatches):
+        if owner in (repairs or {}):
+            owned = [m for m in mismatches if m['owner'] == owner]
+            print(f"🔧 Form check: repairing {owner} ({len(owned)} mismatch(es))")
+            try:
+                repairs[owner](owned)
+                repaired.append(owner)
+            except Exception as e:
+                print(f"⚠️ Repair of {owner} failed: {e}")
+    if repaired:
+        state, mismatches = check_form(page, id_prefix, expected)
+
+    checked = len(expected.get('fields', {})) + len(expected.get('rows', []))
+    if mismatches:
+        print(f"❌ Form check: {len(mismatches)}/{checked} expectation(s) not met")
+        for mismatch in mismatches:
+            print(f"   {mismatch['kind']} {mismatch['target']} ({mismatch['owner']}): {mismatch['reason']}, "
+                  f"expected {mismatch['expected']!r}, got {mismatch['actual']!r}")
+    else:
+        print(f"✅ Form check: all {checked} expectation(s) met" + (f" after repairing {', '.join(repaired)}" if repaired else ""))
+
+    with open(artifact_path(FORM_CHECK_ARTIFACT), 'w', encoding='utf-8') as f:
+        json.dump({'mode': mode, 'repaired': repaired, 'mismatches': mismatches,
+                   'expected': expected, 'state': state}, f, indent=2, ensure_ascii=False)
+    if mismatches and mode == 'block':
+        raise FormMismatch(mismatches)
+    return state, mismatches
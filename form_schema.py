@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Form Schema Discovery for the Portaliano Automation Scripts
+===========================================================
+
+The scripts address form fields by guessed element IDs and, when a guess
+misses, scan every input, select and textarea on the page for a matching
+id, name or label, on every run. form_fields() does that discovery once
+and maps logical fields to element IDs:
+
+    fields = form_fields(page, 'ikk', FORM_ID_PREFIX, IKK_FIELD_RULES)
+    fields['shift']        # -> 'ahmgawpm003_shift' (or None: no such field)
+
+Each rule lists the known IDs (tried first, in order), keyword groups
+matched against id, name, aria-label, placeholder and label text (all
+words of a group must match), the accepted tags and, optionally, the
+option values a select must offer when nothing else matched.
+
+The map is stored in FORM_SCHEMA_FILE together with a fingerprint of the
+form's structure (the tags, types and IDs of all fields with the form
+prefix). Later runs take one cheap fingerprint evaluate() and reuse the
+map; discovery runs again only when the portal's form changes. Several
+fingerprints are kept per form, so a modal whose fields are only added
+to the DOM when it opens does not evict the map of the closed form.
+"""
+
+import os
+import json
+import time
+import hashlib
+
+FORM_SCHEMA_FILE = os.environ.get('FORM_SCHEMA_FILE', 'form_schema.json')
+
+# Fingerprints remembered per form (oldest dropped first)
+MAX_FINGERPRINTS = 4
+
+# Structure of the form: tag, type and id of every field with the prefix, sorted
+FORM_FINGERPRINT_SCRIPT = """
+(prefix) => {
+    const fields = Array.from(document.querySelectorAll('input, select, textarea'))
+        .filter((el) => el.id && el.id.startsWith(prefix))
+        .map((el) => `${el.tagName}:${el.type || ''}#${el.id}`)
+        .sort();
+    return [location.pathname].concat(fields).join('|');
+}
+"""
+
+DISCOVERY_SCRIPT = """
+([prefix, rules]) => {
+    const labelText = (el) => {
+        const label = (el.id && document.querySelector(`label[for="${el.id}"]`)) || el.closest('label');
+        return label ? label.textContent : '';
+    };
+    const fields = Array.from(document.querySelectorAll('input, select, textarea'))
+        .filter((el) => el.id && (el.id.startsWith(prefix) || el.type === 'radio' || el.tagName === 'TEXTAREA'))
+        .map((el) => ({
+            el: el,
+            tag: el.tagName.toLowerCase(),
+            haystack: [el.id, el.name, el.getAttribute('aria-label'), el.getAttribute('placeholder'), labelText(el)]
+                .join(' ').toLowerCase()
+        }));
+    const result = {};
+    Object.entries(rules).forEach(([name, rule]) => {
+        const tags = rule.tags || ['input', 'select', 'textarea'];
+        const known = (rule.known || []).find((id) => document.getElementById(id));
+        if (known) {
+            result[name] = {id: known, how: 'known'};
+            return;
+        }
+        const eligible = fields.filter((field) => tags.includes(field.tag));
+        const byKeywords = eligible.find((field) =>
+            (rule.keywords || []).some((group) => group.every((word) => field.haystack.includes(word))));
+        if (byKeywords) {
+            result[name] = {id: byKeywords.el.id, how: 'keywords'};
+            return;
+        }
+        const options = rule.options || [];
+        const byOptions = options.length && eligible.find((field) => field.tag === 'select'
+            && field.el.options.length <= options.length + 2
+            && options.every((value) => Array.from(field.el.options).some((option) => option.value === value)));
+        result[name] = byOptions ? {id: byOptions.el.id, how: 'options'} : {id: null, how: 'missing'};
+    });
+    return result;
+}
+"""
+
+
+def form_fingerprint(page, prefix):
+    """Short hash of the form structure (changes when the portal's form changes)."""
+    return hashlib.sha1(page.evaluate(FORM_FINGERPRINT_SCRIPT, prefix).encode('utf-8')).hexdigest()[:12]
+
+
+def _load_schemas(schema_file):
+    try:
+        with open(schema_file, 'r', encoding='utf-8') as f:
+            schemas = json.load(f)
+        return schemas if isinstance(schemas, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_schema(schema_file, form, fingerprint, fields):
+    # Re-read before writing: parallel jobs share the file
+    schemas = _load_schemas(schema_file)
+    entries = schemas.setdefault(form, {})
+    entries[fingerprint] = {'fields': fields, 'discovered_at': time.time()}
+    for stale in sorted(entries, key=lambda key: entries[key].get('discovered_at', 0))[:-MAX_FINGERPRINTS]:
+        del entries[stale]
+    try:
+        tmp_file = f"{schema_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(schemas, f, indent=2)
+        os.replace(tmp_file, schema_file)
+    except OSError as e:
+        print(f"⚠️ Could not save form schema: {e}")
+
+
+def form_fields(page, form, prefix, rules, schema_file=FORM_SCHEMA_FILE):
+    """
+    Map logical fields to element IDs, discovering them only when the form changed.
+
+    Args:
+        page: Playwright page
+        form (str): Name of the form in the schema file, e.g. "ikk"
+        prefix (str): ID prefix of the form's fields, e.g. "ahmgawpm003_"
+        rules (dict): Logical field -> {known, keywords, tags, options}
+        schema_file (str): Where the maps are persisted
+
+    Returns:
+        dict: Logical field -> element ID, or None if the form has no such field
+    """
+    fingerprint = form_fingerprint(page, prefix)
+    cached = _load_schemas(schema_file).get(form, {}).get(fingerprint)
+    if cached and set(rules) <= set(cached['fields']):
+        return {name: cached['fields'][name] for name in rules}
+
+    print(f"🔎 Discovering {form} form fields (fingerprint {fingerprint})...")
+    found = page.evaluate(DISCOVERY_SCRIPT, [prefix, rules])
+    for name, match in found.items():
+        print(f"   {name}: {match['id'] or '-'} ({match['how']})")
+    fields = {name: match['id'] for name, match in found.items()}
+    _save_schema(schema_file, form, fingerprint, fields)
+    return fields
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Declarative Form Specs for the Portaliano Automation Scripts
+============================================================
+
+The IKH personnel modal and the IKK header, personnel, safety induction
+and tool modals were each filled by a hand-written sequence of fill(),
+click() and evaluate() calls. A form spec declares the fields instead:
+
+    IKH_PERSONNEL_SPEC = {
+        'name': 'ikh.personnel',
+        'fields': [
+            {'name': 'nik', 'target': [...selectors...], 'source': 'nik', 'rank': 'ikh.nik_input'},
+            {'name': 'address', 'target': 'ahmgawpm002_alamat_add', 'source': 'address'},
+            ...
+        ]
+    }
+    fill_form(page, IKH_PERSONNEL_SPEC, {'nik': nik, 'address': ...})
+
+Per field:
+
+- target: element id, or a list of CSS selectors / {'label': text} tried in order
+- source (key of the context) or value (literal), or choose (option texts
+  of a select, first match wins)
+- events: fired after setting (default input, change; change for choose)
+- verify: 'equals' (default), 'option' (default for choose), 'nonempty',
+  'checked' or None
+- optional: a missing or unverified field does not fail the form
+- delay: milliseconds to wait before the field (dependent selects)
+- rank: selector cache field; the target list is probed winner first
+- fallback: True (the matched or first target) or callable(page) ->
+  locator, filled with Playwright when the batched fill did not verify
+  (real keystrokes for stubborn inputs)
+
+fill_form() compiles the spec against the context and fills and verifies
+every field in one evaluate() (plus the spec's 'after' helper calls, see
+page_helpers.py). Only fields that failed cost extra round trips, for
+their fallbacks. A required field that still fails raises FormFillError,
+so the step is retried.
+"""
+
+from page_helpers import call_helpers
+from selector_cache import selectors
+
+
+class FormFillError(Exception):
+    """Raised when required fields of a form spec could not be set and verified."""
+
+    def __init__(self, spec_name, fields):
+        super().__init__(f"Form '{spec_name}' fields not set: {', '.join(fields)}")
+        self.spec_name = spec_name
+        self.fields = fields
+
+
+def compile_spec(spec, context, targets=None):
+    """
+    Resolve a form spec against a context into fillForm() field instructions.
+
+    Args:
+        spec (dict): Form spec (name, fields, optional after)
+        context (dict): Values for the fields' sources
+        targets (dict): Field name -> target overriding the spec's (e.g. from the form schema)
+
+    Returns:
+        list: One JSON-serializable instruction per field, in spec order
+    """
+    compiled = []
+    for field in spec['fields']:
+        target = (targets or {}).get(field['name']) or field['target']
+        if field.get('rank'):
+            target = selectors.ordered(field['rank'], target)
+        instruction = {
+            'field': field['name'],
+            'target': target,
+            'optional': field.get('optional', False),
+            'delay': field.get('delay', 0)
+        }
+        if 'choose' in field:
+            instruction['choose'] = list(field['choose'])
+            instruction['verify'] = field.get('verify', 'option')
+        else:
+            value = context[field['source']] if 'source' in field else field['value']
+            instruction['value'] = '' if value is None else str(value)
+            instruction['verify'] = field.get('verify', 'equals')
+        if 'events' in field:
+            instruction['events'] = list(field['events'])
+        compiled.append(instruction)
+    return compiled
+
+
+def fallback_locator(page, field, target, matched=None):
+    """Playwright locator for a field's fallback fill (custom, or the matched / first target)."""
+    if callable(field['fallback']):
+        return field['fallback'](page)
+    if not isinstance(target, list):
+        return page.locator(f"#{target}")
+    item = matched or target[0]
+    if isinstance(item, dict):
+        return page.get_by_label(item['label']).first
+    return page.locator(item).first
+
+
+def fill_form(page, spec, context=None, targets=None):
+    """
+    Fill and verify a form spec in one round trip, then run fallbacks for failed fields.
+
+    Args:
+        page: Playwright page
+        spec (dict): Form spec
+        context (dict): Values for the fields' sources
+        targets (dict): Field name -> target overriding the spec's
+
+    Returns:
+        dict: Field name -> result (found, matched, value, ok)
+
+    Raises:
+        FormFillError: A required field is still not set after its fallback
+    """
+    compiled = compile_spec(spec, context or {}, targets)
+    results = call_helpers(page, [('fillForm', compiled)] + [tuple(call) for call in spec.get('after', [])])
+    report = {result['field']: result for result in results[0]['fields']}
+
+    for field, instruction in zip(spec['fields'], compiled):
+        result = report[field['name']]
+        if field.get('rank') and result['found'] and isinstance(result.get('matched'), str):
+            selectors.found(field['rank'], result['matched'])
+        if result['ok'] or not field.get('fallback') or 'value' not in instruction:
+            continue
+        try:
+            locator = fallback_locator(page, field, instruction['target'], result.get('matched'))
+            locator.fill(instruction['value'])
+            result['value'] = locator.input_value()
+            result['ok'] = result['value'] == instruction['value']
+            result['fallback'] = True
+        except Exception as e:
+            result['error'] = str(e)
+
+    failed = [name for name, result in report.items() if not result['ok']]
+    required = [name for name in failed if not report[name]['optional']]
+    print(f"🧾 {spec['name']}: {len(report) - len(failed)}/{len(report)} fields verified"
+          + (f" (not set: {', '.join(failed)})" if failed else ""))
+    if required:
+        raise FormFillError(spec['name'], required)
+    return report
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Resource-Aware Admission Control for Portaliano Automation
+==========================================================
+
+Every automation job runs its own Chromium, which costs hundreds of MB.
+With a fixed container memory limit, too many concurrent runs end in OOM
+kills instead of slowdowns. The admission controller is a JobQueue gate
+that only lets a job start when the machine can take it:
+
+- Free memory is measured (psutil, capped by the container's cgroup limit)
+  and must cover the job's expected cost plus ADMISSION_MEMORY_RESERVE_MB.
+  Jobs started recently that have not reached their expected size yet are
+  counted as already using it.
+- The expected cost is the p90 peak memory (RSS of the script and its
+  browser processes) of past runs of the same mode, stored in
+  JOB_COST_FILE; DEFAULT_JOB_MEMORY_MB is used until enough runs exist.
+- CPU usage must be below ADMISSION_MAX_CPU_PERCENT.
+
+A job that does not fit stays queued (the queue is parked with the reason)
+and is started once memory or CPU frees up. When this process runs no job
+at all, the next job is always admitted so a small machine still makes
+progress. The gate must come last in a gate chain: admitting a job counts
+it as running right away, before its browser has started.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MEMORY_RESERVE_MB = int(os.environ.get('ADMISSION_MEMORY_RESERVE_MB', 256))  # Kept free for the app
+ADMISSION_MAX_CPU_PERCENT = float(os.environ.get('ADMISSION_MAX_CPU_PERCENT', 90))
+DEFAULT_JOB_MEMORY_MB = int(os.environ.get('DEFAULT_JOB_MEMORY_MB', 500))  # Until enough runs are measured
+
+# Peak memory history per mode
+JOB_COST_FILE = os.environ.get('JOB_COST_FILE', 'job_costs.json')
+JOB_COST_HISTORY_SIZE = 30  # Samples kept per mode
+MIN_COST_SAMPLES = 3  # Samples needed before the history replaces the default
+
+SAMPLE_INTERVAL_SECONDS = 2.0  # Between memory samples of a running job
+
+# cgroup v2 / v1 memory limit and usage of the container
+CGROUP_V2_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory.stat')
+CGROUP_V1_FILES = ('/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes',
+                   '/sys/fs/cgroup/memory/memory.stat')
+
+MB = 1024 * 1024
+
+
+def _read_cgroup_available():
+    """Memory left under the container's cgroup limit in bytes, or None without a limit."""
+    for limit_file, usage_file, stat_file in (CGROUP_V2_FILES, CGROUP_V1_FILES):
+        try:
+            with open(limit_file, 'r') as f:
+                limit = f.read().strip()
+            with open(usage_file, 'r') as f:
+                usage = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if limit == 'max' or int(limit) >= 1 << 60:
+            return None
+        # Inactive page cache is reclaimed before the OOM killer runs
+        inactive = 0
+        try:
+            with open(stat_file, 'r') as f:
+                for line in f:
+                    key, _, value = line.partition(' ')
+                    if key in ('inactive_file', 'total_inactive_file'):
+                        inactive = int(value)
+                        break
+        except (OSError, ValueError):
+            pass
+        return max(0, int(limit) - usage + inactive)
+    return None
+
+
+def available_memory_mb():
+    """Free memory in MB: the host's available memory, capped by the container limit."""
+    available = psutil.virtual_memory().available
+    cgroup_available = _read_cgroup_available()
+    if cgroup_available is not None:
+        available = min(available, cgroup_available)
+    return available / MB
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and all its children (the browser) in MB."""
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0.0
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / MB
+
+
+class AdmissionController:
+    """JobQueue gate admitting jobs by free memory, CPU headroom and learned job cost."""
+
+    def __init__(self, cost_file=JOB_COST_FILE):
+        self.cost_file = cost_file
+        self._lock = threading.Lock()
+        self._costs = self._load()
+        self._running = {}  # job_id -> {'mode', 'pid', 'expected', 'peak', 'sampled_at'}
+        psutil.cpu_percent(interval=None)  # Start the CPU measurement window
+
+    def expected_cost(self, mode):
+        """Expected peak memory of a job in MB (p90 of past runs, or the default)."""
+        with self._lock:
+            return self._expected_locked(mode)
+
+    def gate(self, job):
+        """
+        JobQueue gate: hold the job while memory or CPU cannot take it.
+
+        Returns:
+            str: Reason the job has to wait, or None to admit it
+        """
+        with self._lock:
+            running = list(self._running.values())
+        if running:
+            # Running jobs still growing towards their expected size will take more
+            growing = sum(max(0.0, entry['expected'] - entry['peak']) for entry in running)
+            free = available_memory_mb() - growing
+            needed = self.expected_cost(job['mode']) + ADMISSION_MEMORY_RESERVE_MB
+            if free < needed:
+                return f"Waiting for memory: {free:.0f} MB free, a {job['mode']} run needs ~{needed:.0f} MB"
+
+            cpu = psutil.cpu_percent(interval=None)
+            if cpu > ADMISSION_MAX_CPU_PERCENT:
+                return f"Waiting for CPU: {cpu:.0f}% busy (limit {ADMISSION_MAX_CPU_PERCENT:.0f}%)"
+
+        with self._lock:
+            self._running[job['id']] = {'mode': job['mode'], 'pid': None, 'peak': 0.0, 'sampled_at': 0.0,
+                                        'expected': self._expected_locked(job['mode'])}
+        return None
+
+    def track(self, job_id, mode, pid):
+        """Start measuring a job's automation process (called by the runner)."""
+        with self._lock:
+            entry = self._running.setdefault(job_id, {'mode': mode, 'peak': 0.0, 'sampled_at': 0.0,
+                                                      'expected': self._expected_locked(mode)})
+            entry['pid'] = pid
+
+    def sample(self, job_id):
+        """Update a running job's peak memory (rate-limited to SAMPLE_INTERVAL_SECONDS)."""
+        with self._lock:
+            entry = self._running.get(job_id)
+            if (entry is None or entry['pid'] is None
+                    or time.time() - entry['sampled_at'] < SAMPLE_INTERVAL_SECONDS):
+                return
+            entry['sampled_at'] = time.time()
+            pid = entry['pid']
+        rss = process_tree_rss_mb(pid)
+        with self._lock:
+            if job_id in self._running:
+                self._running[job_id]['peak'] = max(self._running[job_id]['peak'], rss)
+
+    def finish(self, job_id, record=True):
+        """
+        Stop measuring a job and learn its peak memory.
+
+        Args:
+            record (bool): Add the peak to the cost history (skip for runs cut short)
+        """
+        with self._lock:
+            entry = self._running.pop(job_id, None)
+            if entry is None or not record or entry['peak'] <= 0:
+                return
+            samples = self._costs.setdefault(entry['mode'], [])
+            samples.append(round(entry['peak'], 1))
+            del samples[:-JOB_COST_HISTORY_SIZE]
+            try:
+                with open(self.cost_file, 'w', encoding='utf-8') as f:
+                    json.dump(self._costs, f)
+            except OSError as e:
+                logger.error(f"Could not save job costs: {e}")
+        logger.info(f"Job {job_id} peak memory {entry['peak']:.0f} MB ({entry['mode']})")
+
+    def status(self):
+        """Free memory, CPU, expected cost per mode and the measured running jobs."""
+        with self._lock:
+            running = {job_id: {'mode': entry['mode'], 'peak_mb': round(entry['peak'], 1),
+                                'expected_mb': entry['expected']}
+                       for job_id, entry in self._running.items()}
+            modes = list(self._costs)
+        return {
+            'enabled': ADMISSION_ENABLED,
+            'available_memory_mb': round(available_memory_mb(), 1),
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_reserve_mb': ADMISSION_MEMORY_RESERVE_MB,
+            'max_cpu_percent': ADMISSION_MAX_CPU_PERCENT,
+            'expected_cost_mb': {mode: self.expected_cost(mode) for mode in modes},
+            'default_cost_mb': DEFAULT_JOB_MEMORY_MB,
+            'running': running
+        }
+
+    def _expected_locked(self, mode):
+        samples = sorted(self._costs.get(mode, []))
+        if len(samples) < MIN_COST_SAMPLES:
+            return DEFAULT_JOB_MEMORY_MB
+        return samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+
+    def _load(self):
+        try:
+            with open(self.cost_file, 'r', encoding='utf-8') as f:
+                costs = json.load(f)
+            return costs if isinstance(costs, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+
+def chain_gates(*gates):
+    """
+    Combine JobQueue gates: the first reason to hold a job wins.
+
+    A gate may reserve something for the job it lets through (e.g. the
+    breaker's probe slot). If it has a release attribute, that is called
+    with the job when a later gate holds the job after all.
+
+    Args:
+        gates (callable): Gates returning a reason or None (None entries are skipped)
+    """
+    gates = [gate for gate in gates if gate]
+
+    def gate(job):
+        for index, check in enumerate(gates):
+            reason = check(job)
+            if reason:
+                for passed in gates[:index]:
+                    if getattr(passed, 'release', None):
+                        passed.release(job)
+                return reason
+        return None
+    return gate
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Job Queue Backends for Portaliano Automation
+============================================
+
+Storage behind the JobQueue. The queue only touches jobs inside
+backend.transaction(), which yields a QueueState (jobs by ID plus a small
+meta dict) and writes changes back on exit, with the whole transaction
+serialised across every process sharing the backend. Other shared state
+(portal rate limits, circuit breaker) uses meta-only transactions.
+
+Backends (JOB_BACKEND):
+- memory (default): in-process dicts, single Flask node running the jobs
+  itself, exactly as before.
+- sqlite:///path/to/queue.db: SQLite file shared by worker processes on one
+  machine (or on a shared volume). Also the stand-in backend for trying out
+  the multi-worker setup locally.
+- redis://host:6379/0: any Redis-compatible server, for worker containers
+  on several machines (needs the redis package).
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'memory')
+
+# Redis keys and lock settings
+REDIS_PREFIX = os.environ.get('REDIS_PREFIX', 'portaliano')
+REDIS_LOCK_TIMEOUT = 10  # seconds a crashed holder can block the queue
+
+
+class QueueState:
+    """Jobs and scheduler metadata as seen inside one transaction."""
+
+    def __init__(self, jobs=None, meta=None):
+        self.jobs = jobs if jobs is not None else {}
+        self.meta = meta if meta is not None else {}
+
+
+class MemoryBackend:
+    """In-process backend (single node)."""
+
+    shared = False
+
+    def __init__(self):
+        self._state = QueueState()
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def transaction(self, include_jobs=True):
+        with self._lock:
+            yield self._state
+
+
+class _SerializedBackend:
+    """
+    Base for backends storing jobs as JSON documents.
+
+    Transactions are re-entrant per thread: nested calls share the outer
+    transaction's state and only the outermost one writes back.
+    """
+
+    shared = True
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @contextmanager
+    def transaction(self, include_jobs=True):
+        """
+        Args:
+            include_jobs (bool): Load the jobs too (False for meta-only updates)
+        """
+        if getattr(self._local, 'state', None) is not None:
+            yield self._local.state
+            return
+
+        with self._locked():
+            jobs_raw, meta_raw = self._read(include_jobs)
+            state = QueueState({job_id: json.loads(data) for job_id, data in jobs_raw.items()},
+                               {key: json.loads(data) for key, data in meta_raw.items()})
+            self._local.state = state
+            try:
+                yield state
+            finally:
+                self._local.state = None
+
+            # Write back only what changed
+            jobs_changed = {job_id: data for job_id, data in self._dump(state.jobs).items()
+                            if jobs_raw.get(job_id) != data}
+            meta_changed = {key: data for key, data in self._dump(state.meta).items()
+                            if meta_raw.get(key) != data}
+            jobs_deleted = [job_id for job_id in jobs_raw if job_id not in state.jobs]
+            if jobs_changed or meta_changed or jobs_deleted:
+                self._write(jobs_changed, meta_changed, jobs_deleted)
+
+    @staticmethod
+    def _dump(documents):
+        return {key: json.dumps(value, sort_keys=True) for key, value in documents.items()}
+
+    def _locked(self):
+        raise NotImplementedError
+
+    def _read(self, include_jobs):
+        raise NotImplementedError
+
+    def _write(self, jobs_changed, meta_changed, jobs_deleted):
+        raise NotImplementedError
+
+
+class SQLiteBackend(_SerializedBackend):
+    """SQLite file backend (worker processes on one machine or a shared volume)."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _locked(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def _read(self, include_jobs):
+        conn = self._connect()
+        jobs = dict(conn.execute("SELECT id, data FROM jobs").fetchall()) if include_jobs else {}
+        meta = dict(conn.execute("SELECT key, data FROM meta").fetchall())
+        return jobs, meta
+
+    def _write(self, jobs_changed, meta_changed, jobs_deleted):
+        conn = self._connect()
+        conn.executemany("INSERT OR REPLACE INTO jobs (id, data) VALUES (?, ?)", jobs_changed.items())
+        conn.executemany("INSERT OR REPLACE INTO meta (key, data) VALUES (?, ?)", meta_changed.items())
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in jobs_deleted])
+
+
+class RedisBackend(_SerializedBackend):
+    """Redis-compatible backend (worker containers on several machines)."""
+
+    def __init__(self, url, prefix=REDIS_PREFIX):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("JOB_BACKEND=redis:// needs the redis package (pip install redis)")
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._jobs_key = f"{prefix}:jobs"
+        self._meta_key = f"{prefix}:meta"
+        self._lock_key = f"{prefix}:lock"
+
+    @contextmanager
+    def _locked(self):
+        token = uuid.uuid4().hex
+        while not self._redis.set(self._lock_key, token, nx=True, px=REDIS_LOCK_TIMEOUT * 1000):
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            # Release only our own lock (it may have expired and been taken over)
+            self._redis.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+                1, self._lock_key, token
+            )
+
+    def _read(self, include_jobs):
+        jobs = self._redis.hgetall(self._jobs_key) if include_jobs else {}
+        return jobs, self._redis.hgetall(self._meta_key)
+
+    def _write(self, jobs_changed, meta_changed, jobs_deleted):
+        pipe = self._redis.pipeline()
+        if jobs_changed:
+            pipe.hset(self._jobs_key, mapping=jobs_changed)
+        if meta_changed:
+            pipe.hset(self._meta_key, mapping=meta_changed)
+        if jobs_deleted:
+            pipe.hdel(self._jobs_key, *jobs_deleted)
+        pipe.execute()
+
+
+def create_backend(spec=JOB_BACKEND):
+    """
+    Create a queue backend from a JOB_BACKEND spec.
+
+    Args:
+        spec (str): "memory", "sqlite:///path/to/queue.db" or "redis://host:port/db"
+
+    Returns:
+        Backend instance
+    """
+    if not spec or spec == 'memory':
+        return MemoryBackend()
+    if spec.startswith('sqlite:///'):
+        return SQLiteBackend(spec[len('sqlite:///'):])
+    if spec.startswith(('redis://', 'rediss://')):
+        return RedisBackend(spec)
+    raise ValueError(f"Unknown JOB_BACKEND '{spec}'")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency for Portaliano Automation
+==============================================
+
+AIMD (additive increase, multiplicative decrease) controller for the number
+of automation jobs a process runs at once, replacing a fixed MAX_WORKERS:
+
+- Every finished job reports its per-step durations. Each step is compared
+  with its typical latency from the step history (StepHistory.baseline),
+  giving a latency ratio (1.0 = as fast as usual).
+- Every AIMD_INTERVAL_SECONDS the controller looks at the jobs finished in
+  that window. If the median latency ratio exceeds AIMD_LATENCY_TARGET or
+  the failure rate exceeds AIMD_FAILURE_TARGET, the limit is multiplied by
+  AIMD_DECREASE_FACTOR. Otherwise, if the limit was actually reached
+  (jobs were waiting for a slot), it grows by one.
+- The limit stays within [AIMD_MIN_CONCURRENCY, AIMD_MAX_CONCURRENCY].
+
+Every decision is logged with the numbers behind it, so the targets can be
+tuned from the logs. Each worker process runs its own controller, which
+backs off independently when the portal slows down for everyone.
+"""
+
+import os
+import time
+import logging
+import statistics
+
+logger = logging.getLogger(__name__)
+
+AIMD_ENABLED = os.environ.get('AIMD_ENABLED', 'true').lower() == 'true'
+AIMD_MIN_CONCURRENCY = int(os.environ.get('AIMD_MIN_CONCURRENCY', 1))
+AIMD_MAX_CONCURRENCY = int(os.environ.get('AIMD_MAX_CONCURRENCY', 8))
+AIMD_LATENCY_TARGET = float(os.environ.get('AIMD_LATENCY_TARGET', 1.5))  # Median step latency / typical
+AIMD_FAILURE_TARGET = float(os.environ.get('AIMD_FAILURE_TARGET', 0.25))  # Share of failed jobs
+AIMD_DECREASE_FACTOR = float(os.environ.get('AIMD_DECREASE_FACTOR', 0.5))
+AIMD_INTERVAL_SECONDS = int(os.environ.get('AIMD_INTERVAL_SECONDS', 60))
+DECISIONS_KEPT = 50
+
+
+class AIMDController:
+    """Adjusts a concurrency limit from the latency and outcome of finished jobs."""
+
+    def __init__(self, step_history, initial, minimum=AIMD_MIN_CONCURRENCY, maximum=AIMD_MAX_CONCURRENCY):
+        """
+        Args:
+            step_history (StepHistory): Source of typical step latencies
+            initial (int): Starting limit (e.g. MAX_WORKERS)
+            minimum (int): Lower bound for the limit
+            maximum (int): Upper bound for the limit
+        """
+        self.step_history = step_history
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.decisions = []
+        self._samples = []  # (latency_ratio or None, failed, saturated)
+        self._window_started = time.time()
+
+    def observe(self, job, saturated):
+        """
+        Record a finished job (JobQueue observer).
+
+        Args:
+            job (dict): Finished job, with step_durations from the runner
+            saturated (bool): True if the limit was reached when the job finished
+        """
+        if job['status'] == 'cancelled':
+            return
+        ratios = [entry['duration'] / self.step_history.baseline(job['mode'], entry['step'])
+                  for entry in job.get('step_durations') or []]
+        ratio = statistics.median(ratios) if ratios else None
+        self._samples.append((ratio, job['status'] == 'failed', saturated))
+
+        now = time.time()
+        if now - self._window_started >= AIMD_INTERVAL_SECONDS:
+            self._decide(now)
+
+    def status(self):
+        """Current limit, bounds, targets and recent decisions."""
+        return {
+            'enabled': True,
+            'limit': self.limit,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'latency_target': AIMD_LATENCY_TARGET,
+            'failure_target': AIMD_FAILURE_TARGET,
+            'decisions': list(self.decisions)
+        }
+
+    def _decide(self, now):
+        samples, self._samples = self._samples, []
+        self._window_started = now
+        ratios = [ratio for ratio, _, _ in samples if ratio is not None]
+        latency = statistics.median(ratios) if ratios else None
+        failure_rate = sum(1 for _, failed, _ in samples if failed) / len(samples)
+        saturated = any(s for _, _, s in samples)
+
+        old = self.limit
+        if (latency is not None and latency > AIMD_LATENCY_TARGET) or failure_rate > AIMD_FAILURE_TARGET:
+            action = 'decrease'
+            self.limit = max(self.minimum, int(self.limit * AIMD_DECREASE_FACTOR))
+        elif saturated:
+            action = 'increase'
+            self.limit = min(self.maximum, self.limit + 1)
+        else:
+            action = 'hold'
+
+        decision = {
+            'at': round(now, 1),
+            'action': action,
+            'from': old,
+            'to': self.limit,
+            'jobs': len(samples),
+            'latency_ratio': round(latency, 2) if latency is not None else None,
+            'failure_rate': round(failure_rate, 2),
+            'saturated': saturated
+        }
+        self.decisions.append(decision)
+        del self.decisions[:-DECISIONS_KEPT]
+        latency_text = f"x{latency:.2f}" if latency is not None else "n/a"
+        logger.info(f"🎚️ AIMD {action}: concurrency {old} -> {self.limit} "
+                    f"(step latency {latency_text} / target x{AIMD_LATENCY_TARGET}, "
+                    f"failures {failure_rate:.0%} / target {AIMD_FAILURE_TARGET:.0%}, "
+                    f"{len(samples)} jobs, saturated={saturated})")
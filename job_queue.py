@@ -0,0 +1,703 @@
+#!/usr/bin/env python3
+"""
+Job Queue for Portaliano Automation
+===================================
+
+Schedules automation jobs (IKH and the three IKK categories) onto a fixed
+number of worker slots.
+
+Scheduling rules:
+- Jobs carry a priority class (urgent, high, normal, low); higher classes
+  always go first. Waiting jobs age upwards one class per
+  PRIORITY_AGING_SECONDS so low priority work is never starved.
+- Within a priority class, the tenant (contractor company) with the fewest
+  running jobs wins, then the category with the fewest running jobs (then
+  the one served least recently), so neither one tenant nor one category
+  can monopolise every slot.
+- Running jobs are never interrupted: preemption only happens at job
+  boundaries, when a slot frees up.
+
+Cancelling a queued job removes it from the queue immediately. Cancelling a
+running job only flags it and hands it to the canceller callback, which asks
+the job to stop cooperatively; the job is marked cancelled once it exits.
+
+Jobs live in a pluggable backend (see job_backend.py). With the default
+in-memory backend the Flask process runs the jobs itself. With a shared
+backend (SQLite, Redis) the Flask process only submits and reports, and
+worker processes (worker.py) claim jobs with the same scheduling rules;
+each worker heartbeats, and the running jobs of a worker that stops
+heartbeating for WORKER_TIMEOUT_SECONDS are failed.
+
+An optional gate (e.g. the portal circuit breaker) can park the queue: while
+it returns a reason, queued jobs stay queued and report it. An optional
+concurrency controller (job_concurrency.py) replaces the fixed max_running
+and is told about every finished job. An optional credential pool
+(credential_pool.py) leases a portal account to every job it starts; a job
+without a free account waits while later jobs may go ahead.
+
+Coalescing (COALESCE_WINDOW_SECONDS > 0): a job submitted with a coalesce
+key (category, tenant, date, shift, ...) is held for the window. Requests
+with the same key submitted meanwhile are merged into it: their personnel
+are added (deduplicated by NIK) and they become 'merged' requests that
+mirror the permit's status and get its outcome when it finishes. Each
+request keeps the NIKs it asked for (request_niks) as its slice. Cancelling
+a merged request while the permit is queued drops the personnel only it
+asked for; cancelling the permit cancels every request merged into it.
+
+Queue position and estimated start time are derived from the historical
+durations of finished jobs, stored in HISTORY_FILE.
+"""
+
+import os
+import json
+import time
+import uuid
+import heapq
+import socket
+import logging
+import threading
+from functools import partial
+from collections import Counter
+
+from job_backend import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower rank runs first)
+PRIORITY_LEVELS = {'urgent': 0, 'high': 1, 'normal': 2, 'low': 3}
+DEFAULT_PRIORITY = 'normal'
+
+# Job categories used for fair-share scheduling
+CATEGORIES = ('IKH', 'IKK-API', 'IKK-RUANG-TERBATAS', 'IKK-KETINGGIAN')
+
+# A waiting job moves up one priority class after this many seconds
+PRIORITY_AGING_SECONDS = int(os.environ.get('PRIORITY_AGING_SECONDS', 600))
+
+# Duration history used for queue estimates
+HISTORY_FILE = os.environ.get('JOB_HISTORY_FILE', 'job_history.json')
+HISTORY_SIZE = 50  # Samples kept per category
+DEFAULT_BASE_SECONDS = 60  # Login + form setup when no history exists
+DEFAULT_PER_PERSON_SECONDS = 20  # Per personnel entry when no history exists
+
+# Finished jobs kept for the status API
+FINISHED_JOBS_KEPT = 100
+
+# Workers missing heartbeats for this long are considered lost (shared backends)
+WORKER_TIMEOUT_SECONDS = int(os.environ.get('WORKER_TIMEOUT_SECONDS', 60))
+
+# Hold coalescable jobs this long for matching requests to merge into them (0: off)
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', 0))
+
+# Fields a merged request shows from the permit it was merged into
+MIRRORED_FIELDS = ('status', 'started_at', 'queue_position', 'estimated_start', 'parked_reason',
+                   'current_step', 'current_step_detail', 'deadline', 'account')
+
+ACTIVE_STATUSES = ('queued', 'running', 'merged')
+
+
+class JobQueue:
+    """Priority and fair-share scheduler in front of a thread pool executor."""
+
+    def __init__(self, executor, runner, max_running=4, history_file=HISTORY_FILE,
+                 canceller=None, cancelled_exit_code=None, backend=None, dispatch=True, worker_id=None,
+                 gate=None, concurrency=None, credentials=None):
+        """
+        Args:
+            executor: concurrent.futures executor that runs the jobs
+            runner (callable): Called with the job dict and an annotate(**fields)
+                callback for that job, returns the exit code
+            max_running (int): Number of jobs allowed to run at once in this process
+            history_file (str): JSON file with historical job durations
+            canceller (callable): Called with a running job dict to request a stop
+            cancelled_exit_code (int): Exit code meaning the job stopped on request
+            backend: Job storage (job_backend), in-memory by default
+            dispatch (bool): Run jobs in this process (False for a submit-only front end)
+            worker_id (str): Name of this process in the worker list
+            gate (callable): Called with the next job to start, returns a reason
+                to keep it queued (parked) or None to start it
+            concurrency: Controller with a limit attribute and observe(job, saturated),
+                overriding max_running
+            credentials: Pool with lease(job, state, now) and release(job, state, now)
+                giving each started job a portal account
+        """
+        self.executor = executor
+        self.runner = runner
+        self.canceller = canceller
+        self.cancelled_exit_code = cancelled_exit_code
+        self._max_running = max_running
+        self.history_file = history_file
+        self.backend = backend or MemoryBackend()
+        self.dispatch = dispatch
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.gate = gate
+        self.concurrency = concurrency
+        self.credentials = credentials
+        self._history = {}
+        self._history_mtime = None
+        self._cancel_forwarded = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    # --- Public API ---
+
+    @property
+    def max_running(self):
+        """Number of jobs this process may run at once."""
+        return self.concurrency.limit if self.concurrency else self._max_running
+
+    def start(self):
+        """Start the background dispatcher thread (only when this process runs jobs)."""
+        if self.dispatch and self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop dispatching new jobs (running jobs are left to finish)."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def join(self):
+        """Block until the dispatcher has stopped and this process's jobs have finished."""
+        while self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+
+    def submit(self, mode, params, priority=DEFAULT_PRIORITY, personnel_count=1, tenant=None, batch=None,
+               coalesce_key=None):
+        """
+        Queue a new automation job.
+
+        Args:
+            mode (str): Job category (IKH, IKK-API, ...)
+            params (dict): Keyword arguments passed on to the runner
+            priority (str): One of PRIORITY_LEVELS
+            personnel_count (int): Number of selected personnel
+            tenant (str): Tenant profile the job runs for
+            batch (dict): Batch of a split roster: id, part (1-based) and parts
+            coalesce_key (str): Requests with the same key may share one permit
+                (only used when COALESCE_WINDOW_SECONDS is set)
+
+        Returns:
+            dict: Snapshot of the queued (or merged) job including queue position
+        """
+        if priority not in PRIORITY_LEVELS:
+            raise ValueError(f"Unknown priority '{priority}'")
+
+        coalesce_key = coalesce_key if COALESCE_WINDOW_SECONDS > 0 else None
+        with self._cond, self.backend.transaction() as state:
+            now = time.time()
+            seq = state.meta.get('seq', 0) + 1
+            state.meta['seq'] = seq
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'seq': seq,
+                'mode': mode,
+                'tenant': tenant,
+                'priority': priority,
+                'status': 'queued',
+                'personnel_count': max(1, int(personnel_count or 1)),
+                'params': params,
+                'submitted_at': now,
+                'started_at': None,
+                'finished_at': None,
+                'return_code': None,
+                'error': None,
+                'cancel_requested': False,
+                'worker': None,
+                'account': None,
+                'waiting_for': None,
+                'batch': batch,
+                'coalesce_key': coalesce_key,
+                'coalesce_until': now + COALESCE_WINDOW_SECONDS if coalesce_key else None,
+                'request_niks': list(dict.fromkeys(p['nik'] for p in params.get('personnel') or [])),
+                'merged_into': None,
+                'merged_requests': []
+            }
+            state.jobs[job['id']] = job
+            permit = self._coalesce_target(state, job, now)
+            if permit:
+                self._merge_into(permit, job)
+            else:
+                logger.info(f"Queued job {job['id']} ({mode}, tenant={tenant}, priority={priority}, personnel={job['personnel_count']})")
+            if self.dispatch:
+                self._dispatch_ready(state)
+            return self._snapshot(state, job, self._estimate_queue(state, time.time()))
+
+    def cancel(self, job_id):
+        """
+        Cancel a job by ID.
+
+        Returns:
+            dict: Snapshot of the job after the request, or None if unknown
+        """
+        with self._cond, self.backend.transaction() as state:
+            job = state.jobs.get(job_id)
+            if job is None:
+                return None
+
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'
+                job['finished_at'] = time.time()
+                logger.info(f"Cancelled queued job {job_id}")
+                self._settle_merged(state, job)
+                self._cond.notify_all()
+            elif job['status'] == 'merged':
+                self._cancel_merged(state, job)
+            elif job['status'] == 'running' and not job['cancel_requested']:
+                job['cancel_requested'] = True
+                logger.info(f"Cancel requested for running job {job_id}")
+                # Jobs of other workers get the request on their next tick
+                if job['worker'] == self.worker_id:
+                    self._forward_cancel(job)
+            return self._snapshot(state, job, self._estimate_queue(state, time.time()))
+
+    def running_job_ids(self):
+        """IDs of the jobs currently running."""
+        with self.backend.transaction() as state:
+            return [job['id'] for job in state.jobs.values() if job['status'] == 'running']
+
+    def active_job_ids(self):
+        """IDs of the jobs queued or running."""
+        with self.backend.transaction() as state:
+            return [job['id'] for job in state.jobs.values() if job['status'] in ACTIVE_STATUSES]
+
+    def get_job(self, job_id):
+        """Get a snapshot of one job, or None if unknown."""
+        with self.backend.transaction() as state:
+            job = state.jobs.get(job_id)
+            if job is None:
+                return None
+            return self._snapshot(state, job, self._estimate_queue(state, time.time()))
+
+    def list_jobs(self):
+        """Get snapshots of all known jobs, active jobs first in queue order."""
+        with self.backend.transaction() as state:
+            estimates = self._estimate_queue(state, time.time())
+            jobs = [self._snapshot(state, job, estimates) for job in state.jobs.values()]
+        status_rank = {'running': 0, 'queued': 1}
+        jobs.sort(key=lambda j: (status_rank.get(j['status'], 2),
+                                 j.get('queue_position') or 0,
+                                 -(j['finished_at'] or 0)))
+        return jobs
+
+    def list_batch(self, batch_id):
+        """
+        Get snapshots of the jobs of a batch, with their personnel (NIK and name).
+
+        Returns:
+            list: Job snapshots ordered by part, empty if the batch is unknown
+        """
+        with self.backend.transaction() as state:
+            estimates = self._estimate_queue(state, time.time())
+            jobs = []
+            for job in state.jobs.values():
+                if (job.get('batch') or {}).get('id') != batch_id:
+                    continue
+                snapshot = self._snapshot(state, job, estimates)
+                snapshot['personnel'] = [{'nik': person['nik'], 'name': person['name']}
+                                         for person in job['params'].get('personnel') or []]
+                jobs.append(snapshot)
+        jobs.sort(key=lambda j: j['batch']['part'])
+        return jobs
+
+    def list_workers(self):
+        """
+        Get the worker processes pulling from a shared backend.
+
+        Returns:
+            list: Dicts with worker ID, slots, last heartbeat and running job IDs
+        """
+        with self.backend.transaction() as state:
+            workers = state.meta.get('workers', {})
+            running = {}
+            for job in state.jobs.values():
+                if job['status'] == 'running':
+                    running.setdefault(job['worker'], []).append(job['id'])
+            return [{'id': worker_id, 'slots': info['slots'], 'heartbeat': info['heartbeat'],
+                     'running_jobs': running.get(worker_id, [])}
+                    for worker_id, info in sorted(workers.items())]
+
+    def has_active_jobs(self):
+        """True if any job is queued or running."""
+        with self.backend.transaction() as state:
+            return any(job['status'] in ACTIVE_STATUSES for job in state.jobs.values())
+
+    def annotate(self, job_id, **fields):
+        """
+        Attach runtime details (deadline, current step, ...) to a job.
+
+        Fields show up in the job snapshots. Unknown job IDs are ignored.
+        """
+        with self.backend.transaction() as state:
+            job = state.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def estimate_duration(self, mode, personnel_count):
+        """
+        Estimate job duration in seconds from historical runs.
+
+        Fits duration = base + per_person * personnel_count over the recent
+        history of the category, falling back to defaults.
+        """
+        samples = self._load_history().get(mode, [])
+        base, per_person = DEFAULT_BASE_SECONDS, DEFAULT_PER_PERSON_SECONDS
+
+        if samples:
+            xs = [s['personnel_count'] for s in samples]
+            ys = [s['duration'] for s in samples]
+            mean_x = sum(xs) / len(xs)
+            mean_y = sum(ys) / len(ys)
+            var_x = sum((x - mean_x) ** 2 for x in xs)
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x > 0 else 0
+            if slope > 0:
+                per_person = slope
+                base = max(0.0, mean_y - slope * mean_x)
+            else:
+                # Not enough spread in roster sizes: scale the defaults to the observed average
+                scale = mean_y / (DEFAULT_BASE_SECONDS + DEFAULT_PER_PERSON_SECONDS * mean_x)
+                base, per_person = base * scale, per_person * scale
+
+        return base + per_person * max(1, personnel_count)
+
+    # --- Dispatching ---
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                try:
+                    with self.backend.transaction() as state:
+                        self._tick(state, time.time())
+                        # Once stopped, keep heartbeating until our own jobs are done
+                        if self._stopped and self._running_count(state) == 0:
+                            state.meta.get('workers', {}).pop(self.worker_id, None)
+                            return
+                except Exception as e:
+                    logger.error(f"Job dispatcher tick failed: {e}")
+                self._cond.wait(timeout=1.0)
+
+    def _tick(self, state, now):
+        """Heartbeat, recover lost workers, forward cancels and start jobs."""
+        if self.backend.shared:
+            workers = state.meta.setdefault('workers', {})
+            workers[self.worker_id] = {'heartbeat': now, 'slots': self.max_running}
+            self._fail_lost_workers(state, now)
+
+        for job in state.jobs.values():
+            if (job['status'] == 'running' and job['worker'] == self.worker_id
+                    and job['cancel_requested'] and job['id'] not in self._cancel_forwarded):
+                self._forward_cancel(job)
+
+        self._dispatch_ready(state)
+
+    def _dispatch_ready(self, state):
+        """Start queued jobs while this process has free slots. Caller holds the transaction."""
+        now = time.time()
+        last_dispatch = state.meta.setdefault('last_dispatch', {})
+        while not self._stopped and self._running_count(state) < self.max_running:
+            job = self._lease_next(state, now)
+            if job is None:
+                return
+            if self.gate:
+                reason = self.gate(job)
+                if reason:
+                    if self.credentials:
+                        self.credentials.release(job, state, now, used=False)
+                        job['account'] = None
+                    if state.meta.get('parked') != reason:
+                        logger.info(f"Parking queued jobs: {reason}")
+                    state.meta['parked'] = reason
+                    return
+                if state.meta.pop('parked', None):
+                    logger.info("Queue un-parked")
+            job['status'] = 'running'
+            job['started_at'] = now
+            job['worker'] = self.worker_id
+            for key in self._share_keys(job):
+                last_dispatch[key] = now
+            logger.info(f"Starting job {job['id']} ({job['mode']}, priority={job['priority']}, "
+                        f"waited {now - job['submitted_at']:.1f}s)")
+            future = self.executor.submit(self._run_job, dict(job))
+            future.add_done_callback(lambda f, job_id=job['id']: self._on_done(job_id, f))
+
+    def _lease_next(self, state, now):
+        """
+        Choose the next job to start and lease its portal account. Caller holds the transaction.
+
+        Jobs without a free account are skipped and keep the reason in waiting_for.
+        """
+        if not self.credentials:
+            return self._pick_next(state, now)
+        for job in self._queued_in_order(state, now):
+            account, reason = self.credentials.lease(job, state, now)
+            job['waiting_for'] = reason
+            if account:
+                job['account'] = account
+                return job
+        return None
+
+    def _run_job(self, job):
+        return self.runner(job, partial(self.annotate, job['id']))
+
+    def _on_done(self, job_id, future):
+        with self._cond, self.backend.transaction() as state:
+            self._cancel_forwarded.discard(job_id)
+            job = state.jobs.get(job_id)
+            if job is None or job['status'] != 'running':
+                # Failed meanwhile as part of a lost worker
+                return
+
+            job['finished_at'] = time.time()
+            try:
+                return_code = future.result()
+                job['return_code'] = return_code
+                if return_code == 0:
+                    job['status'] = 'completed'
+                elif job['cancel_requested'] or (return_code is not None and return_code == self.cancelled_exit_code):
+                    job['status'] = 'cancelled'
+                else:
+                    job['status'] = 'failed'
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                logger.error(f"Job {job['id']} raised: {e}")
+
+            if self.credentials:
+                self.credentials.release(job, state, job['finished_at'])
+            self._settle_merged(state, job)
+            if job['status'] == 'completed':
+                self._record_duration(job)
+            logger.info(f"Job {job['id']} {job['status']} in {job['finished_at'] - job['started_at']:.1f}s")
+            if self.concurrency:
+                # Saturated: this job held the last free slot or others were waiting
+                saturated = (self._running_count(state) + 1 >= self.max_running
+                             or any(j['status'] == 'queued' for j in state.jobs.values()))
+                self.concurrency.observe(dict(job), saturated)
+            self._prune_finished(state)
+            self._cond.notify_all()
+
+    def _forward_cancel(self, job):
+        self._cancel_forwarded.add(job['id'])
+        if self.canceller:
+            try:
+                self.canceller(job)
+            except Exception as e:
+                logger.error(f"Cancel request for job {job['id']} failed: {e}")
+
+    def _fail_lost_workers(self, state, now):
+        """Fail the running jobs of workers that stopped heartbeating."""
+        workers = state.meta['workers']
+        lost = [worker_id for worker_id, info in workers.items()
+                if now - info['heartbeat'] > WORKER_TIMEOUT_SECONDS]
+        for worker_id in lost:
+            del workers[worker_id]
+            logger.warning(f"Worker {worker_id} lost (no heartbeat for {WORKER_TIMEOUT_SECONDS}s)")
+        for job in state.jobs.values():
+            if job['status'] == 'running' and job['worker'] not in workers:
+                job['status'] = 'failed'
+                job['finished_at'] = now
+                job['error'] = f"Worker {job['worker']} lost"
+                if self.credentials:
+                    self.credentials.release(job, state, now)
+                self._settle_merged(state, job)
+
+    def _running_count(self, state):
+        return sum(1 for job in state.jobs.values()
+                   if job['status'] == 'running' and job['worker'] == self.worker_id)
+
+    def _effective_rank(self, job, now):
+        """Priority rank after aging (lower runs first)."""
+        rank = PRIORITY_LEVELS[job['priority']]
+        if PRIORITY_AGING_SECONDS > 0:
+            rank -= int((now - job['submitted_at']) // PRIORITY_AGING_SECONDS)
+        return max(0, rank)
+
+    @staticmethod
+    def _share_keys(job):
+        """Fair-share groups of a job: its tenant and its category."""
+        return (f"tenant:{job.get('tenant')}", job['mode'])
+
+    def _order_key(self, job, now, running_by_share, last_dispatch):
+        tenant_key, mode_key = self._share_keys(job)
+        return (self._effective_rank(job, now),
+                running_by_share[tenant_key],
+                running_by_share[mode_key],
+                last_dispatch.get(tenant_key, 0),
+                last_dispatch.get(mode_key, 0),
+                job['seq'])
+
+    def _running_by_share(self, jobs):
+        return Counter(key for job in jobs if job['status'] == 'running' for key in self._share_keys(job))
+
+    def _pick_next(self, state, now):
+        """Choose the next queued job to start. Caller holds the transaction."""
+        queued = self._queued_in_order(state, now)
+        return queued[0] if queued else None
+
+    def _queued_in_order(self, state, now):
+        """Queued jobs in the order the scheduler would start them. Caller holds the transaction."""
+        # Jobs still open for coalescing are held until their window ends
+        queued = [job for job in state.jobs.values()
+                  if job['status'] == 'queued' and (job.get('coalesce_until') or 0) <= now]
+        running_by_share = self._running_by_share(state.jobs.values())
+        last_dispatch = state.meta.get('last_dispatch', {})
+        return sorted(queued, key=lambda job: self._order_key(job, now, running_by_share, last_dispatch))
+
+    # --- Queue estimates ---
+
+    def _capacity(self, state):
+        """Total slots: this process, or all live workers of a shared backend."""
+        if self.backend.shared:
+            return sum(info['slots'] for info in state.meta.get('workers', {}).values()) or self.max_running
+        return self.max_running
+
+    def _estimate_queue(self, state, now):
+        """
+        Simulate the scheduler to get each queued job's position and start time.
+
+        Returns:
+            dict: job_id -> (queue_position, estimated_start_epoch)
+        """
+        running = [job for job in state.jobs.values() if job['status'] == 'running']
+        queued = [job for job in state.jobs.values() if job['status'] == 'queued']
+        if not queued:
+            return {}
+
+        capacity = self._capacity(state)
+        remaining = sorted(
+            max(0.0, self.estimate_duration(job['mode'], job['personnel_count']) - (now - job['started_at']))
+            for job in running
+        )
+        free_slots = max(0, capacity - len(running))
+        slots = [0.0] * free_slots + remaining[max(0, len(running) - capacity):]
+        heapq.heapify(slots)
+        if not slots:
+            slots = [0.0]
+
+        running_by_share = self._running_by_share(running)
+        last_dispatch = dict(state.meta.get('last_dispatch', {}))
+        estimates = {}
+        position = 0
+        while queued:
+            job = min(queued, key=lambda j: self._order_key(j, now, running_by_share, last_dispatch))
+            queued.remove(job)
+            position += 1
+            start_offset = heapq.heappop(slots)
+            heapq.heappush(slots, start_offset + self.estimate_duration(job['mode'], job['personnel_count']))
+            for key in self._share_keys(job):
+                running_by_share[key] += 1
+                last_dispatch[key] = now + start_offset
+            estimates[job['id']] = (position, now + start_offset)
+        return estimates
+
+    def _snapshot(self, state, job, estimates):
+        snapshot = {key: value for key, value in job.items() if key != 'params'}
+        snapshot['estimated_duration'] = round(self.estimate_duration(job['mode'], job['personnel_count']), 1)
+        position, estimated_start = estimates.get(job['id'], (None, None))
+        snapshot['queue_position'] = position
+        snapshot['estimated_start'] = estimated_start
+        if job['status'] == 'queued' and (state.meta.get('parked') or job.get('waiting_for')):
+            snapshot['parked_reason'] = state.meta.get('parked') or job['waiting_for']
+        permit = state.jobs.get(job.get('merged_into')) if job['status'] == 'merged' else None
+        if permit:
+            permit_snapshot = self._snapshot(state, permit, estimates)
+            snapshot.update((key, permit_snapshot[key]) for key in MIRRORED_FIELDS if key in permit_snapshot)
+        return snapshot
+
+    # --- Coalescing ---
+
+    def _coalesce_target(self, state, job, now):
+        """Queued permit still open for coalescing that a new job can merge into. Caller holds the transaction."""
+        if not job['coalesce_key']:
+            return None
+        for permit in state.jobs.values():
+            if (permit['id'] != job['id'] and permit['status'] == 'queued'
+                    and permit.get('coalesce_key') == job['coalesce_key']
+                    and (permit.get('coalesce_until') or 0) > now):
+                return permit
+        return None
+
+    def _merge_into(self, permit, job):
+        """Add a request's personnel (deduplicated by NIK) to a permit. Caller holds the transaction."""
+        personnel = permit['params'].setdefault('personnel', [])
+        known = {person['nik'] for person in personnel}
+        added = [person for person in job['params'].get('personnel') or [] if person['nik'] not in known]
+        personnel.extend(added)
+        permit['params']['selected_indices'] = [person.get('row') for person in personnel]
+        permit['personnel_count'] = max(1, len(personnel))
+        permit['merged_requests'].append(job['id'])
+        if PRIORITY_LEVELS[job['priority']] < PRIORITY_LEVELS[permit['priority']]:
+            permit['priority'] = job['priority']
+        job['status'] = 'merged'
+        job['merged_into'] = permit['id']
+        logger.info(f"Merged job {job['id']} into {permit['id']} ({len(added)} added, "
+                    f"{len(job['request_niks']) - len(added)} already included, permit personnel={len(personnel)})")
+
+    def _cancel_merged(self, state, job):
+        """Cancel a merged request, dropping the personnel only it asked for. Caller holds the transaction."""
+        permit = state.jobs.get(job['merged_into'])
+        if permit and permit['status'] != 'queued':
+            logger.info(f"Job {job['id']} is part of running permit {permit['id']} - cancel the permit instead")
+            return
+        if permit:
+            permit['merged_requests'].remove(job['id'])
+            others = set(permit['request_niks'])
+            for request_id in permit['merged_requests']:
+                others.update(state.jobs[request_id]['request_niks'])
+            personnel = [person for person in permit['params'].get('personnel') or [] if person['nik'] in others]
+            permit['params']['personnel'] = personnel
+            permit['params']['selected_indices'] = [person.get('row') for person in personnel]
+            permit['personnel_count'] = max(1, len(personnel))
+        job['status'] = 'cancelled'
+        job['finished_at'] = time.time()
+        logger.info(f"Cancelled merged job {job['id']}")
+
+    def _settle_merged(self, state, permit):
+        """Give the requests merged into a finished permit its outcome. Caller holds the transaction."""
+        for request_id in permit.get('merged_requests') or []:
+            request = state.jobs.get(request_id)
+            if request and request['status'] == 'merged':
+                request.update(status=permit['status'], started_at=permit['started_at'],
+                               finished_at=permit['finished_at'], return_code=permit['return_code'],
+                               error=permit['error'])
+
+    def _prune_finished(self, state):
+        finished = [job for job in state.jobs.values() if job['status'] not in ACTIVE_STATUSES]
+        if len(finished) > FINISHED_JOBS_KEPT:
+            finished.sort(key=lambda j: j['finished_at'] or 0)
+            for job in finished[:len(finished) - FINISHED_JOBS_KEPT]:
+                del state.jobs[job['id']]
+
+    # --- Duration history ---
+
+    def _load_history(self):
+        """Duration history, reloaded when another process has updated the file."""
+        try:
+            mtime = os.path.getmtime(self.history_file)
+        except OSError:
+            return self._history
+        if mtime != self._history_mtime:
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+                self._history = history if isinstance(history, dict) else {}
+                self._history_mtime = mtime
+            except (OSError, ValueError):
+                pass
+        return self._history
+
+    def _record_duration(self, job):
+        history = self._load_history()
+        samples = history.setdefault(job['mode'], [])
+        samples.append({
+            'duration': round(job['finished_at'] - job['started_at'], 2),
+            'personnel_count': job['personnel_count'],
+            'finished_at': job['finished_at']
+        })
+        del samples[:-HISTORY_SIZE]
+        try:
+            with open(self.history_file, 'w', encoding='utf-8') as f:
+                json.dump(history, f)
+        except OSError as e:
+            logger.error(f"Could not save job history: {e}")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Job Artifact Retention for Portaliano Automation
+================================================
+
+Background sweeper keeping JOBS_DIR bounded:
+
+- Age: directories of finished jobs untouched for ARTIFACT_MAX_AGE_HOURS are
+  removed entirely (artifacts, progress, cancel token).
+- Size: while all artifacts together exceed ARTIFACT_MAX_TOTAL_MB, the
+  oldest artifacts of finished jobs are deleted first.
+
+Directories of queued or running jobs are never touched.
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+
+from job_runtime import JOBS_DIR, ARTIFACTS_SUBDIR
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_MAX_AGE_HOURS = float(os.environ.get('ARTIFACT_MAX_AGE_HOURS', 72))
+ARTIFACT_MAX_TOTAL_MB = float(os.environ.get('ARTIFACT_MAX_TOTAL_MB', 500))
+ARTIFACT_SWEEP_SECONDS = int(os.environ.get('ARTIFACT_SWEEP_SECONDS', 600))
+
+
+class RetentionSweeper:
+    """Periodically applies the age and size limits to the job directories."""
+
+    def __init__(self, active_job_ids, jobs_dir=JOBS_DIR, max_age_hours=ARTIFACT_MAX_AGE_HOURS,
+                 max_total_mb=ARTIFACT_MAX_TOTAL_MB, interval=ARTIFACT_SWEEP_SECONDS):
+        """
+        Args:
+            active_job_ids (callable): Returns the IDs of queued and running jobs
+            jobs_dir (str): Root of the per-job directories
+            max_age_hours (float): Age after which a finished job's directory is removed
+            max_total_mb (float): Size budget for all artifacts together
+            interval (int): Seconds between sweeps
+        """
+        self.active_job_ids = active_job_ids
+        self.jobs_dir = jobs_dir
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = max_total_mb * 1024 * 1024
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background sweeper thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sweep_loop, name='artifact-retention', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the sweeper thread."""
+        self._stop.set()
+
+    def sweep(self, now=None):
+        """
+        Apply the retention policy once.
+
+        Returns:
+            dict: Number of removed job directories and artifacts, bytes freed
+        """
+        now = now or time.time()
+        active = set(self.active_job_ids())
+        removed = {'job_dirs': 0, 'artifacts': 0, 'bytes': 0}
+
+        try:
+            job_ids = [entry.name for entry in os.scandir(self.jobs_dir) if entry.is_dir()]
+        except OSError:
+            return removed
+
+        # Age: drop whole directories of finished jobs
+        artifacts = []
+        total_bytes = 0
+        for job_id in job_ids:
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            files = self._files(job_dir)
+            last_modified = max((mtime for _, _, mtime in files), default=os.path.getmtime(job_dir))
+            if job_id not in active and now - last_modified > self.max_age:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                removed['job_dirs'] += 1
+                removed['bytes'] += sum(size for _, size, _ in files)
+                continue
+
+            artifacts_dir = os.path.join(job_dir, ARTIFACTS_SUBDIR)
+            for path, size, mtime in files:
+                if os.path.dirname(path) == artifacts_dir:
+                    total_bytes += size
+                    if job_id not in active:
+                        artifacts.append((mtime, path, size))
+
+        # Size: drop the oldest artifacts of finished jobs until under budget
+        artifacts.sort()
+        for _, path, size in artifacts:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            removed['artifacts'] += 1
+            removed['bytes'] += size
+
+        if removed['job_dirs'] or removed['artifacts']:
+            logger.info(f"Retention removed {removed['job_dirs']} job dirs and {removed['artifacts']} artifacts "
+                        f"({removed['bytes'] / 1024 / 1024:.1f} MB)")
+        return removed
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Artifact retention sweep failed: {e}")
+
+    @staticmethod
+    def _files(job_dir):
+        files = []
+        for root, _, names in os.walk(job_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+        return files
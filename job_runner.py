@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Automation Job Runner for Portaliano
+====================================
+
+Runs one queued job as an automation script subprocess: builds the command
+line, streams output into AUTOMATION_LOG, enforces the roster-sized
+deadline and per-step watchdog, and honours cooperative cancellation.
+
+Used by the Flask app (in-memory queue backend) and by worker.py (shared
+queue backend), so it must not depend on Flask.
+"""
+
+import os
+import time
+import logging
+import datetime
+import subprocess
+
+from job_runtime import job_dir_for, request_cancel, is_cancel_requested, CANCELLED_EXIT_CODE, JOB_DIR_ENV
+from job_watchdog import StepHistory, Watchdog, StepStalled
+from portal_guard import portal_guard
+from credential_pool import CredentialPool, USERNAME_ENV, PASSWORD_ENV
+from tenants import tenant_accounts, TENANT_ENV
+from dry_run import DRY_RUN_FLAG
+from roster import write_roster, ROSTER_FLAG
+from job_admission import AdmissionController
+
+logger = logging.getLogger(__name__)
+
+# Shared automation log read by the UI
+AUTOMATION_LOG = os.environ.get('AUTOMATION_LOG', 'automation.log')
+
+# Time a cancelled job gets to stop at its next step before it is terminated
+CANCEL_GRACE_SECONDS = int(os.environ.get('CANCEL_GRACE_SECONDS', 30))
+
+# Per-step latency history behind job deadlines and the step watchdog
+step_history = StepHistory()
+
+# Portal accounts leased to jobs by the queue
+credential_pool = CredentialPool(tenant_accounts=tenant_accounts)
+
+# Memory/CPU admission of this process's jobs, learning their peak memory
+admission = AdmissionController()
+
+
+def wait_for_process(process, job_dir, timeout, watchdog=None, on_step=None, on_poll=None):
+    """
+    Wait for an automation process, honouring cooperative cancellation.
+
+    A cancelled job gets CANCEL_GRACE_SECONDS to stop at its next step
+    boundary before it is terminated.
+
+    Args:
+        on_poll (callable): Called on every poll, e.g. to sample the job's memory
+
+    Raises:
+        subprocess.TimeoutExpired: If the process runs longer than timeout
+        StepStalled: If the watchdog finds a step over its budget
+    """
+    started = time.time()
+    cancel_seen_at = None
+    last_step = None
+    while True:
+        try:
+            return process.wait(timeout=0.5)
+        except subprocess.TimeoutExpired:
+            pass
+        
+        now = time.time()
+        if now - started > timeout:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        
+        if on_poll:
+            on_poll()
+        
+        if watchdog:
+            watchdog.check(now)
+            step = (watchdog.current_step, (watchdog.progress or {}).get('detail'))
+            if on_step and step != last_step:
+                last_step = step
+                on_step(*step)
+        
+        if job_dir and is_cancel_requested(job_dir):
+            cancel_seen_at = cancel_seen_at or now
+            if now - cancel_seen_at > CANCEL_GRACE_SECONDS:
+                logger.warning(f"Process {process.pid} ignored cancel request, terminating")
+                process.terminate()
+                try:
+                    return process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    return process.wait()
+
+
+def run_automation_process(script_path, csv_path, selected_indices, selected_date, selected_shift, mode,
+                           tenant=None, dry_run=False, personnel=None, job_id=None, annotate=None, credentials=None):
+    """
+    Run automation process and return its exit code (None on timeout or error).
+
+    Args:
+        tenant (str): Tenant profile whose company data the script fills in
+        dry_run (bool): Fill the form but stop before Submit (form state and timings as artifacts)
+        personnel (list): Personnel records snapshotted at submit (the script then skips the CSV)
+        annotate (callable): Called with job fields to publish (deadline, current step, errors)
+        credentials (tuple): (username, password) of the leased portal account
+    """
+    process = None
+    return_code = None
+    job_dir = job_dir_for(job_id) if job_id else None
+    watchdog = None
+    annotate = annotate or (lambda **fields: None)
+    deadline = step_history.job_deadline(mode, len(personnel or selected_indices or []))
+    try:
+        env = os.environ.copy()
+        env['DISPLAY'] = os.environ.get('DISPLAY', ':0')
+        env['PLAYWRIGHT_HEADLESS'] = os.environ.get('PLAYWRIGHT_HEADLESS', 'true')
+        env['PYTHONUNBUFFERED'] = '1'
+        if job_dir:
+            env[JOB_DIR_ENV] = job_dir
+        if credentials:
+            env[USERNAME_ENV], env[PASSWORD_ENV] = credentials
+        if tenant:
+            env[TENANT_ENV] = tenant
+        roster_path = write_roster(job_dir, personnel) if personnel and job_dir else None
+        
+        # Build command based on script type
+        if 'ikk_automation.py' in script_path:
+            category_map = {
+                'IKK-API': 'IA',
+                'IKK-RUANG-TERBATAS': 'IR', 
+                'IKK-KETINGGIAN': 'IK'
+            }
+            category = category_map.get(mode, 'IA')
+            
+            # Use today's date if no selected_date provided
+            work_date = selected_date if selected_date else datetime.datetime.now().strftime('%d/%m/%Y')
+            
+            process_args = [
+                'python3', 
+                script_path, 
+                category,
+                work_date,
+                'MELTING REPAIR',
+                str(selected_shift or 1),
+                f"--csv={csv_path}"
+            ]
+            if selected_indices and len(selected_indices) > 0:
+                process_args.extend([str(i) for i in selected_indices])
+            if dry_run:
+                process_args.append(DRY_RUN_FLAG)
+            if roster_path:
+                process_args.append(f"{ROSTER_FLAG}={roster_path}")
+        else:
+            # IKH script format
+            process_args = ['python3', script_path, csv_path]
+            
+            if selected_indices and len(selected_indices) > 0:
+                process_args.extend([str(i) for i in selected_indices])
+            
+            if selected_date:
+                process_args.append(f"--date={selected_date}")
+                
+            if selected_shift:
+                process_args.append(f"--shift={selected_shift}")
+            
+            if dry_run:
+                process_args.append(DRY_RUN_FLAG)
+            
+            if roster_path:
+                process_args.append(f"{ROSTER_FLAG}={roster_path}")
+        
+        logger.info(f"Starting {mode} automation with command: {' '.join(process_args)}")
+        
+        # Initialize log with detailed information
+        log_path = AUTOMATION_LOG
+        with open(log_path, 'a', encoding='utf-8') as log_file:
+            log_file.write(f"🚀 {mode} AUTOMATION STARTED\n")
+            log_file.write("="*50 + "\n")
+            if job_id:
+                log_file.write(f"🆔 Job: {job_id}\n")
+            if tenant:
+                log_file.write(f"🏢 Tenant: {tenant}\n")
+            if dry_run:
+                log_file.write("🧪 Dry run: stops before Submit\n")
+            log_file.write(f"📂 Category: {category if 'ikk_automation.py' in script_path else 'IKH'}\n")
+            log_file.write(f"📄 CSV File: {csv_path}\n")
+            if personnel:
+                log_file.write(f"👥 Personnel: {len(personnel)} (snapshot taken at submit)\n")
+            log_file.write(f"📅 Date: {selected_date}\n")
+            log_file.write(f"⏰ Shift: {selected_shift}\n")
+            log_file.write(f"🔧 Script: {script_path}\n")
+            log_file.write(f"💻 Command: {' '.join(process_args)}\n")
+            log_file.write(f"⏳ Deadline: {deadline / 60:.1f} minutes\n")
+            if credentials:
+                log_file.write(f"👤 Account: {credentials[0]}\n")
+            log_file.write("="*50 + "\n\n")
+            log_file.flush()
+        
+        # Start process with line buffering for real-time output
+        with open(log_path, 'a', encoding='utf-8') as log_file:
+            process = subprocess.Popen(
+                process_args, 
+                stdout=log_file, 
+                stderr=subprocess.STDOUT, 
+                text=True, 
+                env=env,
+                bufsize=1,  # Line buffering for real-time output
+                universal_newlines=True
+            )
+            annotate(deadline=round(deadline))
+            if job_id:
+                admission.track(job_id, mode, process.pid)
+            if job_dir:
+                watchdog = Watchdog(step_history, mode, job_dir)
+            
+            def publish_step(step, detail):
+                annotate(current_step=step, current_step_detail=detail)
+            
+            try:
+                return_code = wait_for_process(process, job_dir, deadline, watchdog, publish_step,
+                                               lambda: admission.sample(job_id))
+                
+                if return_code == 0:
+                    log_file.write(f"\n🎉 {mode} {'DRY RUN ' if dry_run else ''}COMPLETED SUCCESSFULLY!\n")
+                    log_file.write("="*50 + "\n")
+                    log_file.write(f"✅ Process finished with exit code: {return_code}\n")
+                    log_file.write(f"⏰ Completion time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    log_file.write("="*50 + "\n")
+                elif return_code == CANCELLED_EXIT_CODE or is_cancel_requested(job_dir):
+                    log_file.write(f"\n🛑 {mode} CANCELLED BY USER\n")
+                    log_file.write("="*50 + "\n")
+                    log_file.write(f"⏰ Cancel time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    log_file.write("="*50 + "\n")
+                else:
+                    log_file.write(f"\n❌ PROCESS FAILED!\n")
+                    log_file.write("="*50 + "\n")
+                    log_file.write(f"🔥 Exit code: {return_code}\n")
+                    log_file.write(f"⏰ Failure time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    log_file.write("="*50 + "\n")
+                    
+            except StepStalled as e:
+                return_code = None
+                terminate_process(process)
+                annotate(stalled_step=e.step, error=str(e))
+                portal_guard.record(e.step, False, e.elapsed, job_id=job_id)
+                
+                log_file.write(f"\n⏱️ STEP STALLED!\n")
+                log_file.write("="*50 + "\n")
+                log_file.write(f"🧩 Step: {e.step}{' ' + e.detail if e.detail else ''}\n")
+                log_file.write(f"🕐 Running {e.elapsed:.0f}s, budget {e.budget:.0f}s\n")
+                log_file.write(f"⏰ Abort time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                log_file.write("="*50 + "\n")
+                
+            except subprocess.TimeoutExpired:
+                return_code = None
+                terminate_process(process)
+                annotate(error=f"Deadline of {deadline:.0f}s exceeded")
+                        
+                log_file.write(f"\n⏰ PROCESS TIMED OUT!\n")
+                log_file.write("="*50 + "\n")
+                log_file.write(f"🕐 Timeout after {deadline / 60:.1f} minutes\n")
+                log_file.write(f"⏰ Timeout time: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                log_file.write("="*50 + "\n")
+                
+    except Exception as e:
+        logger.error(f"Automation process error: {e}")
+        try:
+            with open(AUTOMATION_LOG, 'a', encoding='utf-8') as log_file:
+                log_file.write(f"\nError: {str(e)}\n")
+        except:
+            pass
+    finally:
+        if process and process.poll() is None:
+            try:
+                process.terminate()
+            except:
+                pass
+        if job_id:
+            # Learn the job's memory cost from complete runs only
+            admission.finish(job_id, record=return_code == 0 and not dry_run)
+        if watchdog:
+            # Learn step latencies; the last step only counts when the run succeeded
+            steps = watchdog.completed_steps(time.time() if return_code == 0 else None)
+            step_history.record(mode, steps)
+            annotate(step_durations=steps)
+    return return_code
+
+
+def terminate_process(process):
+    """Terminate an automation process, killing it if it does not exit."""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_automation_job(job, annotate):
+    """Job queue runner: execute a queued automation job."""
+    credentials = credential_pool.credentials(job['account']) if job.get('account') else None
+    return run_automation_process(job_id=job['id'], annotate=annotate, credentials=credentials, **job['params'])
+
+
+def request_job_cancel(job):
+    """Job queue canceller: set the cancel token checked by the script between steps."""
+    request_cancel(job_dir_for(job['id']))
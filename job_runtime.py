@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Job Runtime for Portaliano Automation
+=====================================
+
+Shared between the Flask app and the automation scripts.
+
+Each queued job gets its own directory (JOBS_DIR/<job_id>). The app passes
+it to the script through the PORTALIANO_JOB_DIR environment variable and
+uses it to talk to the running script:
+
+- Cancellation: the app drops a cancel token file into the job directory.
+  The script calls check_cancelled() between steps (between personnel,
+  before submit, ...) and stops cleanly, closing only its own browser
+  context, instead of being killed with SIGTERM/SIGKILL.
+- Progress: start_step() records the step the script is in and how long
+  the previous steps took (progress.json). The app's watchdog uses it to
+  enforce per-step budgets and to learn per-step latencies. Failed
+  attempts of a retried step and rate limit waits are recorded as their
+  own entries (kind 'failed_attempt' / 'wait'), not as step latencies.
+- Artifacts: screenshots go to the job's artifacts/ directory through
+  artifact_path(), so concurrent jobs never overwrite each other's files.
+"""
+
+import os
+import json
+import time
+
+# Root directory for per-job runtime files
+JOBS_DIR = os.environ.get('JOBS_DIR', 'jobs')
+
+# Environment variable carrying the job directory to the automation script
+JOB_DIR_ENV = 'PORTALIANO_JOB_DIR'
+
+# Exit code used by the scripts when they stop because of a cancel token
+CANCELLED_EXIT_CODE = 3
+
+CANCEL_TOKEN = 'cancel'
+PROGRESS_FILE = 'progress.json'
+ARTIFACTS_SUBDIR = 'artifacts'
+
+# Step progress of the running script (first_started_at: start of the first step, ends startup)
+_progress = {'step': None, 'detail': None, 'started_at': None, 'first_started_at': None, 'completed': []}
+
+# Script start, for the startup phase before the first step
+_script_started_at = time.time()
+
+
+class JobCancelled(BaseException):
+    """
+    Raised by check_cancelled() when the job has been cancelled.
+
+    Derives from BaseException so the scripts' broad ``except Exception``
+    fallbacks do not swallow it.
+    """
+
+    def __init__(self, step=None):
+        super().__init__(f"Job cancelled before step: {step}" if step else "Job cancelled")
+        self.step = step
+
+
+def job_dir_for(job_id):
+    """Get the runtime directory for a job ID (created if missing)."""
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    return job_dir
+
+
+def current_job_dir():
+    """Get the job directory of the running script, or None when run by hand."""
+    return os.environ.get(JOB_DIR_ENV) or None
+
+
+def request_cancel(job_dir):
+    """Set the cancel token for a job (called by the app)."""
+    with open(os.path.join(job_dir, CANCEL_TOKEN), 'w', encoding='utf-8') as f:
+        f.write(str(time.time()))
+
+
+def is_cancel_requested(job_dir=None):
+    """
+    Check whether the job has been cancelled.
+
+    Args:
+        job_dir (str): Job directory, defaults to the running script's one
+
+    Returns:
+        bool: True if a cancel token is present
+    """
+    job_dir = job_dir or current_job_dir()
+    return bool(job_dir) and os.path.exists(os.path.join(job_dir, CANCEL_TOKEN))
+
+
+def check_cancelled(step=None):
+    """
+    Cancellation checkpoint for the automation scripts.
+
+    Args:
+        step (str): Name of the step about to start (for the log)
+
+    Raises:
+        JobCancelled: If the app has requested cancellation
+    """
+    if is_cancel_requested():
+        print(f"🛑 Cancel requested - stopping before: {step or 'next step'}")
+        raise JobCancelled(step)
+
+
+def start_step(step, detail=None):
+    """
+    Mark the start of an automation step (also a cancellation checkpoint).
+
+    Args:
+        step (str): Step kind used for budgets (login, set_date, add_personnel, ...)
+        detail (str): Extra info for the log, e.g. "3/25" for personnel
+
+    Raises:
+        JobCancelled: If the app has requested cancellation
+    """
+    check_cancelled(f"{step} {detail}" if detail else step)
+
+    now = time.time()
+    if _progress['step']:
+        _progress['completed'].append({
+            'step': _progress['step'],
+            'detail': _progress['detail'],
+            'duration': round(now - _progress['started_at'], 3)
+        })
+    else:
+        _progress['first_started_at'] = now
+    _progress.update(step=step, detail=detail, started_at=now)
+    _write_progress()
+
+
+def extend_step(seconds):
+    """
+    Exclude time spent waiting (e.g. for a rate limit token) from the running step.
+
+    The wait is recorded as a 'wait' entry of the step instead (consecutive
+    waits are merged).
+
+    Args:
+        seconds (float): Time to take off the step's elapsed time
+    """
+    if _progress['step']:
+        _progress['started_at'] += seconds
+        completed = _progress['completed']
+        last = completed[-1] if completed else {}
+        if last.get('kind') == 'wait' and last['step'] == _progress['step'] and last['detail'] == _progress['detail']:
+            last['duration'] = round(last['duration'] + seconds, 3)
+        else:
+            completed.append({'step': _progress['step'], 'detail': _progress['detail'],
+                              'duration': round(seconds, 3), 'kind': 'wait'})
+        _write_progress()
+
+
+def retry_step(detail=None):
+    """
+    Restart the running step for a retry attempt (also a cancellation checkpoint).
+
+    The failed attempt (with its backoff) is recorded as a 'failed_attempt'
+    entry, not as a completed step, and the retry gets the step's full budget.
+
+    Args:
+        detail (str): Extra info for the log, e.g. "3/25 retry 2"
+
+    Raises:
+        JobCancelled: If the app has requested cancellation
+    """
+    step = _progress['step']
+    check_cancelled(f"{step} {detail}" if detail else step)
+    if step:
+        now = time.time()
+        _progress['completed'].append({'step': step, 'detail': _progress['detail'],
+                                       'duration': round(now - _progress['started_at'], 3), 'kind': 'failed_attempt'})
+        _progress.update(detail=detail, started_at=now)
+        _write_progress()
+
+
+def step_timings(now=None):
+    """
+    Durations of the script's steps so far, for timing reports.
+
+    Args:
+        now (float): Close the running step at this time (default: now)
+
+    Returns:
+        list: Dicts with step, detail and duration (seconds), starting with
+        the startup phase before the first step; failed attempts and waits
+        carry a kind
+    """
+    now = now or time.time()
+    timings = list(_progress['completed'])
+    if _progress['step']:
+        timings.append({'step': _progress['step'], 'detail': _progress['detail'],
+                        'duration': round(now - _progress['started_at'], 3)})
+        timings.insert(0, {'step': 'startup', 'detail': None,
+                           'duration': round(_progress['first_started_at'] - _script_started_at, 3)})
+    return timings
+
+
+def _write_progress():
+    job_dir = current_job_dir()
+    if not job_dir:
+        return
+    path = os.path.join(job_dir, PROGRESS_FILE)
+    try:
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(_progress, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"⚠️ Could not write progress: {e}")
+
+
+def read_progress(job_dir):
+    """Read the step progress written by a running script (called by the app)."""
+    try:
+        with open(os.path.join(job_dir, PROGRESS_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def artifact_path(name):
+    """
+    Get the path for a screenshot or other artifact of the running script.
+
+    Args:
+        name (str): File name, e.g. "date_setting_error.png"
+
+    Returns:
+        str: Path inside the job's artifacts directory, or just the name
+        (working directory) when the script is run by hand
+    """
+    job_dir = current_job_dir()
+    if not job_dir:
+        return name
+    artifacts_dir = os.path.join(job_dir, ARTIFACTS_SUBDIR)
+    os.makedirs(artifacts_dir, exist_ok=True)
+    return os.path.join(artifacts_dir, name)
+
+
+def list_artifacts(job_dir):
+    """
+    List the artifacts of a job (called by the app).
+
+    Returns:
+        list: Dicts with name, size (bytes) and modified (timestamp), oldest first
+    """
+    artifacts_dir = os.path.join(job_dir, ARTIFACTS_SUBDIR)
+    try:
+        entries = list(os.scandir(artifacts_dir))
+    except OSError:
+        return []
+    artifacts = []
+    for entry in entries:
+        if entry.is_file():
+            stat = entry.stat()
+            artifacts.append({'name': entry.name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    artifacts.sort(key=lambda a: a['modified'])
+    return artifacts
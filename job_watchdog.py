@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Job Watchdog for Portaliano Automation
+======================================
+
+Replaces the fixed 30 minute process timeout with budgets sized to the job:
+
+- Every step the scripts report through job_runtime.start_step() has its
+  own budget, learned from historical per-step latencies (STEP_HISTORY_FILE)
+  or taken from DEFAULT_STEP_BUDGETS until enough samples exist.
+- The job deadline is the sum of the fixed step budgets plus one
+  add_personnel budget per selected person.
+- The Watchdog follows a running job's progress and reports the first step
+  that exceeds its budget, so the app can abort it and free the slot.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from job_runtime import read_progress, PROGRESS_FILE
+
+logger = logging.getLogger(__name__)
+
+# Step latency history
+STEP_HISTORY_FILE = os.environ.get('STEP_HISTORY_FILE', 'step_history.json')
+STEP_HISTORY_SIZE = 50  # Samples kept per step
+MIN_STEP_SAMPLES = 5  # Samples needed before the history replaces the defaults
+
+# Budget = p95 of historical latency * multiplier (never below MIN_STEP_BUDGET)
+STEP_BUDGET_MULTIPLIER = float(os.environ.get('STEP_BUDGET_MULTIPLIER', 3.0))
+MIN_STEP_BUDGET = 15  # seconds
+MAX_JOB_DEADLINE = int(os.environ.get('MAX_JOB_DEADLINE', 3600))  # seconds
+
+# Default budgets in seconds (used until enough history exists)
+DEFAULT_STEP_BUDGETS = {
+    'startup': 60,  # Python + browser launch before the first step
+    'login': 120,
+    'form_setup': 90,
+    'set_date': 90,
+    'set_work_date': 90,
+    'set_shift': 60,
+    'add_personnel': 45,
+    'add_area': 60,
+    'add_tool': 60,
+    'accept_terms': 30,
+    'verify_form': 60,
+    'submit': 90
+}
+DEFAULT_STEP_BUDGET = 120
+
+# Steps each script runs once per job (add_personnel runs once per person)
+JOB_STEPS = {
+    'IKH': ('startup', 'login', 'form_setup', 'set_date', 'set_shift', 'add_area', 'accept_terms', 'verify_form',
+            'submit'),
+    'IKK': ('startup', 'login', 'form_setup', 'set_shift', 'set_work_date', 'add_area', 'add_tool', 'accept_terms',
+            'verify_form', 'submit')
+}
+
+
+def script_kind(mode):
+    """Map a job mode (IKH, IKK-API, ...) to the script it runs."""
+    return 'IKH' if mode == 'IKH' else 'IKK'
+
+
+class StepStalled(Exception):
+    """Raised when a running step exceeds its budget."""
+
+    def __init__(self, step, detail, elapsed, budget):
+        label = f"{step} {detail}" if detail else step
+        super().__init__(f"Step '{label}' stalled: {elapsed:.0f}s exceeds budget of {budget:.0f}s")
+        self.step = step
+        self.detail = detail
+        self.elapsed = elapsed
+        self.budget = budget
+
+
+class StepHistory:
+    """Historical per-step latencies, keyed by job mode then step."""
+
+    def __init__(self, history_file=STEP_HISTORY_FILE):
+        self.history_file = history_file
+        self._history = self._load()
+        self._lock = threading.Lock()  # Shared by all job threads
+
+    def step_budget(self, mode, step):
+        """
+        Get the time budget for one step.
+
+        Args:
+            mode (str): Job mode (IKH, IKK-API, ...)
+            step (str): Step kind
+
+        Returns:
+            float: Budget in seconds
+        """
+        with self._lock:
+            samples = sorted(self._history.get(mode, {}).get(step, []))
+        if len(samples) < MIN_STEP_SAMPLES:
+            return DEFAULT_STEP_BUDGETS.get(step, DEFAULT_STEP_BUDGET)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return max(MIN_STEP_BUDGET, p95 * STEP_BUDGET_MULTIPLIER)
+
+    def baseline(self, mode, step):
+        """
+        Get the typical latency of one step (median of the history).
+
+        Returns:
+            float: Seconds (default budget / STEP_BUDGET_MULTIPLIER without enough history)
+        """
+        with self._lock:
+            samples = sorted(self._history.get(mode, {}).get(step, []))
+        if len(samples) < MIN_STEP_SAMPLES:
+            return DEFAULT_STEP_BUDGETS.get(step, DEFAULT_STEP_BUDGET) / STEP_BUDGET_MULTIPLIER
+        return max(0.001, samples[len(samples) // 2])
+
+    def job_deadline(self, mode, personnel_count):
+        """
+        Get the overall deadline for a job, sized to its roster.
+
+        Returns:
+            float: Deadline in seconds (capped at MAX_JOB_DEADLINE)
+        """
+        fixed = sum(self.step_budget(mode, step) for step in JOB_STEPS[script_kind(mode)])
+        per_person = self.step_budget(mode, 'add_personnel') * max(1, personnel_count)
+        return min(MAX_JOB_DEADLINE, fixed + per_person)
+
+    def record(self, mode, completed_steps):
+        """Add the step durations of a finished run to the history (failed attempts and waits are skipped)."""
+        if not completed_steps:
+            return
+        with self._lock:
+            by_step = self._history.setdefault(mode, {})
+            for entry in completed_steps:
+                if entry.get('kind'):
+                    continue
+                samples = by_step.setdefault(entry['step'], [])
+                samples.append(entry['duration'])
+                del samples[:-STEP_HISTORY_SIZE]
+            try:
+                with open(self.history_file, 'w', encoding='utf-8') as f:
+                    json.dump(self._history, f)
+            except OSError as e:
+                logger.error(f"Could not save step history: {e}")
+
+    def _load(self):
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+            return history if isinstance(history, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+
+class Watchdog:
+    """Follows one running job and enforces its per-step budgets."""
+
+    def __init__(self, history, mode, job_dir, started_at=None):
+        """
+        Args:
+            history (StepHistory): Source of step budgets
+            mode (str): Job mode (IKH, IKK-API, ...)
+            job_dir (str): Job directory the script writes progress to
+            started_at (float): Process start time (budget for 'startup')
+        """
+        self.history = history
+        self.mode = mode
+        self.job_dir = job_dir
+        self.started_at = started_at or time.time()
+        self.progress = None
+        self._progress_mtime = None
+
+    @property
+    def current_step(self):
+        """Step the job is in right now."""
+        if not self.progress:
+            return 'startup'
+        return self.progress.get('step') or 'startup'
+
+    def check(self, now=None):
+        """
+        Check the running step against its budget.
+
+        Raises:
+            StepStalled: If the current step has run longer than its budget
+        """
+        now = now or time.time()
+        self._refresh()
+
+        step = self.current_step
+        detail = self.progress.get('detail') if self.progress else None
+        step_started = (self.progress or {}).get('started_at') or self.started_at
+        elapsed = now - step_started
+        budget = self.history.step_budget(self.mode, step)
+        if elapsed > budget:
+            raise StepStalled(step, detail, elapsed, budget)
+
+    def completed_steps(self, finished_at=None):
+        """
+        Step durations of the run, for the history.
+
+        Args:
+            finished_at (float): Close the running step at this time (on success)
+        """
+        self._refresh()
+        steps = []
+        if self.progress:
+            step_started = self.progress.get('started_at')
+            first_started = self.progress.get('first_started_at')
+            steps = list(self.progress.get('completed', []))
+            if first_started:
+                # Time before the first reported step is the startup phase
+                steps.insert(0, {'step': 'startup', 'duration': round(first_started - self.started_at, 3)})
+            if finished_at and step_started:
+                steps.append({'step': self.progress['step'], 'duration': round(finished_at - step_started, 3)})
+        return steps
+
+    def _refresh(self):
+        path = os.path.join(self.job_dir, PROGRESS_FILE)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if mtime != self._progress_mtime:
+            progress = read_progress(self.job_dir)
+            if progress is not None:
+                self.progress = progress
+                self._progress_mtime = mtime
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Injected Page Helpers for the Portaliano Automation Scripts
+===========================================================
+
+The scripts used to build a JavaScript body with a Python f-string for
+every field they set, so each call shipped (and the browser re-parsed) a
+new script, and a quote in a name, description or date broke it. The
+helpers below are installed once per browser context as an init script
+(window.portaliano) and called with structured arguments instead:
+
+    install_helpers(context)
+    call_helper(page, 'setField', 'ahmgawpm003_nama_pekerja_add', name)
+    call_helpers(page, [('setFields', fields), ('check', 'ahmgawpm003_checkbox_persetujuan')])
+
+Values travel as evaluate() arguments, never as source text, so they need
+no escaping. call_helpers() runs several helpers in one round trip.
+
+Targets are an element id, or a list of CSS selectors (or {"label": text}
+for the field of a label containing text) tried in order; results report
+the one that matched.
+
+- setField(target, value, events, options): set a value and fire events
+  (default input, change). Options: attribute (also set the value
+  attribute), enable, removeReadonly, blur, hooks (names of page functions
+  called with the field afterwards, if they exist)
+- setFields(fields, events): setField for each {id, value, events, delay}
+  in order, waiting delay ms before a field
+- fillForm(fields): fill and verify a compiled form spec (see form_specs.py)
+- selectOption(target, texts, events): pick the first option whose value
+  equals or text contains one of texts
+- setShift(target, shift): set a shift select, input or radio group
+- forceShift(shift, all): force every shift-like select to the shift
+- fillEmpty(selector, values): fill empty text/number inputs
+- enable(target, style), check(target)
+"""
+
+HELPERS_SCRIPT = """
+(() => {
+    if (window.portaliano) return;
+    const fire = (el, events) => events.forEach((type) =>
+        el.dispatchEvent(new Event(type, {bubbles: true, cancelable: true})));
+    const byLabel = (text) => {
+        const label = Array.from(document.querySelectorAll('label'))
+            .find((label) => label.textContent.replace(/\\s+/g, ' ').trim().includes(text));
+        return label ? (label.control || label.querySelector('input, select, textarea')) : null;
+    };
+    const visible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    // Element of a target and the selector (or label) it matched; visible matches win
+    const locate = (target) => {
+        if (!target) return {el: null, matched: null};
+        if (!Array.isArray(target)) return {el: document.getElementById(target), matched: target};
+        let hidden = {el: null, matched: null};
+        for (const item of target) {
+            const els = typeof item === 'string' ? Array.from(document.querySelectorAll(item))
+                                                 : [byLabel(item.label)].filter(Boolean);
+            const el = els.find(visible);
+            if (el) return {el: el, matched: item};
+            if (els.length && !hidden.el) hidden = {el: els[0], matched: item};
+        }
+        return hidden;
+    };
+    const find = (target) => locate(target).el;
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    // Verification rules of fillForm(), checked after every field is set
+    const verifiers = {
+        equals: (el, field) => el.value === String(field.value),
+        nonempty: (el) => !!el.value,
+        option: (el, field) => {
+            const option = el.options[el.selectedIndex];
+            return !!option && field.choose.some((text) => option.value === text || option.text.includes(text));
+        },
+        checked: (el) => el.checked
+    };
+    const enable = (el) => {
+        el.disabled = false;
+        el.removeAttribute('disabled');
+    };
+    const options = (el) => el.tagName === 'SELECT'
+        ? Array.from(el.options).map((option) => ({value: option.value, text: option.text})) : undefined;
+
+    const helpers = {
+        setField(target, value, events = ['input', 'change'], opts = {}) {
+            const {el, matched} = locate(target);
+            if (!el) return {found: false, target: target, ok: false};
+            if (opts.enable) enable(el);
+            if (opts.removeReadonly) el.removeAttribute('readonly');
+            el.value = value;
+            if (opts.attribute) el.setAttribute('value', value);
+            fire(el, events);
+            (opts.hooks || []).forEach((name) => {
+                if (typeof window[name] === 'function') window[name](el);
+            });
+            if (opts.blur) {
+                el.blur();
+                setTimeout(() => el.focus(), 100);
+            }
+            return {found: true, id: el.id, matched: matched, value: el.value, ok: el.value === String(value),
+                    options: options(el)};
+        },
+
+        async setFields(fields, events = ['input', 'change']) {
+            const results = [];
+            for (const field of fields) {
+                if (field.delay) await sleep(field.delay);
+                results.push(helpers.setField(field.id, field.value, field.events || events, field));
+            }
+            return results;
+        },
+
+        async fillForm(fields) {
+            const results = [];
+            for (const field of fields) {
+                if (field.delay) await sleep(field.delay);
+                const result = field.choose
+                    ? helpers.selectOption(field.target, field.choose, field.events || ['change'])
+                    : helpers.setField(field.target, field.value, field.events || ['input', 'change'], field);
+                results.push(Object.assign(result, {field: field.field, optional: !!field.optional}));
+            }
+            // Verify once everything is set: change handlers may reset earlier fields
+            fields.forEach((field, index) => {
+                const result = results[index];
+                const el = result.found ? find(field.target) : null;
+                result.value = el ? el.value : null;
+                result.ok = !!el && (!field.verify || verifiers[field.verify](el, field));
+            });
+            return {ok: results.every((result) => result.ok || result.optional), fields: results};
+        },
+
+        selectOption(target, texts, events = ['change']) {
+            const {el, matched} = locate(target);
+            if (!el) return {found: false, target: target, ok: false};
+            const option = Array.from(el.options).find((opt) =>
+                texts.some((text) => opt.value === text || opt.text.includes(text)));
+            if (!option) return {found: true, id: el.id, matched: matched, ok: false, options: options(el)};
+            el.value = option.value;
+            fire(el, events);
+            return {found: true, id: el.id, matched: matched, value: el.value, ok: true};
+        },
+
+        setShift(target, shift) {
+            shift = String(shift);
+            const el = find(target);
+            if (!el) return {found: false, fieldsSet: 0, debugInfo: [`Shift field ${target} not in page`],
+                             message: 'No shift field found in form'};
+            const original = el.value;
+            if (el.type === 'radio') {
+                const radios = Array.from(document.querySelectorAll('input[type="radio"]'))
+                    .filter((radio) => radio.name === el.name);
+                const radio = radios.find((r) => r.value === shift || r.value === 'shift' + shift) ||
+                              radios.find((r) => r.value.includes(shift));
+                if (!radio) return {found: false, fieldsSet: 0, debugInfo: [`No radio for shift ${shift} in ${el.name}`],
+                                    message: 'No shift option found in form'};
+                radio.checked = true;
+                fire(radio, ['change']);
+                return {found: true, fieldsSet: 1, debugInfo: [`Shift radio selected: ${radio.value}`],
+                        message: `Shift ${shift} set successfully`};
+            }
+            if (el.tagName === 'SELECT') {
+                const option = Array.from(el.options).find((opt) => opt.value === shift || opt.value === 'shift' + shift ||
+                    (opt.text.toLowerCase().includes('shift') && opt.text.includes(shift)));
+                el.value = option ? option.value : shift;
+                fire(el, ['change', 'blur']);
+            } else {
+                el.value = shift;
+                fire(el, ['input', 'change', 'blur']);
+            }
+            return {found: true, fieldsSet: 1, debugInfo: [`Shift ${el.tagName.toLowerCase()} ${el.id}: ${original} -> ${el.value}`],
+                    message: `Shift ${shift} set successfully`};
+        },
+
+        forceShift(shift, all = false) {
+            shift = String(shift);
+            const results = [];
+            const selects = Array.from(document.querySelectorAll('select')).filter((select) =>
+                select.id.includes('shift') || select.name.includes('shift') || select.className.includes('shift') ||
+                Array.from(select.options).some((opt) => opt.text.includes('Shift')));
+            for (const select of selects) {
+                try {
+                    enable(select);
+                    select.value = shift;
+                    const index = Array.from(select.options).findIndex((opt) => opt.value === shift);
+                    if (index >= 0) {
+                        select.selectedIndex = index;
+                        select.options[index].selected = true;
+                    }
+                    fire(select, ['focus', 'click', 'change', 'input', 'blur']);
+                    results.push({id: select.id, name: select.name, value: select.value, success: select.value === shift});
+                } catch (e) {
+                    results.push({id: select.id, name: select.name, error: e.message, success: false});
+                }
+                if (!all && results[results.length - 1].success) break;
+            }
+            const winner = results.find((result) => result.success);
+            return winner ? Object.assign({results: results}, winner)
+                          : {success: false, error: 'No suitable shift field found', results: results};
+        },
+
+        fillEmpty(selector, values) {
+            let filled = 0;
+            document.querySelectorAll(selector).forEach((input) => {
+                if (input.value || input.type === 'hidden') return;
+                const numeric = input.type === 'number' || (input.name || '').includes('jumlah') ||
+                                (input.placeholder || '').includes('jumlah');
+                const value = numeric ? values.number : values.text;
+                if (value === undefined) return;
+                input.value = value;
+                fire(input, ['input', 'change']);
+                filled++;
+            });
+            return filled;
+        },
+
+        enable(target, style = false) {
+            const el = find(target);
+            if (!el) return false;
+            enable(el);
+            if (style) {
+                el.style.pointerEvents = 'auto';
+                el.style.opacity = '1';
+                el.classList.remove('disabled');
+            }
+            return true;
+        },
+
+        check(target) {
+            const el = find(target);
+            if (!el) return false;
+            el.checked = true;
+            fire(el, ['change']);
+            return true;
+        }
+    };
+    window.portaliano = helpers;
+})()
+"""
+
+# Runs a list of [name, args] helper calls; reports when the helpers are not installed
+CALL_SCRIPT = """
+async (calls) => {
+    if (!window.portaliano) return {missing: true};
+    const results = [];
+    for (const [name, args] of calls) results.push(await window.portaliano[name](...args));
+    return {results: results};
+}
+"""
+
+
+def install_helpers(context):
+    """Install the helpers in every page of a browser context (call before opening pages)."""
+    context.add_init_script(HELPERS_SCRIPT)
+
+
+def call_helpers(page, calls):
+    """
+    Run several helpers in one round trip.
+
+    Args:
+        page: Playwright page
+        calls (list): (name, arg, ...) tuples, run in order
+
+    Returns:
+        list: The helpers' results, in order
+    """
+    payload = [[name, list(args)] for name, *args in calls]
+    outcome = page.evaluate(CALL_SCRIPT, payload)
+    if outcome.get('missing'):
+        # Page opened before install_helpers() (or a document the init script missed)
+        page.evaluate(HELPERS_SCRIPT)
+        outcome = page.evaluate(CALL_SCRIPT, payload)
+    return outcome['results']
+
+
+def call_helper(page, name, *args):
+    """Run one helper with structured arguments and return its result."""
+    return call_helpers(page, [(name, *args)])[0]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Permit Batches for Portaliano Automation
+========================================
+
+A single IKH or IKK form is filled one personnel modal at a time, so a
+large selection takes long and one failure late in the list sinks the
+whole permit. With a chunk size (PERMIT_CHUNK_SIZE or `chunk_size` on
+/process) a large selection is split into chunks that are queued as
+separate jobs of one batch:
+
+- every chunk is its own permit, filled in its own browser context and run
+  in parallel with the other chunks as far as the job slots and portal
+  accounts allow,
+- a failed chunk only affects the personnel in that chunk,
+- the batch report maps each NIK to the permit (job) containing it, with
+  the status of that permit.
+"""
+
+import os
+import uuid
+
+# Split selections larger than this into several permits (0: never split)
+PERMIT_CHUNK_SIZE = int(os.environ.get('PERMIT_CHUNK_SIZE', 0))
+
+
+def split_personnel(personnel, chunk_size):
+    """
+    Split personnel records into permit-sized chunks.
+
+    Args:
+        personnel (list): Personnel records in selection order
+        chunk_size (int): Maximum personnel per permit (0: no split)
+
+    Returns:
+        list: Chunks (lists of records), a single chunk if no split is needed
+    """
+    if not chunk_size or chunk_size <= 0 or len(personnel) <= chunk_size:
+        return [personnel]
+    return [personnel[start:start + chunk_size] for start in range(0, len(personnel), chunk_size)]
+
+
+def new_batch_id():
+    """Generate an ID for a batch of permits."""
+    return uuid.uuid4().hex[:12]
+
+
+def batch_report(batch_id, jobs):
+    """
+    Build the consolidated report of a batch.
+
+    Args:
+        batch_id (str): Batch ID
+        jobs (list): Job snapshots of the batch with their personnel (JobQueue.list_batch)
+
+    Returns:
+        dict: Per-permit status and the NIK -> permit mapping, or None if the
+        batch is unknown
+    """
+    if not jobs:
+        return None
+    permits = []
+    personnel = []
+    status_counts = {}
+    for job in jobs:
+        part = job['batch']['part']
+        permits.append({
+            'part': part,
+            'job_id': job['id'],
+            'status': job['status'],
+            'personnel_count': len(job['personnel']),
+            'error': job.get('error')
+        })
+        status_counts[job['status']] = status_counts.get(job['status'], 0) + 1
+        for person in job['personnel']:
+            personnel.append({
+                'nik': person['nik'],
+                'name': person['name'],
+                'part': part,
+                'job_id': job['id'],
+                'status': job['status']
+            })
+    return {
+        'batch_id': batch_id,
+        'parts': jobs[0]['batch']['parts'],
+        'status_counts': status_counts,
+        'permits': permits,
+        'personnel': personnel
+    }
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Portal Guard for Portaliano Automation
+======================================
+
+Shared by the app, the workers and the automation scripts to protect the
+AHM portal from bursts (e.g. every job logging in at shift change):
+
+- Rate limiter: one token bucket per portal action (login, navigate,
+  submit). The scripts take a token before each call through
+  portal_call(), waiting when the bucket is empty.
+- Circuit breaker: portal_call() records the outcome and latency of every
+  call. When the failure rate or the median latency of the recent calls
+  crosses its threshold the breaker opens and the job queue parks queued
+  jobs instead of starting them. After BREAKER_COOLDOWN_SECONDS one probe
+  job is let through (half-open); the first successful portal call of
+  that job closes the breaker again, a failure re-opens it. Calls of other
+  jobs still running from before only count as recent outcomes.
+  A probe job that a later queue gate holds back (e.g. admission
+  control) gives the probe slot up again, see job_admission.chain_gates().
+
+State is kept in the shared job queue backend (JOB_BACKEND), so limits
+hold across every worker. With the in-memory backend it lives in a local
+SQLite file (JOBS_DIR/portal_guard.db) shared by the app and its scripts.
+The guard fails open: if its store is unavailable, portal calls go ahead.
+"""
+
+import os
+import time
+import logging
+import statistics
+from contextlib import contextmanager
+
+from job_backend import create_backend, SQLiteBackend, JOB_BACKEND
+from job_runtime import JOBS_DIR, check_cancelled, extend_step, current_job_dir
+
+logger = logging.getLogger(__name__)
+
+# Token buckets: action -> (calls per minute, burst)
+RATE_LIMITS = {
+    'login': (float(os.environ.get('LOGIN_RATE_PER_MINUTE', 6)), 2),
+    'navigate': (float(os.environ.get('NAVIGATION_RATE_PER_MINUTE', 60)), 10),
+    'submit': (float(os.environ.get('SUBMIT_RATE_PER_MINUTE', 6)), 2)
+}
+
+# Circuit breaker
+BREAKER_WINDOW = 20  # Recent portal calls considered
+BREAKER_MIN_CALLS = 5  # Calls needed before the breaker can open
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+BREAKER_LATENCY_SECONDS = float(os.environ.get('BREAKER_LATENCY_SECONDS', 30))
+BREAKER_COOLDOWN_SECONDS = int(os.environ.get('BREAKER_COOLDOWN_SECONDS', 120))
+
+GUARD_KEY = 'portal_guard'
+
+
+class PortalGuard:
+    """Token-bucket rate limiter and circuit breaker on a shared store."""
+
+    def __init__(self, store=None):
+        """
+        Args:
+            store: Backend from job_backend holding the state (see module docstring)
+        """
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is None:
+            self.attach(create_backend(JOB_BACKEND))
+        return self._store
+
+    def attach(self, backend):
+        """
+        Keep the guard state in the given job queue backend if it is shared.
+
+        Processes gating a shared queue must attach its backend, so the gate's
+        transaction nests inside the queue's instead of waiting on it.
+        """
+        self._store = backend if backend.shared else SQLiteBackend(os.path.join(JOBS_DIR, 'portal_guard.db'))
+
+    # --- Rate limiting ---
+
+    def acquire(self, action):
+        """
+        Take a token for a portal action, waiting until one is available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if action not in RATE_LIMITS:
+            return 0.0
+        waited = 0.0
+        while True:
+            try:
+                with self.store.transaction(include_jobs=False) as state:
+                    bucket = self._refill(state, action, time.time())
+                    if bucket['tokens'] >= 1:
+                        bucket['tokens'] -= 1
+                        return waited
+                    per_minute, _ = RATE_LIMITS[action]
+                    wait = (1 - bucket['tokens']) * 60 / per_minute
+            except Exception as e:
+                print(f"⚠️ Rate limiter unavailable, continuing: {e}")
+                return waited
+
+            if waited == 0:
+                print(f"🚦 Rate limit: waiting {wait:.1f}s for a {action} slot")
+            check_cancelled(f"{action} (rate limited)")
+            pause = min(wait, 5.0)
+            time.sleep(pause)
+            extend_step(pause)  # Waiting does not count against the step budget
+            waited += pause
+
+    def _refill(self, state, action, now):
+        per_minute, burst = RATE_LIMITS[action]
+        buckets = self._guard(state).setdefault('buckets', {})
+        bucket = buckets.setdefault(action, {'tokens': burst, 'updated': now})
+        bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updated']) * per_minute / 60)
+        bucket['updated'] = now
+        return bucket
+
+    # --- Circuit breaker ---
+
+    def record(self, action, ok, latency, job_id=None):
+        """
+        Record the outcome of a portal call (or of a stalled step).
+
+        Args:
+            action (str): Portal action or step name
+            ok (bool): True if the call succeeded
+            latency (float): Call duration in seconds
+            job_id (str): Job that made the call (default: the running script's job)
+        """
+        job_id = job_id or current_job_id()
+        try:
+            with self.store.transaction(include_jobs=False) as state:
+                guard = self._guard(state)
+                now = time.time()
+                self._update_state(guard, now)
+
+                # Only the admitted probe job decides; other calls are just recent outcomes
+                if guard['state'] == 'half_open' and job_id and job_id == guard['probe_job']:
+                    if ok:
+                        self._transition(guard, 'closed', now, f"probe {action} succeeded")
+                        guard['outcomes'] = []
+                    else:
+                        self._transition(guard, 'open', now, f"probe {action} failed")
+                    return
+
+                outcomes = guard['outcomes']
+                outcomes.append([round(now, 3), bool(ok), round(latency, 3)])
+                del outcomes[:-BREAKER_WINDOW]
+                if guard['state'] == 'closed':
+                    reason = self._trip_reason(outcomes)
+                    if reason:
+                        self._transition(guard, 'open', now, reason)
+        except Exception as e:
+            print(f"⚠️ Circuit breaker unavailable: {e}")
+
+    def allow_job(self, job_id):
+        """
+        Check whether a queued job may start (JobQueue gate).
+
+        Returns:
+            str: Reason the job is parked, or None if it may start
+        """
+        try:
+            with self.store.transaction(include_jobs=False) as state:
+                guard = self._guard(state)
+                now = time.time()
+                self._update_state(guard, now)
+                if guard['state'] == 'closed':
+                    return None
+                if guard['state'] == 'open':
+                    return f"Portal circuit open until {time.strftime('%H:%M:%S', time.localtime(guard['opened_at'] + BREAKER_COOLDOWN_SECONDS))}"
+                # Half-open: one probe job at a time (a silent probe is replaced after the cooldown)
+                if guard['probe_started'] and now - guard['probe_started'] < BREAKER_COOLDOWN_SECONDS:
+                    return "Portal circuit half-open, waiting for probe job"
+                guard['probe_job'] = job_id
+                guard['probe_started'] = now
+                return None
+        except Exception as e:
+            logger.error(f"Circuit breaker unavailable, not parking jobs: {e}")
+            return None
+
+    def release_probe(self, job_id):
+        """Give up the half-open probe slot of a job that did not start after all."""
+        try:
+            with self.store.transaction(include_jobs=False) as state:
+                guard = self._guard(state)
+                if guard['state'] == 'half_open' and guard['probe_job'] == job_id:
+                    guard['probe_job'] = None
+                    guard['probe_started'] = None
+        except Exception as e:
+            logger.error(f"Circuit breaker unavailable, probe slot not released: {e}")
+
+    def status(self):
+        """Current limits and breaker state (for the status endpoint)."""
+        with self.store.transaction(include_jobs=False) as state:
+            now = time.time()
+            guard = self._guard(state)
+            self._update_state(guard, now)
+            limits = {}
+            for action, (per_minute, burst) in RATE_LIMITS.items():
+                bucket = self._refill(state, action, now)
+                limits[action] = {'per_minute': per_minute, 'burst': burst, 'tokens': round(bucket['tokens'], 2)}
+            outcomes = guard['outcomes']
+            return {
+                'limits': limits,
+                'breaker': {
+                    'state': guard['state'],
+                    'since': guard['since'],
+                    'reason': guard['reason'],
+                    'reopen_check_at': guard['opened_at'] + BREAKER_COOLDOWN_SECONDS if guard['state'] == 'open' else None,
+                    'probe_job': guard['probe_job'] if guard['state'] == 'half_open' else None,
+                    'recent_calls': len(outcomes),
+                    'failure_rate': round(sum(1 for o in outcomes if not o[1]) / len(outcomes), 2) if outcomes else 0.0,
+                    'median_latency': round(statistics.median(o[2] for o in outcomes), 2) if outcomes else None,
+                    'thresholds': {
+                        'failure_rate': BREAKER_FAILURE_RATE,
+                        'latency_seconds': BREAKER_LATENCY_SECONDS,
+                        'cooldown_seconds': BREAKER_COOLDOWN_SECONDS
+                    }
+                }
+            }
+
+    def _guard(self, state):
+        guard = state.meta.setdefault(GUARD_KEY, {})
+        guard.setdefault('state', 'closed')
+        guard.setdefault('since', None)
+        guard.setdefault('reason', None)
+        guard.setdefault('opened_at', None)
+        guard.setdefault('probe_job', None)
+        guard.setdefault('probe_started', None)
+        guard.setdefault('outcomes', [])
+        return guard
+
+    def _update_state(self, guard, now):
+        if guard['state'] == 'open' and now - guard['opened_at'] >= BREAKER_COOLDOWN_SECONDS:
+            self._transition(guard, 'half_open', now, 'cooldown elapsed')
+
+    def _transition(self, guard, new_state, now, reason):
+        logger.warning(f"🔌 Portal circuit {guard['state']} -> {new_state}: {reason}")
+        guard['state'] = new_state
+        guard['since'] = now
+        guard['reason'] = reason
+        guard['probe_job'] = None
+        guard['probe_started'] = None
+        if new_state == 'open':
+            guard['opened_at'] = now
+
+    @staticmethod
+    def _trip_reason(outcomes):
+        if len(outcomes) < BREAKER_MIN_CALLS:
+            return None
+        failure_rate = sum(1 for o in outcomes if not o[1]) / len(outcomes)
+        if failure_rate >= BREAKER_FAILURE_RATE:
+            return f"failure rate {failure_rate:.0%} over the last {len(outcomes)} portal calls"
+        median_latency = statistics.median(o[2] for o in outcomes)
+        if median_latency >= BREAKER_LATENCY_SECONDS:
+            return f"median latency {median_latency:.1f}s over the last {len(outcomes)} portal calls"
+        return None
+
+
+def current_job_id():
+    """ID of the job the running script belongs to, or None when run by hand."""
+    job_dir = current_job_dir()
+    return os.path.basename(os.path.normpath(job_dir)) if job_dir else None
+
+
+# Guard used by the automation scripts and the job queue gate
+portal_guard = PortalGuard()
+
+
+def job_gate(job):
+    """JobQueue gate: park queued jobs while the portal circuit is open."""
+    return portal_guard.allow_job(job['id'])
+
+
+def _release_job_gate(job):
+    # Called by job_admission.chain_gates() when a later gate holds the job
+    portal_guard.release_probe(job['id'])
+
+
+job_gate.release = _release_job_gate
+
+
+@contextmanager
+def portal_call(action):
+    """
+    Wrap one portal interaction in the automation scripts.
+
+    Takes a rate limit token, then records the call's outcome and latency
+    for the circuit breaker.
+
+    Args:
+        action (str): 'login', 'navigate' or 'submit'
+    """
+    portal_guard.acquire(action)
+    started = time.time()
+    try:
+        yield
+    except Exception:
+        portal_guard.record(action, False, time.time() - started)
+        raise
+    portal_guard.record(action, True, time.time() - started)
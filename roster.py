@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Personnel Rosters for Portaliano Automation
+===========================================
+
+The app snapshots the selected personnel when a job is submitted and hands
+the normalized records to the automation script, so the scripts no longer
+open the roster CSV while they run (read_csv() and the IKK certificate
+lookup used to read it again in every run):
+
+    {"row": 3, "name": "NUR ARIFUDIN", "nik": "3301232112990003",
+     "cert": "78429 7212 0012670 2024", "cert_expiry": "31/01/2026",
+     "cert_expiry_text": "31 Januari 2026"}
+
+- row: index of the row in the CSV (the index the UI selects)
+- cert / cert_expiry: certificate number and its expiry as DD/MM/YYYY
+  (cert None when the CSV has no certificate number; cert_expiry None when
+  the expiry is missing or cannot be read)
+- cert_expiry_text: the expiry exactly as written in the CSV
+
+Dates are parsed and validated once, when the roster is loaded (Indonesian
+or English month names, DD/MM/YYYY, ISO), and the result is cached by file
+content. Rows that cannot be used are reported up front as problems: the
+upload response lists them and /process refuses a selection with a
+missing or unreadable certificate expiry instead of the script guessing a
+date or dropping the certificate.
+
+The records are part of the job spec: later edits of the CSV do not change
+a queued job. The runner writes them to the job directory (ROSTER_FILE)
+and passes the path to the script with --roster.
+"""
+
+import io
+import os
+import re
+import csv
+import json
+import hashlib
+import logging
+import datetime
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ROSTER_FILE = 'roster.json'
+ROSTER_FLAG = '--roster'
+
+# CSV columns
+NAME_COLUMN = 'Nama'
+NIK_COLUMN = 'Nomor'
+CERT_COLUMN = 'Sertif'
+CERT_EXPIRY_COLUMN = 'Expsertif'
+
+# Values meaning "no certificate"
+EMPTY_VALUES = ('', 'n/a', 'none', '-', 'null')
+
+INDONESIAN_MONTHS = {
+    'januari': 1, 'februari': 2, 'maret': 3, 'april': 4, 'mei': 5, 'juni': 6,
+    'juli': 7, 'agustus': 8, 'september': 9, 'oktober': 10, 'november': 11, 'desember': 12
+}
+ENGLISH_MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
+}
+# Full names and their abbreviations ("Agu", "Aug", "Des", "Dec", ...)
+MONTH_NAMES = {**{name[:3]: number for name, number in INDONESIAN_MONTHS.items()},
+               **{name[:3]: number for name, number in ENGLISH_MONTHS.items()},
+               **INDONESIAN_MONTHS, **ENGLISH_MONTHS}
+
+# Parsed rosters kept in memory, keyed by file content
+ROSTER_CACHE_SIZE = 16
+_roster_cache = OrderedDict()
+
+
+def parse_expiry(value):
+    """
+    Parse and validate a certificate expiry date from the roster.
+
+    Args:
+        value (str): "5 Agustus 2027", "5 Aug 2027", "August 5, 2027",
+            "05/08/2027" (also with - or .) or "2027-08-05"
+
+    Returns:
+        str: Date as DD/MM/YYYY, or None if the value is not a valid date
+    """
+    text = (value or '').strip().lower()
+    words = re.findall(r'[a-z]+', text)
+    numbers = re.findall(r'\d+', text)
+    day = month = year = None
+    if words:
+        # "5 Agustus 2027" or "August 5, 2027"
+        if len(words) == 1 and words[0] in MONTH_NAMES and len(numbers) == 2:
+            month = MONTH_NAMES[words[0]]
+            day, year = (numbers if len(numbers[1]) == 4 else numbers[::-1])
+    elif re.fullmatch(r'\d{4}-\d{1,2}-\d{1,2}', text):
+        year, month, day = numbers
+    elif re.fullmatch(r'\d{1,2}[/.-]\d{1,2}[/.-]\d{4}', text):
+        day, month, year = numbers
+    if day is None or len(str(year)) != 4:
+        return None
+    try:
+        return datetime.date(int(year), int(month), int(day)).strftime('%d/%m/%Y')
+    except ValueError:
+        return None
+
+
+def _clean(value):
+    value = str(value or '').strip()
+    return '' if value.lower() in EMPTY_VALUES else value
+
+
+def _parse_records(text):
+    records = []
+    problems = []
+    for row_index, row in enumerate(csv.DictReader(io.StringIO(text, newline=''))):
+        name = str(row.get(NAME_COLUMN) or '').strip()
+        nik = str(row.get(NIK_COLUMN) or '').strip()
+        if not name or not nik:
+            problems.append({'row': row_index, 'name': name, 'nik': nik, 'error': 'Missing name or NIK'})
+            continue
+        cert = _clean(row.get(CERT_COLUMN))
+        expiry_text = _clean(row.get(CERT_EXPIRY_COLUMN))
+        record = {
+            'row': row_index,
+            'name': name,
+            'nik': nik,
+            'cert': cert or None,
+            'cert_expiry': parse_expiry(expiry_text) if cert and expiry_text else None,
+            'cert_expiry_text': (expiry_text or None) if cert else None
+        }
+        if record['cert'] and not record['cert_expiry']:
+            problems.append({'row': row_index, 'name': name, 'nik': nik, 'error': expiry_problem(record)})
+        records.append(record)
+    return tuple(records), tuple(problems)
+
+
+def load_roster(csv_path):
+    """
+    Read, normalize and validate every row of a roster CSV.
+
+    Parsed once per file content: an unchanged (or identical) file is
+    served from memory and its problems are only logged the first time.
+
+    Returns:
+        tuple: (records, problems) - problems are dicts with row, name, nik
+        and error for rows without name or NIK (not in records) and rows
+        with a certificate whose expiry is missing or not a valid date
+    """
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(content).hexdigest()
+    cached = _roster_cache.get(digest)
+    if cached is None:
+        cached = _parse_records(content.decode('utf-8-sig'))
+        for problem in cached[1]:
+            logger.warning(f"Roster {csv_path} row {problem['row']} ({problem['name'] or '-'}): {problem['error']}")
+        _roster_cache[digest] = cached
+        while len(_roster_cache) > ROSTER_CACHE_SIZE:
+            _roster_cache.popitem(last=False)
+    else:
+        _roster_cache.move_to_end(digest)
+    return cached
+
+
+def expiry_problem(person):
+    """Why a record with a certificate has no usable expiry date."""
+    if not person.get('cert_expiry_text'):
+        return 'Missing certificate expiry'
+    return f"Unreadable certificate expiry '{person['cert_expiry_text']}'"
+
+
+def invalid_expiries(personnel):
+    """Personnel records with a certificate whose expiry date is missing or could not be read."""
+    return [person for person in personnel if person.get('cert') and not person.get('cert_expiry')]
+
+
+def snapshot_personnel(csv_path, selected_indices=None):
+    """
+    Take the personnel records for a job.
+
+    Args:
+        csv_path (str): Roster CSV
+        selected_indices (list): Selected row indices (all rows if empty)
+
+    Returns:
+        list: Personnel records (copies) in selection order
+    """
+    records, _ = load_roster(csv_path)
+    if not selected_indices:
+        return [dict(record) for record in records]
+
+    by_row = {record['row']: record for record in records}
+    selected = []
+    for index in selected_indices:
+        record = by_row.get(int(index))
+        if record:
+            selected.append(dict(record))
+        else:
+            logger.warning(f"Roster {csv_path}: row {index} skipped (missing, or without name or NIK)")
+    return selected
+
+
+def write_roster(job_dir, personnel):
+    """Write a job's personnel records to its job directory and return the path."""
+    path = os.path.join(job_dir, ROSTER_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(personnel, f, ensure_ascii=False)
+    return path
+
+
+def read_roster(path):
+    """Read the personnel records handed to an automation script."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def roster_arg(argv):
+    """Get the --roster=<path> argument of a script's command line, or None."""
+    prefix = ROSTER_FLAG + '='
+    return next((arg[len(prefix):] for arg in argv if arg.startswith(prefix)), None)
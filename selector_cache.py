@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Selector Winner Cache for the Portaliano Automation Scripts
+===========================================================
+
+The scripts probe ordered fallback selector lists one candidate at a time
+(NIK input, calendar icon, day cell, prev/next buttons, shift option...),
+and every miss is a browser round trip, repeated for every person. The
+selector cache remembers which candidate matched per logical field:
+
+    for selector in selectors.ordered('ikh.nik_input', nik_selectors):
+        ...
+        if it_worked:
+            selectors.found('ikh.nik_input', selector)
+            break
+
+- ordered() puts the last winner first, then the candidates with the most
+  hits, then the rest in their original order.
+- found() counts a hit for the winner and a miss for every candidate tried
+  before it; a field probed without found() counts a miss for all of them.
+- Counts and winners are persisted in SELECTOR_CACHE_FILE when the script
+  exits (merged with other runs) and reported with hit rates, so dead
+  candidates can be pruned. The report is also served at /selectors.
+
+Numbers in quotes or parentheses (the day, the shift) are ignored when
+ranking, so "td:has-text('5')" and "td:has-text('17')" share their stats.
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import threading
+
+SELECTOR_CACHE_FILE = os.environ.get('SELECTOR_CACHE_FILE', 'selector_cache.json')
+
+# A candidate tried this often without a single hit is reported as dead
+DEAD_AFTER_TRIES = 20
+
+
+def selector_key(selector):
+    """Ranking key of a selector: numbers in quotes or parentheses become #."""
+    return re.sub(r"(['\"(])\d+(['\")])", r"\1#\2", selector)
+
+
+class SelectorCache:
+    """Per-field ranking of fallback selectors, persisted across runs."""
+
+    def __init__(self, path=SELECTOR_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = self._load()
+        self._counts = {}  # field -> key -> [hits, misses] of this run
+        self._winners = {}  # field -> key that matched last in this run
+        self._pending = {}  # field -> keys of the probe in progress
+
+    def ordered(self, field, candidates):
+        """
+        Candidates in probing order: last winner, then by hits, then as given.
+
+        Args:
+            field (str): Logical field, e.g. "ikh.nik_input"
+            candidates (list): Selectors in their default order
+        """
+        with self._lock:
+            self._settle(field)
+            entry = self._stats.get(field, {})
+            winner = self._winners.get(field, entry.get('winner'))
+            hits = {key: counts.get('hits', 0) for key, counts in entry.get('candidates', {}).items()}
+            for key, (run_hits, _) in self._counts.get(field, {}).items():
+                hits[key] = hits.get(key, 0) + run_hits
+            ranked = sorted(enumerate(candidates),
+                            key=lambda item: (selector_key(item[1]) != winner,
+                                              -hits.get(selector_key(item[1]), 0), item[0]))
+            ordered = [selector for _, selector in ranked]
+            self._pending[field] = [selector_key(selector) for selector in ordered]
+        return ordered
+
+    def found(self, field, selector):
+        """Record the candidate that matched (earlier candidates of the probe missed)."""
+        key = selector_key(selector)
+        with self._lock:
+            tried = self._pending.pop(field, [key])
+            for other in tried[:tried.index(key)] if key in tried else []:
+                self._count(field, other, miss=True)
+            self._count(field, key, miss=False)
+            self._winners[field] = key
+
+    def report(self, fields=None):
+        """
+        Hit rates per field and candidate (persisted counts plus this run).
+
+        Returns:
+            dict: field -> winner and candidates with hits, misses, hit_rate, dead
+        """
+        with self._lock:
+            merged = self._merged(self._stats)
+        report = {}
+        for field, entry in merged.items():
+            if fields is not None and field not in fields:
+                continue
+            candidates = []
+            for key, counts in entry['candidates'].items():
+                tries = counts['hits'] + counts['misses']
+                candidates.append({
+                    'selector': key,
+                    'hits': counts['hits'],
+                    'misses': counts['misses'],
+                    'hit_rate': round(counts['hits'] / tries, 3) if tries else None,
+                    'dead': counts['hits'] == 0 and tries >= DEAD_AFTER_TRIES
+                })
+            candidates.sort(key=lambda candidate: -candidate['hits'])
+            report[field] = {'winner': entry.get('winner'), 'candidates': candidates}
+        return report
+
+    def save(self):
+        """Merge this run's counts into SELECTOR_CACHE_FILE and print their hit rates."""
+        with self._lock:
+            for field in list(self._pending):
+                self._settle(field)
+            if not self._counts:
+                return
+            merged = self._merged(self._load())
+            fields = set(self._counts)
+            self._counts, self._winners = {}, {}
+            self._stats = merged
+        try:
+            tmp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, indent=2)
+            os.replace(tmp_file, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save selector cache: {e}")
+        self.print_report(fields)
+
+    def print_report(self, fields=None):
+        """Print the hit rates of the given fields (all if None)."""
+        print("🎯 SELECTOR HIT RATES")
+        for field, entry in self.report(fields).items():
+            print(f"   {field} (winner: {entry['winner']})")
+            for candidate in entry['candidates']:
+                rate = '-' if candidate['hit_rate'] is None else f"{candidate['hit_rate']:.0%}"
+                flag = '  ☠️ dead' if candidate['dead'] else ''
+                print(f"      {rate:>5}  {candidate['hits']:>4}/{candidate['hits'] + candidate['misses']:<4} "
+                      f"{candidate['selector']}{flag}")
+
+    def _settle(self, field):
+        # A probe that ended without found(): every candidate it tried missed
+        for key in self._pending.pop(field, []):
+            self._count(field, key, miss=True)
+
+    def _count(self, field, key, miss):
+        counts = self._counts.setdefault(field, {}).setdefault(key, [0, 0])
+        counts[1 if miss else 0] += 1
+
+    def _merged(self, stats):
+        merged = json.loads(json.dumps(stats))
+        for field, candidates in self._counts.items():
+            entry = merged.setdefault(field, {'winner': None, 'candidates': {}})
+            for key, (hits, misses) in candidates.items():
+                counts = entry['candidates'].setdefault(key, {'hits': 0, 'misses': 0})
+                counts['hits'] += hits
+                counts['misses'] += misses
+            if field in self._winners:
+                entry['winner'] = self._winners[field]
+            entry['updated_at'] = time.time()
+        return merged
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            return stats if isinstance(stats, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+
+def selector_report(path=SELECTOR_CACHE_FILE):
+    """Hit-rate report of the persisted selector cache (for the app)."""
+    return SelectorCache(path).report()
+
+
+# Shared by the script process; saved when the script exits
+selectors = SelectorCache()
+atexit.register(selectors.save)
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import sys
-import csv
 import datetime
 import re
 import argparse
@@ -10,6 +9,19 @@ from playwright.sync_api import Playwright, sync_playwright
 # Import browser configuration
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from browser_config import get_browser_config, get_browser_mode_description, get_wait_time
+from job_runtime import artifact_path, JobCancelled, CANCELLED_EXIT_CODE
+from portal_guard import portal_call
+from credential_pool import portal_credentials
+from tenants import tenant_company
+from step_runner import StepRunner
+from dry_run import finish_dry_run, DRY_RUN_FLAG
+from roster import snapshot_personnel, read_roster, ROSTER_FLAG
+from datepicker import set_date_via_widget, navigate_calendar, set_date_with_strategies, date_value_matches
+from selector_cache import selectors
+from dom_probe import probe_selectors, first_visible
+from page_helpers import install_helpers, call_helper
+from form_specs import fill_form
+from form_check import verify_form
 
 # Linux console encoding handling
 if os.name == 'posix':  # Linux/Unix
@@ -19,40 +31,6 @@ if os.name == 'posix':  # Linux/Unix
 if os.name == 'nt':  # Windows
     os.system('chcp 65001 > nul')  # Set console to UTF-8
 
-def read_csv(file_path, selected_indices=None):
-    """Read personnel data from CSV file with optional row selection."""
-    data = []
-    with open(file_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        rows = list(reader)
-        
-        print(f"[FILE] CSV Headers: {reader.fieldnames}")
-        
-        if selected_indices:
-            for idx in selected_indices:
-                if 0 <= idx < len(rows):
-                    row = rows[idx]
-                    name = row.get('Nama', '').strip()
-                    nik = str(row.get('Nomor', '')).strip()  # Ensure NIK is string and stripped
-                    
-                    if name and nik:
-                        data.append((name, nik))
-                        print(f"✅ Added: {name} - NIK: {nik}")
-                    else:
-                        print(f"⚠️ Skipped row {idx}: Missing name or NIK")
-        else:
-            for idx, row in enumerate(rows):
-                name = row.get('Nama', '').strip()
-                nik = str(row.get('Nomor', '')).strip()  # Ensure NIK is string and stripped
-                
-                if name and nik:
-                    data.append((name, nik))
-                else:
-                    print(f"⚠️ Skipped row {idx}: Missing name or NIK - Name: '{name}', NIK: '{nik}'")
-    
-    print(f"[INFO] Loaded {len(data)} valid personnel records")
-    return data
-
 def setup_date(selected_date=None):
     """Prepare date string for input."""
     if selected_date:
@@ -74,7 +52,8 @@ def verify_date_input(page, expected_date):
         print(f"🔍 Current date value in field: '{current_value}'")
         print(f"🎯 Expected date value: '{expected_date}'")
         
-        if current_value == expected_date:
+        day, month, year = (int(part) for part in expected_date.split('/'))
+        if date_value_matches(current_value, day, month, year):
             print("✅ Date verification successful!")
             return True
         else:
@@ -90,7 +69,7 @@ def debug_calendar_structure(page):
         print("🔍 === CALENDAR DEBUGGING MODE ===")
         
         # Take screenshot of calendar
-        page.screenshot(path="calendar_debug.png")
+        page.screenshot(path=artifact_path("calendar_debug.png"))
         print("📸 Calendar screenshot saved: calendar_debug.png")
         
         # Get all visible elements in calendar
@@ -204,19 +183,23 @@ def set_date_field(page, date_str):
     
     print(f"📅 Target: Day={target_day}, Month={target_month}, Year={target_year}")
     
-    try:
+    def by_widget():
+        return set_date_via_widget(page, input_id, date_str)
+    
+    def by_calendar():
         # Method 1: Enhanced calendar method with debugging
-        try:
-            calendar_icon = page.locator(f"#{input_id}_span")
-            if calendar_icon.is_visible():
-                print("📅 Clicking calendar icon...")
-                calendar_icon.click()
-                page.wait_for_timeout(get_wait_time(500))  # Optimized wait time
+        calendar_icon = page.locator(f"#{input_id}_span")
+        if calendar_icon.is_visible():
+            print("📅 Clicking calendar icon...")
+            calendar_icon.click()
+            page.wait_for_timeout(get_wait_time(500))  # Optimized wait time
                 
-                # Debug calendar structure
-                calendar_debug = debug_calendar_structure(page)
+            # Planned navigation reads the view once; debugging and stepping are the fallback
+            planned = navigate_calendar(page, target_month, target_year)
+            calendar_debug = planned or debug_calendar_structure(page)
                 
-                if calendar_debug:
+            if calendar_debug:
+                if not planned:
                     # Try to find month/year info from debug results
                     current_month, current_year = analyze_calendar_debug_results(calendar_debug)
                     print(f"🗓️ Detected calendar: Month={current_month}, Year={current_year}")
@@ -240,95 +223,65 @@ def set_date_field(page, date_str):
                             print("❌ All navigation methods failed")
                             # Continue anyway, maybe the day exists in current view
                     
-                    # Now try to click the target day
-                    print(f"🎯 Looking for day {target_day} in calendar...")
-                    date_clicked = False
+                # Now try to click the target day
+                print(f"🎯 Looking for day {target_day} in calendar...")
+                date_clicked = False
                     
-                    # Try multiple approaches to click the day
-                    day_selectors = [
-                        f"td.day:not(.disabled):has-text('{target_day}')",
-                        f"td[data-day='{target_day}']:not(.disabled)",
-                        f"td.day:has-text('{target_day}'):not(.old):not(.new)",
-                        f".datepicker-days td:has-text('{target_day}'):not(.disabled)",
-                        f"td:has-text('{target_day}'):not(.disabled)"
-                    ]
+                # Try multiple approaches to click the day
+                day_selectors = [
+                    f"td.day:not(.disabled):has-text('{target_day}')",
+                    f"td[data-day='{target_day}']:not(.disabled)",
+                    f"td.day:has-text('{target_day}'):not(.old):not(.new)",
+                    f".datepicker-days td:has-text('{target_day}'):not(.disabled)",
+                    f"td:has-text('{target_day}'):not(.disabled)"
+                ]
                     
-                    for selector in day_selectors:
-                        try:
-                            day_elements = page.locator(selector)
-                            count = day_elements.count()
-                            print(f"🔍 Found {count} elements for selector: {selector}")
-                            
-                            if count > 0:
-                                # Click the first non-disabled element
-                                for i in range(count):
-                                    try:
-                                        element = day_elements.nth(i)
-                                        if element.is_visible():
-                                            element.click()
-                                            print(f"✅ Clicked day {target_day} using: {selector} (element {i})")
-                                            date_clicked = True
-                                            break
-                                    except Exception as e:
-                                        print(f"⚠️ Failed to click element {i}: {e}")
-                                        continue
-                            
-                            if date_clicked:
-                                break
-                        except Exception as e:
-                            print(f"⚠️ Selector {selector} failed: {e}")
-                            continue
+                # One probe for every candidate instead of count()/is_visible() per element
+                for match in probe_selectors(page, selectors.ordered('ikh.calendar_day', day_selectors)):
+                    selector = match['selector']
+                    print(f"🔍 Found {match['count']} elements ({match['visible']} visible) for selector: {selector}")
+                    if not match['visible']:
+                        continue
+                    try:
+                        # Click the first visible element
+                        page.locator(selector).nth(match['index']).click()
+                        print(f"✅ Clicked day {target_day} using: {selector} (element {match['index']})")
+                        selectors.found('ikh.calendar_day', selector)
+                        date_clicked = True
+                        break
+                    except Exception as e:
+                        print(f"⚠️ Selector {selector} failed: {e}")
+                        continue
                     
-                    if date_clicked:
-                        page.wait_for_timeout(get_wait_time(300))  # Optimized wait
-                        # Verify the date was set
-                        current_value = page.locator(f"#{input_id}").input_value()
-                        print(f"📝 Calendar result: '{current_value}' vs expected '{date_str}'")
+                if date_clicked:
+                    page.wait_for_timeout(get_wait_time(300))  # Optimized wait
+                    # Verify the date was set
+                    current_value = page.locator(f"#{input_id}").input_value()
+                    print(f"📝 Calendar result: '{current_value}' vs expected '{date_str}'")
                         
-                        # Check if date matches expectation (be flexible with format)
-                        if current_value and len(current_value) > 0:
-                            # Try to parse and compare the actual date
-                            if verify_date_match(current_value, target_day, target_month, target_year):
-                                print(f"✅ Date set via calendar successfully: {current_value}")
-                                return True
-                            else:
-                                print(f"⚠️ Date mismatch - got {current_value}, expected day {target_day}, month {target_month}, year {target_year}")
+                    # Check if date matches expectation (be flexible with format)
+                    if current_value and len(current_value) > 0:
+                        # Try to parse and compare the actual date
+                        if verify_date_match(current_value, target_day, target_month, target_year):
+                            print(f"✅ Date set via calendar successfully: {current_value}")
+                            return True
                         else:
-                            print(f"⚠️ Calendar didn't set any value")
+                            print(f"⚠️ Date mismatch - got {current_value}, expected day {target_day}, month {target_month}, year {target_year}")
                     else:
-                        print(f"❌ Could not click day {target_day} in calendar")
+                        print(f"⚠️ Calendar didn't set any value")
                 else:
-                    print("❌ Calendar debugging failed")
-                    
-        except Exception as e:
-            print(f"⚠️ Calendar method failed: {e}")
+                    print(f"❌ Could not click day {target_day} in calendar")
+            else:
+                print("❌ Calendar debugging failed")
+        return False
     
+    def by_javascript():
         # Method 2: Direct JavaScript manipulation (unchanged)
         print("🔧 Trying direct JavaScript method...")
-        page.evaluate(f"""
-            const input = document.getElementById('{input_id}');
-            if (input) {{
-                // Remove readonly and set value
-                input.removeAttribute('readonly');
-                input.value = '{date_str}';
-                input.setAttribute('value', '{date_str}');
-                
-                // Trigger all relevant events
-                const events = ['input', 'change', 'blur', 'keyup', 'keydown', 'focus'];
-                events.forEach(eventType => {{
-                    const event = new Event(eventType, {{ bubbles: true, cancelable: true }});
-                    input.dispatchEvent(event);
-                }});
-                
-                // Try triggering custom AHM functions if they exist
-                if (typeof ahmgawpm002_dateChange === 'function') {{
-                    ahmgawpm002_dateChange();
-                }}
-                if (typeof ahmgawpm002_checkDateInput === 'function') {{
-                    ahmgawpm002_checkDateInput(input);
-                }}
-            }}
-        """)
+        # Remove readonly, set value, trigger all relevant events and the AHM date handlers if they exist
+        call_helper(page, 'setField', input_id, date_str, ['input', 'change', 'blur', 'keyup', 'keydown', 'focus'],
+                    {'attribute': True, 'removeReadonly': True,
+                     'hooks': ['ahmgawpm002_dateChange', 'ahmgawpm002_checkDateInput']})
         
         page.wait_for_timeout(get_wait_time(100))  # Optimized minimal wait
         
@@ -337,7 +290,9 @@ def set_date_field(page, date_str):
         if current_value == date_str:
             print(f"✅ Date successfully set via JavaScript: {current_value}")
             return True
+        return False
     
+    def by_fill():
         # Method 3: Playwright fill method (unchanged)
         print("🎭 Trying Playwright fill method...")
         date_input = page.locator(f"#{input_id}")
@@ -351,7 +306,9 @@ def set_date_field(page, date_str):
         if final_value == date_str:
             print(f"✅ Date successfully set via Playwright: {final_value}")
             return True
-        
+        return False
+    
+    def by_emergency():
         # Method 4: Emergency method - try alternative calendar approach
         print("🚨 Trying emergency calendar method...")
         try:
@@ -362,58 +319,57 @@ def set_date_field(page, date_str):
                 page.wait_for_timeout(get_wait_time(500))  # Optimized wait
                 
                 # Try to directly set the calendar's internal date
-                emergency_result = page.evaluate(f"""
-                    (function() {{
-                        try {{
+                emergency_result = page.evaluate("""
+                    ([targetMonth, targetDay]) => {
+                        try {
                             // Try to find and manipulate the calendar widget
                             const calendars = document.querySelectorAll('.datepicker, .bootstrap-datetimepicker-widget, .calendar');
-                            for (let calendar of calendars) {{
-                                if (calendar.style.display !== 'none') {{
+                            for (let calendar of calendars) {
+                                if (calendar.style.display !== 'none') {
                                     // Try to click on month navigation first
                                     const nextBtns = calendar.querySelectorAll('.next, [data-action="next"], th.next');
-                                    const targetMonth = {target_month};
                                     const currentMonth = new Date().getMonth() + 1;
                                     const monthDiff = targetMonth - currentMonth;
                                     
-                                    if (monthDiff > 0) {{
-                                        for (let i = 0; i < monthDiff; i++) {{
-                                            for (let btn of nextBtns) {{
-                                                if (btn.offsetParent !== null) {{
+                                    if (monthDiff > 0) {
+                                        for (let i = 0; i < monthDiff; i++) {
+                                            for (let btn of nextBtns) {
+                                                if (btn.offsetParent !== null) {
                                                     btn.click();
                                                     break;
-                                                }}
-                                            }}
-                                        }}
-                                    }}
+                                                }
+                                            }
+                                        }
+                                    }
                                     
                                     // Now try to click the day
-                                    setTimeout(() => {{
+                                    setTimeout(() => {
                                         const dayElements = calendar.querySelectorAll('td');
-                                        for (let day of dayElements) {{
-                                            if (day.textContent.trim() === '{target_day}' && 
+                                        for (let day of dayElements) {
+                                            if (day.textContent.trim() === targetDay && 
                                                 !day.classList.contains('disabled') && 
                                                 !day.classList.contains('old') && 
-                                                !day.classList.contains('new')) {{
+                                                !day.classList.contains('new')) {
                                                 day.click();
                                                 return true;
-                                            }}
-                                        }}
-                                    }}, 1000);
+                                            }
+                                        }
+                                    }, 1000);
                                     
                                     return true;
-                                }}
-                            }}
+                                }
+                            }
                             return false;
-                        }} catch (e) {{
+                        } catch (e) {
                             console.error('Emergency method error:', e);
                             return false;
-                        }}
-                    }})()
-                """)
+                        }
+                    }
+                """, [target_month, str(target_day)])
                 
                 if emergency_result:
                     page.wait_for_timeout(get_wait_time(500))  # Optimized wait
-                    emergency_value = date_input.input_value()
+                    emergency_value = page.locator(f"#{input_id}").input_value()
                     if emergency_value == date_str:
                         print(f"🚨✅ Emergency method succeeded: {emergency_value}")
                         return True
@@ -421,13 +377,15 @@ def set_date_field(page, date_str):
                         print(f"🚨⚠️ Emergency method partial success: {emergency_value}")
         except Exception as e:
             print(f"🚨❌ Emergency method failed: {e}")
-        
-        print(f"❌ Date setting failed. Expected: {date_str}, Got: {final_value}")
-        return False
-            
-    except Exception as e:
-        print(f"❌ All date setting methods failed: {e}")
         return False
+    
+    return set_date_with_strategies(page, input_id, date_str, [
+        ('widget', by_widget),
+        ('calendar', by_calendar),
+        ('javascript', by_javascript),
+        ('fill', by_fill),
+        ('emergency', by_emergency)
+    ])
 
 def analyze_calendar_debug_results(calendar_debug):
     """Analyze calendar debug results to extract month/year info."""
@@ -470,50 +428,94 @@ def analyze_calendar_debug_results(calendar_debug):
         now = datetime.datetime.now()
         return now.month, now.year
 
+# Events a typed value would fire, for fields filled by the batched form fill
+TYPING_EVENTS = ['focus', 'input', 'keyup', 'change', 'blur']
+
+# Add New Personnel modal: filled and verified in one call (see form_specs.py)
+IKH_PERSONNEL_SPEC = {
+    'name': 'ikh.personnel',
+    'fields': [
+        {'name': 'nik', 'source': 'nik', 'rank': 'ikh.nik_input', 'events': TYPING_EVENTS,
+         'target': ["input[name='NIK / Passport*']", "#ahmgawpm002_nik_add", "input[placeholder*='NIK']",
+                    "input[placeholder*='Passport']", ".modal input[type='text']:first-of-type"],
+         'fallback': lambda page: page.get_by_role("textbox", name="NIK / Passport*")},
+        {'name': 'name', 'source': 'name', 'target': [{'label': 'Nama Pekerja'}], 'events': TYPING_EVENTS,
+         'fallback': lambda page: page.get_by_label("Nama Pekerja")},
+        {'name': 'address', 'source': 'address', 'target': 'ahmgawpm002_alamat_add', 'events': TYPING_EVENTS,
+         'fallback': True},
+        {'name': 'phone', 'source': 'phone', 'target': 'ahmgawpm002_no_hp_pekerja_add', 'events': TYPING_EVENTS,
+         'fallback': True},
+        {'name': 'email', 'source': 'email', 'events': TYPING_EVENTS,
+         'target': ["input[aria-label*='Contoh format pengisian']", "input[placeholder*='Contoh format pengisian']",
+                    {'label': 'Contoh format pengisian'}],
+         'fallback': lambda page: page.get_by_role("textbox", name="Contoh format pengisian :")}
+    ]
+}
+
 def add_personnel(page, name, nik, common_data):
-    """Add a single personnel entry with improved NIK handling (optimized for speed)."""
+    """Add a single personnel entry: one batched fill-and-verify of the modal (optimized for speed)."""
     page.get_by_role("button", name="+ Add New Personnel").click()
+    page.locator("#ahmgawpm002_submit_add_pekerja").wait_for(state="visible")
+    fill_form(page, IKH_PERSONNEL_SPEC, dict(common_data, name=name, nik=nik))
+    # Submit (no waits)
+    page.locator("#ahmgawpm002_submit_add_pekerja").click()
 
-    # More robust NIK input handling
+FORM_ID_PREFIX = "ahmgawpm002_"
+DATE_INPUT_ID = "ahmgawpm002_tanggal_pekerjaan_request_kontraktor"
+SHIFT_INPUT_ID = "ahmgawpm002_shift_request_kontraktor"
+
+def logged_in(page):
+    """Verification: the portal dashboard is shown after login."""
     try:
-        nik_selectors = [
-            "input[name='NIK / Passport*']",
-            "#ahmgawpm002_nik_add",
-            "input[placeholder*='NIK']",
-            "input[placeholder*='Passport']",
-            ".modal input[type='text']:first-of-type"
-        ]
-        nik_filled = False
-        for selector in nik_selectors:
-            try:
-                nik_field = page.locator(selector).first
-                if nik_field.is_visible():
-                    nik_field.fill(str(nik))
-                    filled_value = nik_field.input_value()
-                    if filled_value == str(nik):
-                        nik_filled = True
-                        break
-            except:
-                continue
-        if not nik_filled:
-            nik_textbox = page.get_by_role("textbox", name="NIK / Passport*")
-            nik_textbox.fill(str(nik))
+        page.wait_for_url("**/dashboard.htm**", timeout=15000)
+        return True
+    except Exception:
+        return False
+
+def modal_hidden(page, submit_selector):
+    """Verification: a modal was accepted and closed (its submit button is hidden)."""
+    try:
+        page.locator(submit_selector).wait_for(state="hidden", timeout=3000)
+        return True
+    except Exception:
+        return False
+
+def personnel_listed(page, nik):
+    """Check: the personnel table already has a row with the NIK (e.g. added by an attempt whose modal hung)."""
+    return page.evaluate(
+        "(nik) => Array.from(document.querySelectorAll('table td')).some((cell) => cell.textContent.trim() === nik)",
+        nik)
+
+def close_open_modal(page):
+    """Recovery: discard a half-filled modal so the step can start over."""
+    page.keyboard.press("Escape")
+    page.wait_for_timeout(get_wait_time(200))
+
+def save_step_screenshot(page, step, detail=None):
+    """Save a screenshot of a step that ran out of attempts."""
+    name = f"{step}_{detail.replace('/', '_')}" if detail else step
+    page.screenshot(path=artifact_path(f"error_{name}.png"))
+    print(f"📸 Screenshot saved: error_{name}.png")
+
+def force_shift_field(page, selected_shift):
+    """Emergency shift setting: force the value on any shift-like select."""
+    try:
+        # Try a more aggressive approach: enable, set value and option, fire every event
+        emergency_result = call_helper(page, 'forceShift', selected_shift)
+        print(f"🚨 Emergency retry result: {emergency_result}")
+        return bool(emergency_result.get('success'))
     except Exception as e:
-        print(f"⚠️ Warning: Issue with NIK input for {nik}: {e}")
-    # Fill other fields (no waits)
-    page.get_by_label("Nama Pekerja").fill(name)
-    page.locator("#ahmgawpm002_alamat_add").fill(common_data['address'])
-    page.locator("#ahmgawpm002_no_hp_pekerja_add").fill(common_data['phone'])
-    page.get_by_role("textbox", name="Contoh format pengisian :").fill(common_data['email'])
-    # Submit (no waits)
-    page.locator("#ahmgawpm002_submit_add_pekerja").click()
+        print(f"❌ Emergency shift retry failed: {e}")
+        return False
 
-def run(playwright: Playwright, personnel_list, selected_date=None, selected_shift=1):
-    """Main automation function optimized for speed."""
+def run(playwright: Playwright, personnel_list, selected_date=None, selected_shift=1, dry_run=False):
+    """Main automation function optimized for speed (dry_run: stop before Submit)."""
     print(f"[PROC] Starting IKH automation with parameters:")
     print(f"   📅 Date: {selected_date}")
     print(f"   🔄 Shift: {selected_shift}")
     print(f"   👥 Personnel count: {len(personnel_list)}")
+    if dry_run:
+        print("   🧪 Dry run: the form will not be submitted")
     
     # Get browser configuration from config file
     browser_config = get_browser_config()
@@ -525,50 +527,56 @@ def run(playwright: Playwright, personnel_list, selected_date=None, selected_shi
         slow_mo=browser_config['slow_mo']
     )
     context = browser.new_context()
+    install_helpers(context)
     page = context.new_page()
     
     # Set timeout configurations
     page.set_default_timeout(browser_config['default_timeout'])
     page.set_default_navigation_timeout(browser_config['navigation_timeout'])
-    common_data = {
-        'address': "RT.004/RW.011, Marga Mulya, Bekasi Utara, Bekasi, West Java 17143",
-        'phone': "082129002163",
-        'email': "Hirochiku-indonesia@co.id"
-    }
     try:
         print("🚀 Starting automation...")
-        # Login sequence (no waits)
-        page.goto("https://portal2.ahm.co.id/jx02/ahmipdsh000-pst/dashboard.htm")
-        page.get_by_role("textbox", name="Username").fill("KONTRAKTOR_P4_02")
-        page.get_by_role("textbox", name="Password").fill("H0nd42025!")
-        page.get_by_role("button", name=" LOGIN").click()
-        # Navigation (no waits)
-        page.get_by_role("link", name=" IZIN KERJA ").click()
-        page.get_by_role("link", name="Maintain Izin Kerja Harian").click()
-        page.get_by_role("button", name="+ Request IKH").click()
-        page.locator("#ahmgawpm002_nomor_ikp_request_kontraktor_lov_kontraktor").get_by_role("button", name="").click()
-        page.get_by_role("cell", name="REPAIR MELTING HPDC HM-2700").click()
+        steps = StepRunner(on_failure=lambda step, detail: save_step_screenshot(page, step, detail))
+        username, password = portal_credentials()
+        common_data = tenant_company()
+
+        def login():
+            # Login sequence (no waits)
+            with portal_call("login"):
+                page.goto("https://portal2.ahm.co.id/jx02/ahmipdsh000-pst/dashboard.htm")
+                page.get_by_role("textbox", name="Username").fill(username)
+                page.get_by_role("textbox", name="Password").fill(password)
+                page.get_by_role("button", name=" LOGIN").click()
+
+        steps.run("login", login, verify=lambda: logged_in(page))
+
+        def open_form():
+            # Navigation (no waits)
+            with portal_call("navigate"):
+                page.get_by_role("link", name=" IZIN KERJA ").click()
+                page.get_by_role("link", name="Maintain Izin Kerja Harian").click()
+                page.get_by_role("button", name="+ Request IKH").click()
+            page.locator("#ahmgawpm002_nomor_ikp_request_kontraktor_lov_kontraktor").get_by_role("button", name="").click()
+            page.get_by_role("cell", name="REPAIR MELTING HPDC HM-2700").click()
+
+        steps.run("form_setup", open_form, verify=lambda: page.locator(f"#{DATE_INPUT_ID}").is_visible(),
+                  recover=lambda: close_open_modal(page))
 
         # Set date efficiently
         date_str = setup_date(selected_date)
-        input_id = "ahmgawpm002_tanggal_pekerjaan_request_kontraktor"
-        date_success = set_date_field(page, date_str)
-        if not date_success:
-            print("⚠️ Warning: Date may not have been set correctly!")
-            page.screenshot(path="date_setting_error.png")
-        else:
+
+        def set_date():
+            if not set_date_field(page, date_str):
+                print("⚠️ Warning: Date may not have been set correctly!")
+            page.wait_for_timeout(get_wait_time(500))  # Optimized wait
+            return True
+
+        # Checked here so a retry can fix it, and again with the whole form before Submit
+        if steps.run("set_date", set_date, verify=lambda: verify_date_input(page, date_str), required=False):
             print("✅ Date setting confirmed successful")
-        page.wait_for_timeout(get_wait_time(500))  # Optimized wait
-        final_verification = verify_date_input(page, date_str)
-        if not final_verification:
-            print("🚨 CRITICAL: Date verification failed! Automation may fail.")
-            page.screenshot(path="date_verification_failed.png")
-            actual_value = page.locator(f"#{input_id}").input_value()
-            print(f"🔍 FINAL DEBUG - Field contains: '{actual_value}'")
 
         # Set shift based on parameter with robust error handling
         print(f"🔄 Preparing to set shift to: {selected_shift}")
-        
+
         # Pre-check: ensure shift field is available
         try:
             shift_available = page.wait_for_selector("#ahmgawpm002_shift_request_kontraktor", timeout=10000)
@@ -578,138 +586,101 @@ def run(playwright: Playwright, personnel_list, selected_date=None, selected_shi
                 print("⚠️ Shift field not found, but continuing...")
         except Exception as e:
             print(f"⚠️ Shift field availability check failed: {e}")
-        
-        shift_success = set_shift_field(page, selected_shift)
-        if not shift_success:
-            print("⚠️ Warning: Shift setting may not have been successful!")
-            # Debug the shift field to understand what went wrong
-            debug_shift_field(page)
-            page.screenshot(path="shift_setting_error.png")
-        else:
+
+        def set_shift():
+            if not set_shift_field(page, selected_shift):
+                print("⚠️ Shift setting may not have been successful, trying emergency method...")
+                force_shift_field(page, selected_shift)
+            page.wait_for_timeout(get_wait_time(500))  # Optimized wait
+            return True
+
+        # Debug the shift field before retrying to understand what went wrong
+        if steps.run("set_shift", set_shift, verify=lambda: verify_shift_setting(page, selected_shift),
+                     recover=lambda: debug_shift_field(page), required=False):
             print("✅ Shift setting confirmed successful")
-        
-        # Verify shift setting
-        page.wait_for_timeout(get_wait_time(500))  # Optimized wait
-        shift_verification = verify_shift_setting(page, selected_shift)
-        if not shift_verification:
-            print("🚨 CRITICAL: Shift verification failed! Attempting emergency retry...")
-            # Debug the shift field for verification failure
-            debug_shift_field(page)
-            
-            # Emergency retry with different approach
-            print("🚨 Attempting emergency shift retry...")
-            emergency_shift_success = False
-            
-            try:
-                # Try a more aggressive approach
-                emergency_result = page.evaluate(f"""
-                    (function() {{
-                        const targetShift = '{selected_shift}';
-                        const selects = document.querySelectorAll('select');
-                        
-                        for (let select of selects) {{
-                            if (select.id.includes('shift') || 
-                                select.name.includes('shift') ||
-                                Array.from(select.options).some(opt => opt.text.includes('Shift'))) {{
-                                
-                                try {{
-                                    // Force enable
-                                    select.disabled = false;
-                                    select.removeAttribute('disabled');
-                                    
-                                    // Set value multiple ways
-                                    select.value = targetShift;
-                                    select.selectedIndex = parseInt(targetShift) - 1;
-                                    
-                                    // Find matching option and select it
-                                    for (let i = 0; i < select.options.length; i++) {{
-                                        if (select.options[i].value === targetShift) {{
-                                            select.selectedIndex = i;
-                                            select.options[i].selected = true;
-                                            break;
-                                        }}
-                                    }}
-                                    
-                                    // Trigger comprehensive events
-                                    ['focus', 'click', 'change', 'input', 'blur'].forEach(eventType => {{
-                                        select.dispatchEvent(new Event(eventType, {{ bubbles: true, cancelable: true }}));
-                                    }});
-                                    
-                                    // Verify
-                                    if (select.value === targetShift) {{
-                                        return {{ success: true, id: select.id, value: select.value }};
-                                    }}
-                                }} catch (e) {{
-                                    console.error('Emergency retry error:', e);
-                                }}
-                            }}
-                        }}
-                        
-                        return {{ success: false, error: 'No suitable shift field found' }};
-                    }})()
-                """)
-                
-                print(f"🚨 Emergency retry result: {emergency_result}")
-                
-                if emergency_result.get('success'):
-                    emergency_shift_success = True
-                    print(f"✅ Emergency shift retry successful!")
-                    
-            except Exception as e:
-                print(f"❌ Emergency shift retry failed: {e}")
-            
-            if not emergency_shift_success:
-                print("🚨 ALL SHIFT SETTING ATTEMPTS FAILED!")
-                page.screenshot(path="shift_critical_failure.png")
-                print("📸 Critical failure screenshot saved")
-                # Continue automation but with warning
-                print("⚠️ Continuing automation with potentially incorrect shift...")
-            else:
-                # Re-verify after emergency fix
-                final_verification = verify_shift_setting(page, selected_shift)
-                if final_verification:
-                    print("✅ Emergency shift fix verified!")
-                else:
-                    print("⚠️ Emergency shift fix could not be verified")
-                    
-            page.screenshot(path="shift_verification_failed.png")
+        else:
+            print("⚠️ Continuing automation with potentially incorrect shift...")
 
         # Process personnel efficiently
         total = len(personnel_list)
         print(f"👥 Processing {total} personnel records...")
 
-        for idx, (name, nik) in enumerate(personnel_list, 1):
-            try:
-                print(f"🔄 Processing {idx}/{total}: {name} (NIK: {nik})")
+        for idx, person in enumerate(personnel_list, 1):
+            name, nik = person['name'], person['nik']
+            print(f"🔄 Processing {idx}/{total}: {name} (NIK: {nik})")
+            attempted = []
+
+            def add_person():
+                # A retry must not add the person twice: the earlier attempt may have saved the row
+                if attempted and personnel_listed(page, nik):
+                    print(f"    ✅ {name} already in the personnel table, not adding again")
+                    return
+                attempted.append(True)
                 add_personnel(page, name, nik, common_data)
 
-                # Progress update every 5 entries or at milestones
-                if idx % 5 == 0 or idx == total:
-                    percent = int((idx/total)*100)
-                    print(f"⏳ Progress: {percent}% ({idx}/{total})")
-                    sys.stdout.flush()
+            steps.run("add_personnel", add_person,
+                      verify=lambda: modal_hidden(page, "#ahmgawpm002_submit_add_pekerja"),
+                      recover=lambda: close_open_modal(page),
+                      detail=f"{idx}/{total}")
+
+            # Progress update every 5 entries or at milestones
+            if idx % 5 == 0 or idx == total:
+                percent = int((idx/total)*100)
+                print(f"⏳ Progress: {percent}% ({idx}/{total})")
+                sys.stdout.flush()
 
-            except Exception as e:
-                print(f"❌ Failed to add {name} (NIK: {nik}): {e}")
-                # Take screenshot for debugging
-                try:
-                    page.screenshot(path=f"error_personnel_{idx}.png")
-                    print(f"📸 Screenshot saved: error_personnel_{idx}.png")
-                except:
-                    pass
-                continue
         # Final submission steps (no waits)
-        page.get_by_role("button", name="+ Add New Area").click()
-        page.locator("#ahmgawpm002_add_area_modal").get_by_role("button", name="").click()
-        page.get_by_role("cell", name="G", exact=True).click()
-        page.locator("#ahmgawpm002_submit_area_pekerjaan").click()
-        page.locator(".maincontent_containers").click()
-        page.locator("#ahmgawpm002_halaman_request div").filter(has_text="Dengan ini saya menyatakan").nth(1).click()
-        page.locator("#ahmgawpm002_checkbox_persetujuan").check()
-        page.get_by_role("button", name=" Submit").click()
-        page.get_by_role("button", name=" OK").click()
+        def add_area():
+            page.get_by_role("button", name="+ Add New Area").click()
+            page.locator("#ahmgawpm002_add_area_modal").get_by_role("button", name="").click()
+            page.get_by_role("cell", name="G", exact=True).click()
+            page.locator("#ahmgawpm002_submit_area_pekerjaan").click()
+
+        def accept_terms():
+            page.locator(".maincontent_containers").click()
+            page.locator("#ahmgawpm002_halaman_request div").filter(has_text="Dengan ini saya menyatakan").nth(1).click()
+            page.locator("#ahmgawpm002_checkbox_persetujuan").check()
+
+        steps.run("add_area", add_area, verify=lambda: modal_hidden(page, "#ahmgawpm002_submit_area_pekerjaan"),
+                  recover=lambda: close_open_modal(page))
+        steps.run("accept_terms", accept_terms, verify=lambda: page.locator("#ahmgawpm002_checkbox_persetujuan").is_checked())
+
+        # One snapshot of the whole form against the job; date, shift and agreement are repaired once
+        expected = {
+            'fields': {
+                DATE_INPUT_ID: {'date': date_str, 'owner': 'set_date'},
+                SHIFT_INPUT_ID: {'value': str(selected_shift if selected_shift in (1, 2, 3) else 1), 'owner': 'set_shift'},
+                'ahmgawpm002_checkbox_persetujuan': {'checked': True, 'owner': 'accept_terms'}
+            },
+            'rows': [{'cells': [person['nik']], 'owner': 'add_personnel', 'key': person['nik']}
+                     for person in personnel_list] + [{'cells': ['G'], 'owner': 'add_area'}]
+        }
+        repairs = {
+            'set_date': lambda mismatches: set_date(),
+            'set_shift': lambda mismatches: set_shift(),
+            'accept_terms': lambda mismatches: accept_terms()
+        }
+        # A dry run reports mismatches in form_check.json instead of failing before its artifacts
+        form_state, _ = steps.run("verify_form", lambda: verify_form(page, FORM_ID_PREFIX, expected, repairs,
+                                                                     mode='warn' if dry_run else None))
+
+        def submit():
+            with portal_call("submit"):
+                page.get_by_role("button", name=" Submit").click()
+                page.get_by_role("button", name=" OK").click()
+
+        if dry_run:
+            finish_dry_run(page, FORM_ID_PREFIX, form_state)
+            return
+
+        steps.run("submit", submit)
         print("✅ Automation completed successfully!")
+        if steps.retries:
+            print(f"🔁 Steps retried: {steps.retries}")
         page.wait_for_timeout(get_wait_time(200))  # Optimized wait
+    except JobCancelled:
+        print("🛑 Automation cancelled - closing job context")
+        raise
     except Exception as e:
         print(f"❌ Automation failed: {e}")
         raise
@@ -730,10 +701,11 @@ def get_calendar_month_year(page):
             ".month-year-display"
         ]
         
-        for selector in header_selectors:
+        for selector in selectors.ordered('ikh.calendar_header', header_selectors):
             try:
                 header_element = page.locator(selector)
                 if header_element.is_visible():
+                    selectors.found('ikh.calendar_header', selector)
                     header_text = header_element.text_content()
                     print(f"📅 Calendar header found: '{header_text}'")
                     # Parse month/year from header text
@@ -826,6 +798,9 @@ def navigate_to_month_year(page, target_month, target_year, current_month, curre
             print("✅ Already at target month/year")
             return True
         
+        if navigate_calendar(page, target_month, target_year):
+            return True
+        
         # Find navigation buttons
         next_selectors = [
             ".next-month", ".calendar-next", ".ui-datepicker-next", 
@@ -840,12 +815,13 @@ def navigate_to_month_year(page, target_month, target_year, current_month, curre
             # Navigate forward
             for _ in range(abs(months_diff)):
                 clicked = False
-                for selector in next_selectors:
+                for selector in selectors.ordered('ikh.calendar_next', next_selectors):
                     try:
                         next_btn = page.locator(selector)
                         if next_btn.is_visible():
                             next_btn.click()
                             print(f"➡️ Clicked next using: {selector}")
+                            selectors.found('ikh.calendar_next', selector)
                             clicked = True
                             page.wait_for_timeout(get_wait_time(300))  # Optimized wait
                             break
@@ -858,12 +834,13 @@ def navigate_to_month_year(page, target_month, target_year, current_month, curre
             # Navigate backward
             for _ in range(abs(months_diff)):
                 clicked = False
-                for selector in prev_selectors:
+                for selector in selectors.ordered('ikh.calendar_prev', prev_selectors):
                     try:
                         prev_btn = page.locator(selector)
                         if prev_btn.is_visible():
                             prev_btn.click()
                             print(f"⬅️ Clicked prev using: {selector}")
+                            selectors.found('ikh.calendar_prev', selector)
                             clicked = True
                             page.wait_for_timeout(get_wait_time(300))  # Optimized wait
                             break
@@ -929,7 +906,7 @@ def navigate_bootstrap_calendar(page, target_month, target_year, current_month,
             clicked = False
             print(f"🔄 Step {step+1}/{steps}: Looking for {direction} button...")
             
-            for selector in navigation_selectors[direction]:
+            for selector in selectors.ordered(f'ikh.bootstrap_{direction}', navigation_selectors[direction]):
                 try:
                     nav_btn = page.locator(selector)
                     count = nav_btn.count()
@@ -942,6 +919,7 @@ def navigate_bootstrap_calendar(page, target_month, target_year, current_month,
                                 if element.is_visible() and element.is_enabled():
                                     element.click()
                                     print(f"{'➡️' if direction == 'next' else '⬅️'} Clicked {direction} using: {selector} (element {i}, step {step+1}/{steps})")
+                                    selectors.found(f'ikh.bootstrap_{direction}', selector)
                                     clicked = True
                                     page.wait_for_timeout(get_wait_time(200))  # Optimized wait
                                     break
@@ -998,66 +976,50 @@ def try_header_navigation(page, target_month, target_year):
             '.month-year-header'
         ]
         
-        for selector in header_selectors:
-            try:
-                header = page.locator(selector)
-                if header.is_visible():
-                    print(f"🔍 Found header: {selector}")
-                    header_text = header.text_content()
-                    print(f"📝 Header text: '{header_text}'")
-                    
-                    # Try clicking the header to get month/year picker
-                    header.click()
-                    page.wait_for_timeout(get_wait_time(200))  # Optimized wait
-                    
-                    # Look for month picker view
-                    month_selectors = [
-                        f'[data-month="{target_month-1}"]',  # 0-based months
-                        f'.month:has-text("{get_month_name(target_month)}")',
-                        f'td:has-text("{get_month_name(target_month)}")',
-                        f'span:has-text("{get_month_name(target_month)}")'
-                    ]
-                    
-                    month_clicked = False
-                    for month_sel in month_selectors:
-                        try:
-                            month_elem = page.locator(month_sel)
-                            if month_elem.is_visible():
-                                month_elem.click()
-                                print(f"📅 Clicked month using: {month_sel}")
-                                month_clicked = True
-                                page.wait_for_timeout(get_wait_time(500))  # Optimized wait
-                                break
-                        except:
-                            continue
-                    
-                    if month_clicked:
-                        # Now try to select year if needed
-                        year_selectors = [
-                            f'[data-year="{target_year}"]',
-                            f'.year:has-text("{target_year}")',
-                            f'td:has-text("{target_year}")',
-                            f'span:has-text("{target_year}")'
-                        ]
-                        
-                        for year_sel in year_selectors:
-                            try:
-                                year_elem = page.locator(year_sel)
-                                if year_elem.is_visible():
-                                    year_elem.click()
-                                    print(f"📅 Clicked year using: {year_sel}")
-                                    page.wait_for_timeout(get_wait_time(500))  # Optimized wait
-                                    break
-                            except:
-                                continue
-                        
-                        return True
-                        
-            except Exception as e:
-                print(f"⚠️ Header selector {selector} failed: {e}")
-                continue
+        # One probe per view instead of is_visible() per candidate
+        header = first_visible(probe_selectors(page, selectors.ordered('ikh.calendar_switch', header_selectors)))
+        if not header:
+            return False
+        selectors.found('ikh.calendar_switch', header['selector'])
+        print(f"🔍 Found header: {header['selector']}")
+        print(f"📝 Header text: '{header['text']}'")
         
-        return False
+        # Try clicking the header to get month/year picker
+        page.locator(header['selector']).nth(header['index']).click()
+        page.wait_for_timeout(get_wait_time(200))  # Optimized wait
+        
+        # Look for month picker view
+        month_selectors = [
+            f'[data-month="{target_month-1}"]',  # 0-based months
+            f'.month:has-text("{get_month_name(target_month)}")',
+            f'td:has-text("{get_month_name(target_month)}")',
+            f'span:has-text("{get_month_name(target_month)}")'
+        ]
+        
+        month = first_visible(probe_selectors(page, selectors.ordered('ikh.month_cell', month_selectors)))
+        if not month:
+            return False
+        page.locator(month['selector']).nth(month['index']).click()
+        print(f"📅 Clicked month using: {month['selector']}")
+        selectors.found('ikh.month_cell', month['selector'])
+        page.wait_for_timeout(get_wait_time(500))  # Optimized wait
+        
+        # Now try to select year if needed
+        year_selectors = [
+            f'[data-year="{target_year}"]',
+            f'.year:has-text("{target_year}")',
+            f'td:has-text("{target_year}")',
+            f'span:has-text("{target_year}")'
+        ]
+        
+        year = first_visible(probe_selectors(page, selectors.ordered('ikh.year_cell', year_selectors)))
+        if year:
+            page.locator(year['selector']).nth(year['index']).click()
+            selectors.found('ikh.year_cell', year['selector'])
+            print(f"📅 Clicked year using: {year['selector']}")
+            page.wait_for_timeout(get_wait_time(500))  # Optimized wait
+        
+        return True
         
     except Exception as e:
         print(f"❌ Header navigation failed: {e}")
@@ -1116,21 +1078,21 @@ def debug_date_area(page, input_id):
         print("🔍 === DATE AREA DEBUGGING ===")
         
         # Get info about the date input and surrounding elements
-        date_area_info = page.evaluate(f"""
-            () => {{
-                const input = document.getElementById('{input_id}');
-                const results = {{
+        date_area_info = page.evaluate("""
+            (inputId) => {
+                const input = document.getElementById(inputId);
+                const results = {
                     input_info: null,
                     parent_info: null,
                     siblings: [],
                     nearby_spans: [],
                     nearby_buttons: [],
                     all_date_related: []
-                }};
+                };
                 
-                if (input) {{
+                if (input) {
                     // Input info
-                    results.input_info = {{
+                    results.input_info = {
                         id: input.id,
                         value: input.value,
                         type: input.type,
@@ -1139,83 +1101,83 @@ def debug_date_area(page, input_id):
                         placeholder: input.placeholder,
                         classes: input.className,
                         style: input.style.cssText
-                    }};
+                    };
                     
                     // Parent info
-                    if (input.parentElement) {{
-                        results.parent_info = {{
+                    if (input.parentElement) {
+                        results.parent_info = {
                             tag: input.parentElement.tagName,
                             id: input.parentElement.id,
                             classes: input.parentElement.className
-                        }};
-                    }}
+                        };
+                    }
                     
                     // Siblings
-                    if (input.parentElement) {{
-                        Array.from(input.parentElement.children).forEach(child => {{
-                            results.siblings.push({{
+                    if (input.parentElement) {
+                        Array.from(input.parentElement.children).forEach(child => {
+                            results.siblings.push({
                                 tag: child.tagName,
                                 id: child.id,
                                 classes: child.className,
                                 text: child.textContent?.trim()?.substring(0, 50) || ''
-                            }});
-                        }});
-                    }}
+                            });
+                        });
+                    }
                     
                     // Look for spans with similar ID pattern
                     const spanPattern = input.id + '_span';
                     const spanElement = document.getElementById(spanPattern);
-                    if (spanElement) {{
-                        results.nearby_spans.push({{
+                    if (spanElement) {
+                        results.nearby_spans.push({
                             id: spanElement.id,
                             tag: spanElement.tagName,
                             classes: spanElement.className,
                             text: spanElement.textContent?.trim() || '',
                             clickable: spanElement.onclick !== null
-                        }});
-                    }}
+                        });
+                    }
                     
                     // Look for buttons near the input
                     const allButtons = document.querySelectorAll('button, a, span[onclick], div[onclick]');
-                    allButtons.forEach(btn => {{
+                    allButtons.forEach(btn => {
                         const rect = btn.getBoundingClientRect();
                         const inputRect = input.getBoundingClientRect();
                         const distance = Math.abs(rect.left - inputRect.right);
                         
-                        if (distance < 100 && rect.top >= inputRect.top - 50 && rect.top <= inputRect.bottom + 50) {{
-                            results.nearby_buttons.push({{
+                        if (distance < 100 && rect.top >= inputRect.top - 50 && rect.top <= inputRect.bottom + 50) {
+                            results.nearby_buttons.push({
                                 tag: btn.tagName,
                                 id: btn.id,
                                 classes: btn.className,
                                 text: btn.textContent?.trim()?.substring(0, 30) || '',
                                 onclick: btn.onclick !== null,
                                 distance: Math.round(distance)
-                            }});
-                        }}
-                    }});
+                            });
+                        }
+                    });
                     
                     // Look for any element with 'date', 'calendar', 'picker' in id or class
                     const allElements = document.querySelectorAll('*');
-                    allElements.forEach(el => {{
+                    allElements.forEach(el => {
                         const id = el.id?.toLowerCase() || '';
                         const classes = el.className?.toLowerCase() || '';
                         
                         if ((id.includes('date') || id.includes('calendar') || id.includes('picker') ||
                              classes.includes('date') || classes.includes('calendar') || classes.includes('picker')) &&
-                            el.offsetWidth > 0 && el.offsetHeight > 0) {{
-                            results.all_date_related.push({{
+                            el.offsetWidth > 0 && el.offsetHeight > 0) {
+                            results.all_date_related.push({
                                 tag: el.tagName,
                                 id: el.id,
                                 classes: el.className,
                                 text: el.textContent?.trim()?.substring(0, 50) || ''
-                            }});
-                        }}
-                    }});
-                }}
+                            });
+                        }
+                    });
+                }
                 
                 return results;
-            }}
-        """)
+            }
+        """, input_id)
         
         print("📋 Date Area Analysis:")
         if date_area_info['input_info']:
@@ -1267,16 +1229,16 @@ def set_shift_field(page, selected_shift):
             # Wait for element to be available
             shift_locator.wait_for(state="visible", timeout=5000)
             
+            # Current value and enabled state in one probe
+            state = probe_selectors(page, [f"#{shift_id}"])[0]
+            if state['value'] == shift_value:
+                print(f"✅ Shift already set: {shift_value}")
+                return True
+            
             # Check if element is enabled
-            if not shift_locator.is_enabled():
+            if not state['enabled']:
                 print("⚠️ Shift field is disabled, trying to enable...")
-                page.evaluate(f"""
-                    const select = document.getElementById('{shift_id}');
-                    if (select) {{
-                        select.disabled = false;
-                        select.removeAttribute('disabled');
-                    }}
-                """)
+                call_helper(page, 'enable', shift_id)
                 page.wait_for_timeout(get_wait_time(500))  # Optimized wait
             shift_locator.select_option(shift_value)
             page.wait_for_timeout(get_wait_time(800))  # Optimized critical wait for shift selection
@@ -1295,48 +1257,17 @@ def set_shift_field(page, selected_shift):
         # Method 2: JavaScript manipulation
         try:
             print("🔧 Method 2: JavaScript manipulation...")
-            js_result = page.evaluate(f"""
-                (function() {{
-                    try {{
-                        const select = document.getElementById('{shift_id}');
-                        if (!select) {{
-                            return {{ success: false, error: 'Element not found' }};
-                        }}
-                        
-                        // Enable the select if disabled
-                        select.disabled = false;
-                        select.removeAttribute('disabled');
-                        
-                        // Set the value
-                        select.value = '{shift_value}';
-                        
-                        // Trigger events to ensure the change is detected
-                        const events = ['input', 'change', 'blur', 'focus'];
-                        events.forEach(eventType => {{
-                            const event = new Event(eventType, {{ bubbles: true, cancelable: true }});
-                            select.dispatchEvent(event);
-                        }});
-                        
-                        // Verify the value was set
-                        const finalValue = select.value;
-                        return {{ 
-                            success: finalValue === '{shift_value}', 
-                            value: finalValue,
-                            options: Array.from(select.options).map(opt => ({{ value: opt.value, text: opt.text }}))
-                        }};
-                    }} catch (e) {{
-                        return {{ success: false, error: e.message }};
-                    }}
-                }})()
-            """)
+            # Enable the select, set the value and trigger events so the change is detected
+            js_result = call_helper(page, 'setField', shift_id, shift_value, ['input', 'change', 'blur', 'focus'],
+                                    {'enable': True})
             
             print(f"📊 JavaScript result: {js_result}")
             
-            if js_result.get('success'):
+            if js_result['ok']:
                 print(f"✅ Method 2 successful: {js_result.get('value')}")
                 return True
             else:
-                print(f"⚠️ Method 2 failed: {js_result.get('error')}")
+                print(f"⚠️ Method 2 failed: {'value not taken' if js_result['found'] else 'Element not found'}")
                 available_options = js_result.get('options', [])
                 print(f"🔍 Available options: {available_options}")
                 
@@ -1355,18 +1286,16 @@ def set_shift_field(page, selected_shift):
             ]
             
             option_clicked = False
-            for selector in option_selectors:
+            option = first_visible(probe_selectors(page, selectors.ordered('ikh.shift_option', option_selectors)))
+            if option:
                 try:
-                    option_element = page.locator(selector)
-                    if option_element.count() > 0 and option_element.is_visible():
-                        option_element.click()
-                        print(f"✅ Clicked option using selector: {selector}")
-                        option_clicked = True
-                        page.wait_for_timeout(get_wait_time(800))  # Optimized critical wait for option selection
-                        break
+                    page.locator(option['selector']).nth(option['index']).click()
+                    print(f"✅ Clicked option using selector: {option['selector']}")
+                    selectors.found('ikh.shift_option', option['selector'])
+                    option_clicked = True
+                    page.wait_for_timeout(get_wait_time(800))  # Optimized critical wait for option selection
                 except Exception as e:
-                    print(f"⚠️ Option selector {selector} failed: {e}")
-                    continue
+                    print(f"⚠️ Option selector {option['selector']} failed: {e}")
             
             if option_clicked:
                 # Verify the selection
@@ -1415,39 +1344,7 @@ def set_shift_field(page, selected_shift):
         try:
             print("🚨 Method 5: Emergency fallback...")
             
-            all_selects_result = page.evaluate(f"""
-                (function() {{
-                    const allSelects = document.querySelectorAll('select');
-                    const results = [];
-                    
-                    for (let select of allSelects) {{
-                        if (select.id.includes('shift') || 
-                            select.name.includes('shift') ||
-                            select.className.includes('shift')) {{
-                            
-                            try {{
-                                select.value = '{shift_value}';
-                                select.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                
-                                results.push({{
-                                    id: select.id,
-                                    name: select.name,
-                                    value: select.value,
-                                    success: select.value === '{shift_value}'
-                                }});
-                            }} catch (e) {{
-                                results.push({{
-                                    id: select.id,
-                                    name: select.name,
-                                    error: e.message
-                                }});
-                            }}
-                        }}
-                    }}
-                    
-                    return results;
-                }})()
-            """)
+            all_selects_result = call_helper(page, 'forceShift', shift_value, True)['results']
             
             print(f"🔍 Emergency scan results: {all_selects_result}")
             
@@ -1485,7 +1382,9 @@ def verify_shift_setting(page, expected_shift):
     shift_id = "ahmgawpm002_shift_request_kontraktor"
     
     try:
-        current_value = page.locator(f"#{shift_id}").input_value()
+        # Value and select details in one probe
+        state = probe_selectors(page, [f"#{shift_id}"])[0]
+        current_value = state['value']
         expected_value = str(expected_shift)
         
         print(f"🔍 Current shift value: '{current_value}'")
@@ -1497,25 +1396,12 @@ def verify_shift_setting(page, expected_shift):
         else:
             print("❌ Shift verification failed!")
             
-            # Try to get more info about the select element
-            shift_info = page.evaluate(f"""
-                (function() {{
-                    const select = document.getElementById('{shift_id}');
-                    if (!select) return {{ error: 'Element not found' }};
-                    
-                    return {{
-                        value: select.value,
-                        selectedIndex: select.selectedIndex,
-                        options: Array.from(select.options).map((opt, idx) => ({{
-                            index: idx,
-                            value: opt.value,
-                            text: opt.text,
-                            selected: opt.selected
-                        }})),
-                        disabled: select.disabled
-                    }};
-                }})()
-            """)
+            # Details of the select element from the same probe
+            if state['count']:
+                shift_info = {'value': current_value, 'selectedIndex': state.get('selected_index'),
+                              'options': state.get('options'), 'disabled': not state['enabled']}
+            else:
+                shift_info = {'error': 'Element not found'}
             
             print(f"🔍 Detailed shift info: {shift_info}")
             return False
@@ -1531,23 +1417,23 @@ def debug_shift_field(page):
     try:
         print("🔍 === SHIFT FIELD DEBUGGING ===")
         
-        shift_debug_info = page.evaluate(f"""
-            (function() {{
-                const select = document.getElementById('{shift_id}');
-                const results = {{
+        shift_debug_info = page.evaluate("""
+            (shiftId) => {
+                const select = document.getElementById(shiftId);
+                const results = {
                     element_found: false,
                     element_info: null,
                     options: [],
                     parent_info: null,
                     nearby_elements: [],
                     computed_styles: null
-                }};
+                };
                 
-                if (select) {{
+                if (select) {
                     results.element_found = true;
                     
                     // Basic element info
-                    results.element_info = {{
+                    results.element_info = {
                         tag: select.tagName,
                         id: select.id,
                         name: select.name,
@@ -1558,57 +1444,57 @@ def debug_shift_field(page):
                         required: select.required,
                         className: select.className,
                         style: select.style.cssText
-                    }};
+                    };
                     
                     // Options info
-                    Array.from(select.options).forEach((option, index) => {{
-                        results.options.push({{
+                    Array.from(select.options).forEach((option, index) => {
+                        results.options.push({
                             index: index,
                             value: option.value,
                             text: option.text,
                             selected: option.selected,
                             disabled: option.disabled
-                        }});
-                    }});
+                        });
+                    });
                     
                     // Parent info
-                    if (select.parentElement) {{
-                        results.parent_info = {{
+                    if (select.parentElement) {
+                        results.parent_info = {
                             tag: select.parentElement.tagName,
                             id: select.parentElement.id,
                             className: select.parentElement.className
-                        }};
-                    }}
+                        };
+                    }
                     
                     // Nearby elements (labels, siblings, etc.)
                     const parent = select.parentElement;
-                    if (parent) {{
-                        Array.from(parent.children).forEach(child => {{
-                            if (child !== select) {{
-                                results.nearby_elements.push({{
+                    if (parent) {
+                        Array.from(parent.children).forEach(child => {
+                            if (child !== select) {
+                                results.nearby_elements.push({
                                     tag: child.tagName,
                                     id: child.id,
                                     className: child.className,
                                     text: child.textContent?.trim()?.substring(0, 50) || ''
-                                }});
-                            }}
-                        }});
-                    }}
+                                });
+                            }
+                        });
+                    }
                     
                     // Computed styles
                     const computedStyle = window.getComputedStyle(select);
-                    results.computed_styles = {{
+                    results.computed_styles = {
                         display: computedStyle.display,
                         visibility: computedStyle.visibility,
                         opacity: computedStyle.opacity,
                         pointerEvents: computedStyle.pointerEvents,
                         zIndex: computedStyle.zIndex
-                    }};
-                }}
+                    };
+                }
                 
                 return results;
-            }})()
-        """)
+            }
+        """, shift_id)
         
         print("📋 Shift Field Analysis:")
         if shift_debug_info['element_found']:
@@ -1660,14 +1546,23 @@ if __name__ == "__main__":
     parser.add_argument('selected_indices', nargs='*', type=int, help='Selected row indices')
     parser.add_argument('--date', help='Selected date in YYYY-MM-DD format')
     parser.add_argument('--shift', type=int, default=1, help='Selected shift (1, 2, or 3)')
+    parser.add_argument(DRY_RUN_FLAG, action='store_true', help='Fill the form but stop before Submit')
+    parser.add_argument(ROSTER_FLAG, help='Personnel records snapshotted by the app (instead of reading the CSV)')
     
     args = parser.parse_args()
     
-    personnel_list = read_csv(args.csv_file_path, args.selected_indices)
+    if args.roster:
+        personnel_list = read_roster(args.roster)
+    else:
+        personnel_list = snapshot_personnel(args.csv_file_path, args.selected_indices)
+    print(f"[INFO] Loaded {len(personnel_list)} valid personnel records")
     
     if not personnel_list:
         print("❌ No personnel data found")
         sys.exit(1)
         
     with sync_playwright() as playwright:
-        run(playwright, personnel_list, args.date, args.shift)
\ No newline at end of file
+        try:
+            run(playwright, personnel_list, args.date, args.shift, args.dry_run)
+        except JobCancelled:
+            sys.exit(CANCELLED_EXIT_CODE)
\ No newline at end of file
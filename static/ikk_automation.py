@@ -13,7 +13,6 @@ Arguments:
     shift       : Shift number 1-3 for IKK form [default: 1]
 """
 
-import csv
 import sys
 import datetime
 import os
@@ -22,36 +21,26 @@ from playwright.sync_api import Playwright, sync_playwright
 # Import browser configuration
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from browser_config import get_browser_config, get_browser_mode_description
+from job_runtime import artifact_path, JobCancelled, CANCELLED_EXIT_CODE
+from portal_guard import portal_call
+from credential_pool import portal_credentials
+from tenants import tenant_company
+from step_runner import StepRunner
+from dry_run import finish_dry_run, DRY_RUN_FLAG
+from roster import snapshot_personnel, read_roster, roster_arg, invalid_expiries, expiry_problem
+from datepicker import set_date_via_widget, navigate_calendar, set_date_with_strategies, date_value_matches
+from selector_cache import selectors
+from form_schema import form_fields
+from page_helpers import install_helpers, call_helper
+from form_specs import fill_form
+from form_check import verify_form, option_matches
 
-def read_csv(file_path, selected_indices=None, selected_shift=None):
-    """⚡ SPEED READ CSV - Ultra FAST! ⚡"""
-    data = []
-    with open(file_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        rows = list(reader)
-        
-        if selected_shift:
-            print(f"🔄 Shift {selected_shift}: Will be set in IKK form")
-        
-        if selected_indices:
-            for idx in selected_indices:
-                if 0 <= idx < len(rows):
-                    row = rows[idx]
-                    name = row.get('Nama', '').strip()
-                    nik = str(row.get('Nomor', '')).strip()
-                    
-                    if name and nik:
-                        data.append((name, nik))
-        else:
-            for row in rows:
-                name = row.get('Nama', '').strip()
-                nik = str(row.get('Nomor', '')).strip()
-                
-                if name and nik:
-                    data.append((name, nik))
-    
-    print(f"⚡ LOADED: {len(data)} personnel records")
-    return data
+# Default roster per category (the job runner passes the tenant's roster with --csv=)
+CSV_MAP = {
+    "IA": "personnel_list_IA.csv",
+    "IR": "personnel_list_IR.csv",
+    "IK": "personnel_list_IK.csv"
+}
 
 def setup_date(selected_date=None):
     """⚡ FIXED DATE SETUP - No more wrong dates! ⚡"""
@@ -77,9 +66,8 @@ def setup_date(selected_date=None):
     today = datetime.date.today()
     return today.strftime('%d/%m/%Y')
 
-def set_date_field(page, date_str):
+def set_date_field(page, date_str, input_id="ahmgawpm003_tanggal_pelaksanaan_pekerjaan_khusus_request_kontraktor"):
     """👨‍💻 ENHANCED DATE PICKER - Robust Calendar Navigation from ori.py ⚡"""
-    input_id = "ahmgawpm003_tanggal_pelaksanaan_pekerjaan_khusus_request_kontraktor"
     
     print(f"👨‍💻 ENHANCED MODE: Setting work date {date_str}")
     
@@ -95,7 +83,10 @@ def set_date_field(page, date_str):
         print(f"⚠️ Invalid date format: {date_str}")
         return False
     
-    try:
+    def by_widget():
+        return set_date_via_widget(page, input_id, date_str)
+    
+    def by_calendar():
         # HUMAN-LIKE APPROACH: Click calendar icon first
         print(f"📅 HUMAN-LIKE: Opening calendar picker...")
         
@@ -110,12 +101,13 @@ def set_date_field(page, date_str):
         ]
         
         calendar_opened = False
-        for selector in calendar_selectors:
+        for selector in selectors.ordered('ikk.calendar_icon', calendar_selectors):
             try:
                 calendar_icon = page.locator(selector).first
                 if calendar_icon.is_visible():
                     print(f"📅 Clicking calendar icon: {selector}")
                     calendar_icon.click()
+                    selectors.found('ikk.calendar_icon', selector)
                     calendar_opened = True
                     break
             except:
@@ -133,97 +125,99 @@ def set_date_field(page, date_str):
         # Wait for calendar to appear
         page.wait_for_timeout(1000)
         
-        # Navigate to correct year first
-        print(f"📅 Navigating to year {target_year}...")
-        year_navigation_attempts = 0
-        max_year_attempts = 5
+        # Planned navigation (month/year views) reads the view once; stepping is the fallback
+        if not navigate_calendar(page, target_month, target_year):
+            # Navigate to correct year first
+            print(f"📅 Navigating to year {target_year}...")
+            year_navigation_attempts = 0
+            max_year_attempts = 5
         
-        while year_navigation_attempts < max_year_attempts:
-            try:
-                # Look for year display elements
-                year_elements = page.locator(".ui-datepicker-year, .year, [class*='year']")
-                if year_elements.count() > 0:
-                    current_year_text = year_elements.first.text_content()
-                    current_year = int(current_year_text.strip())
+            while year_navigation_attempts < max_year_attempts:
+                try:
+                    # Look for year display elements
+                    year_elements = page.locator(".ui-datepicker-year, .year, [class*='year']")
+                    if year_elements.count() > 0:
+                        current_year_text = year_elements.first.text_content()
+                        current_year = int(current_year_text.strip())
                     
-                    if current_year == target_year:
-                        print(f"✅ Year {target_year} found!")
+                        if current_year == target_year:
+                            print(f"✅ Year {target_year} found!")
+                            break
+                        elif current_year < target_year:
+                            # Need to go forward
+                            next_year_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
+                            if next_year_btn.is_visible():
+                                next_year_btn.click()
+                        elif current_year > target_year:
+                            # Need to go backward
+                            prev_year_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
+                            if prev_year_btn.is_visible():
+                                prev_year_btn.click()
+                    else:
                         break
-                    elif current_year < target_year:
-                        # Need to go forward
-                        next_year_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
-                        if next_year_btn.is_visible():
-                            next_year_btn.click()
-                    elif current_year > target_year:
-                        # Need to go backward
-                        prev_year_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
-                        if prev_year_btn.is_visible():
-                            prev_year_btn.click()
-                else:
-                    break
                     
-            except Exception as year_error:
-                print(f"⚠️ Year navigation error: {year_error}")
-                break
+                except Exception as year_error:
+                    print(f"⚠️ Year navigation error: {year_error}")
+                    break
                 
-            year_navigation_attempts += 1
+                year_navigation_attempts += 1
         
-        # Navigate to correct month
-        print(f"📅 Navigating to month {target_month}...")
-        month_navigation_attempts = 0
-        max_month_attempts = 12
+            # Navigate to correct month
+            print(f"📅 Navigating to month {target_month}...")
+            month_navigation_attempts = 0
+            max_month_attempts = 12
         
-        while month_navigation_attempts < max_month_attempts:
-            try:
-                # Look for month display elements
-                month_elements = page.locator(".ui-datepicker-month, .month, [class*='month']")
-                if month_elements.count() > 0:
-                    current_month_text = month_elements.first.text_content().strip().lower()
-                    
-                    # Month name to number mapping
-                    month_names = [
-                        'januari', 'februari', 'maret', 'april', 'mei', 'juni',
-                        'juli', 'agustus', 'september', 'oktober', 'november', 'desember'
-                    ]
-                    
-                    current_month = 0
-                    for i, month_name in enumerate(month_names, 1):
-                        if month_name in current_month_text:
-                            current_month = i
-                            break
+            while month_navigation_attempts < max_month_attempts:
+                try:
+                    # Look for month display elements
+                    month_elements = page.locator(".ui-datepicker-month, .month, [class*='month']")
+                    if month_elements.count() > 0:
+                        current_month_text = month_elements.first.text_content().strip().lower()
                     
-                    if current_month == 0:
-                        # Try English month names
-                        en_month_names = [
-                            'january', 'february', 'march', 'april', 'may', 'june',
-                            'july', 'august', 'september', 'october', 'november', 'december'
+                        # Month name to number mapping
+                        month_names = [
+                            'januari', 'februari', 'maret', 'april', 'mei', 'juni',
+                            'juli', 'agustus', 'september', 'oktober', 'november', 'desember'
                         ]
-                        for i, month_name in enumerate(en_month_names, 1):
+                    
+                        current_month = 0
+                        for i, month_name in enumerate(month_names, 1):
                             if month_name in current_month_text:
                                 current_month = i
                                 break
                     
-                    if current_month == target_month:
-                        print(f"✅ Month {target_month} found!")
+                        if current_month == 0:
+                            # Try English month names
+                            en_month_names = [
+                                'january', 'february', 'march', 'april', 'may', 'june',
+                                'july', 'august', 'september', 'october', 'november', 'december'
+                            ]
+                            for i, month_name in enumerate(en_month_names, 1):
+                                if month_name in current_month_text:
+                                    current_month = i
+                                    break
+                    
+                        if current_month == target_month:
+                            print(f"✅ Month {target_month} found!")
+                            break
+                        elif current_month < target_month:
+                            # Need to go forward
+                            next_month_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
+                            if next_month_btn.is_visible():
+                                next_month_btn.click()
+                        elif current_month > target_month:
+                            # Need to go backward
+                            prev_month_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
+                            if prev_month_btn.is_visible():
+                                prev_month_btn.click()
+                    else:
                         break
-                    elif current_month < target_month:
-                        # Need to go forward
-                        next_month_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
-                        if next_month_btn.is_visible():
-                            next_month_btn.click()
-                    elif current_month > target_month:
-                        # Need to go backward
-                        prev_month_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
-                        if prev_month_btn.is_visible():
-                            prev_month_btn.click()
-                else:
-                    break
                     
-            except Exception as month_error:
-                print(f"⚠️ Month navigation error: {month_error}")
-                break
+                except Exception as month_error:
+                    print(f"⚠️ Month navigation error: {month_error}")
+                    break
                 
-            month_navigation_attempts += 1
+                month_navigation_attempts += 1
         
         # Click target day
         print(f"📅 Clicking day {target_day}...")
@@ -238,7 +232,7 @@ def set_date_field(page, date_str):
             f"[data-date='{target_day}']"
         ]
         
-        for selector in day_selectors:
+        for selector in selectors.ordered('ikk.calendar_day', day_selectors):
             try:
                 day_elements = page.locator(selector)
                 if day_elements.count() > 0:
@@ -251,6 +245,7 @@ def set_date_field(page, date_str):
                             if "disabled" not in classes and "other-month" not in classes:
                                 day_element.click()
                                 print(f"✅ Day {target_day} clicked successfully!")
+                                selectors.found('ikk.calendar_day', selector)
                                 day_clicked = True
                                 break
                 
@@ -260,76 +255,45 @@ def set_date_field(page, date_str):
             except Exception as day_error:
                 print(f"⚠️ Day selector {selector} failed: {day_error}")
                 continue
-        
-        if not day_clicked:
-            print(f"⚠️ Could not click day {target_day}, trying JavaScript fallback...")
-            # JavaScript fallback: Set the date directly without Playwright interactions
-            fallback_success = page.evaluate(f"""
-                (function() {{
-                    try {{
-                        const field = document.getElementById('{input_id}');
-                        if (field) {{
-                            field.value = '{date_str}';
-                            field.setAttribute('value', '{date_str}');
-                            
-                            // Fire events
-                            const inputEvent = new Event('input', {{bubbles: true}});
-                            const changeEvent = new Event('change', {{bubbles: true}});
-                            field.dispatchEvent(inputEvent);
-                            field.dispatchEvent(changeEvent);
-                            
-                            return {{success: true, value: field.value}};
-                        }}
-                        return {{success: false, reason: 'field_not_found'}};
-                    }} catch(e) {{
-                        return {{success: false, reason: 'error', error: e.message}};
-                    }}
-                }})()
-            """)
-            print(f"      JavaScript fallback result: {fallback_success}")
-        
-        # Verify final result (PURE JAVASCRIPT - no Playwright locator)
-        page.wait_for_timeout(500)
-        final_value = page.evaluate(f"""
-            (function() {{
-                try {{
-                    const field = document.getElementById('{input_id}');
-                    return field ? field.value : 'field_not_found';
-                }} catch(e) {{
-                    return 'verification_error';
-                }}
-            }})()
-        """)
-        print(f"✅ Final date value: '{final_value}'")
-        
-        # Enable Add Personnel button
-        page.evaluate("""
-            var addBtns = Array.from(document.querySelectorAll('button')).filter(function(btn) {
-                return btn.textContent.includes('Add Personnel') || btn.textContent.includes('Add');
-            });
-            addBtns.forEach(function(btn) {
-                btn.removeAttribute('disabled');
-                btn.disabled = false;
-                btn.style.pointerEvents = 'auto';
-                btn.style.opacity = '1';
-            });
-        """)
-        
-        return True
-        
-    except Exception as e:
-        print(f"⚠️ Human-like date setting error: {e}")
-        
+        return day_clicked
+    
+    def by_javascript():
+        print(f"🔧 Setting date {date_str} via JavaScript...")
+        # JavaScript fallback: Set the date directly without Playwright interactions
+        fallback_success = call_helper(page, 'setField', input_id, date_str, ['input', 'change'], {'attribute': True})
+        print(f"      JavaScript fallback result: {fallback_success}")
+        return fallback_success['found']
+    
+    def by_fill():
         # Emergency fallback: direct input
         print(f"🚨 EMERGENCY FALLBACK: Direct input...")
-        try:
-            input_element = page.locator(f"#{input_id}")
-            input_element.click()
-            input_element.fill(date_str)
-            input_element.press("Tab")
-            return True
-        except:
-            return False
+        input_element = page.locator(f"#{input_id}")
+        input_element.click()
+        input_element.fill(date_str)
+        input_element.press("Tab")
+        return True
+    
+    date_set = set_date_with_strategies(page, input_id, date_str, [
+        ('widget', by_widget),
+        ('calendar', by_calendar),
+        ('javascript', by_javascript),
+        ('fill', by_fill)
+    ])
+    
+    # Enable Add Personnel button
+    page.evaluate("""
+        var addBtns = Array.from(document.querySelectorAll('button')).filter(function(btn) {
+            return btn.textContent.includes('Add Personnel') || btn.textContent.includes('Add');
+        });
+        addBtns.forEach(function(btn) {
+            btn.removeAttribute('disabled');
+            btn.disabled = false;
+            btn.style.pointerEvents = 'auto';
+            btn.style.opacity = '1';
+        });
+    """)
+    
+    return date_set
 
 def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_berlaku_izin_add'):
     """👨‍💻 HUMAN MIMIC CERTIFICATE EXPIRY DATE PICKER - Full Calendar Navigation ⚡"""
@@ -353,37 +317,41 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
         print(f"⚠️ Invalid expiry date format: {date_str}")
         return False
     
+    # WAIT FOR FIELD TO EXIST FIRST (IMPORTANT!)
+    print(f"⏳ Waiting for expiry field {input_id} to be available...")
     try:
-        # WAIT FOR FIELD TO EXIST FIRST (IMPORTANT!)
-        print(f"⏳ Waiting for expiry field {input_id} to be available...")
-        try:
-            page.wait_for_selector(f"#{input_id}", state="visible", timeout=5000)
-            print(f"✅ Expiry field {input_id} is now available")
-        except Exception as wait_err:
-            print(f"⚠️ Expiry field wait failed: {wait_err}")
-            # Try alternative selectors
-            alt_selectors = [
-                'input[id*="tanggal_akhir_berlaku"]',
-                'input[id*="tanggal_akhir"]',
-                'input[id*="expiry"]',
-                'input[id*="expired"]'
-            ]
-            field_found = False
-            for selector in alt_selectors:
-                try:
-                    page.wait_for_selector(selector, state="visible", timeout=2000)
-                    alt_field = page.locator(selector).first
-                    if alt_field.is_visible():
-                        input_id = alt_field.get_attribute("id") or selector
-                        print(f"✅ Alternative expiry field found: {input_id}")
-                        field_found = True
-                        break
-                except:
-                    continue
-            if not field_found:
-                print(f"❌ No expiry field found - cannot proceed")
-                return False
-        
+        page.wait_for_selector(f"#{input_id}", state="visible", timeout=5000)
+        print(f"✅ Expiry field {input_id} is now available")
+    except Exception as wait_err:
+        print(f"⚠️ Expiry field wait failed: {wait_err}")
+        # Try alternative selectors
+        alt_selectors = [
+            'input[id*="tanggal_akhir_berlaku"]',
+            'input[id*="tanggal_akhir"]',
+            'input[id*="expiry"]',
+            'input[id*="expired"]'
+        ]
+        field_found = False
+        for selector in selectors.ordered('ikk.expiry_input', alt_selectors):
+            try:
+                page.wait_for_selector(selector, state="visible", timeout=2000)
+                alt_field = page.locator(selector).first
+                if alt_field.is_visible():
+                    input_id = alt_field.get_attribute("id") or selector
+                    print(f"✅ Alternative expiry field found: {input_id}")
+                    selectors.found('ikk.expiry_input', selector)
+                    field_found = True
+                    break
+            except:
+                continue
+        if not field_found:
+            print(f"❌ No expiry field found - cannot proceed")
+            return False
+    
+    def by_widget():
+        return set_date_via_widget(page, input_id, f"{target_day:02d}/{target_month:02d}/{target_year}")
+    
+    def by_calendar():
         # HUMAN MIMIC APPROACH: Click calendar icon first
         print(f"📅 HUMAN MIMIC: Opening expiry calendar picker...")
         
@@ -398,12 +366,13 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
         ]
         
         calendar_opened = False
-        for selector in calendar_selectors:
+        for selector in selectors.ordered('ikk.expiry_calendar_icon', calendar_selectors):
             try:
                 calendar_icon = page.locator(selector).first
                 if calendar_icon.is_visible():
                     print(f"📅 Clicking expiry calendar icon: {selector}")
                     calendar_icon.click()
+                    selectors.found('ikk.expiry_calendar_icon', selector)
                     calendar_opened = True
                     print(f"✅ Expiry calendar opened via icon")
                     break
@@ -424,117 +393,119 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
         # Wait for calendar to appear
         page.wait_for_timeout(1000)
         
-        # Navigate to correct year
-        print(f"📅 Navigating to year {target_year}...")
-        year_navigation_attempts = 0
-        max_year_attempts = 5
+        # Planned navigation (month/year views) reads the view once; stepping is the fallback
+        if not navigate_calendar(page, target_month, target_year):
+            # Navigate to correct year
+            print(f"📅 Navigating to year {target_year}...")
+            year_navigation_attempts = 0
+            max_year_attempts = 5
         
-        while year_navigation_attempts < max_year_attempts:
-            try:
-                print(f"🔍 Year navigation attempt {year_navigation_attempts + 1}/{max_year_attempts}")
+            while year_navigation_attempts < max_year_attempts:
+                try:
+                    print(f"🔍 Year navigation attempt {year_navigation_attempts + 1}/{max_year_attempts}")
                 
-                # Look for year display elements
-                year_elements = page.locator(".ui-datepicker-year, .year, [class*='year']")
-                year_count = year_elements.count()
-                print(f"📊 Found {year_count} year elements")
+                    # Look for year display elements
+                    year_elements = page.locator(".ui-datepicker-year, .year, [class*='year']")
+                    year_count = year_elements.count()
+                    print(f"📊 Found {year_count} year elements")
                 
-                if year_count > 0:
-                    current_year_text = year_elements.first.text_content()
-                    current_year = int(current_year_text.strip())
-                    print(f"📅 Current calendar year: {current_year}, Target: {target_year}")
+                    if year_count > 0:
+                        current_year_text = year_elements.first.text_content()
+                        current_year = int(current_year_text.strip())
+                        print(f"📅 Current calendar year: {current_year}, Target: {target_year}")
                     
-                    if current_year == target_year:
-                        print(f"✅ Year {target_year} found! Navigation successful.")
+                        if current_year == target_year:
+                            print(f"✅ Year {target_year} found! Navigation successful.")
+                            break
+                        elif current_year < target_year:
+                            # Need to go forward
+                            print(f"➡️ Need to go forward from {current_year} to {target_year}")
+                            next_year_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
+                            if next_year_btn.is_visible():
+                                next_year_btn.click()
+                                print(f"⏭️ Clicked next year button")
+                            else:
+                                print(f"⚠️ Next year button not visible")
+                        elif current_year > target_year:
+                            # Need to go backward
+                            print(f"⬅️ Need to go backward from {current_year} to {target_year}")
+                            prev_year_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
+                            if prev_year_btn.is_visible():
+                                prev_year_btn.click()
+                                print(f"⏮️ Clicked previous year button")
+                            else:
+                                print(f"⚠️ Previous year button not visible")
+                    else:
+                        print(f"⚠️ No year elements found in calendar")
                         break
-                    elif current_year < target_year:
-                        # Need to go forward
-                        print(f"➡️ Need to go forward from {current_year} to {target_year}")
-                        next_year_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
-                        if next_year_btn.is_visible():
-                            next_year_btn.click()
-                            print(f"⏭️ Clicked next year button")
-                        else:
-                            print(f"⚠️ Next year button not visible")
-                    elif current_year > target_year:
-                        # Need to go backward
-                        print(f"⬅️ Need to go backward from {current_year} to {target_year}")
-                        prev_year_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
-                        if prev_year_btn.is_visible():
-                            prev_year_btn.click()
-                            print(f"⏮️ Clicked previous year button")
-                        else:
-                            print(f"⚠️ Previous year button not visible")
-                else:
-                    print(f"⚠️ No year elements found in calendar")
-                    break
                     
-            except Exception as year_error:
-                print(f"❌ Year navigation error: {year_error}")
-                break
+                except Exception as year_error:
+                    print(f"❌ Year navigation error: {year_error}")
+                    break
                 
-            year_navigation_attempts += 1
+                year_navigation_attempts += 1
         
-        if year_navigation_attempts >= max_year_attempts:
-            print(f"⚠️ Year navigation failed after {max_year_attempts} attempts. Current year may not be {target_year}")
-        else:
-            print(f"✅ Year navigation completed in {year_navigation_attempts + 1} attempts")
+            if year_navigation_attempts >= max_year_attempts:
+                print(f"⚠️ Year navigation failed after {max_year_attempts} attempts. Current year may not be {target_year}")
+            else:
+                print(f"✅ Year navigation completed in {year_navigation_attempts + 1} attempts")
         
-        # Navigate to correct month
-        print(f"📅 Navigating to month {target_month}...")
-        month_navigation_attempts = 0
-        max_month_attempts = 12
+            # Navigate to correct month
+            print(f"📅 Navigating to month {target_month}...")
+            month_navigation_attempts = 0
+            max_month_attempts = 12
         
-        while month_navigation_attempts < max_month_attempts:
-            try:
-                # Look for month display elements
-                month_elements = page.locator(".ui-datepicker-month, .month, [class*='month']")
-                if month_elements.count() > 0:
-                    current_month_text = month_elements.first.text_content().strip().lower()
-                    
-                    # Month name to number mapping
-                    month_names = [
-                        'januari', 'februari', 'maret', 'april', 'mei', 'juni',
-                        'juli', 'agustus', 'september', 'oktober', 'november', 'desember'
-                    ]
-                    
-                    current_month = 0
-                    for i, month_name in enumerate(month_names, 1):
-                        if month_name in current_month_text:
-                            current_month = i
-                            break
+            while month_navigation_attempts < max_month_attempts:
+                try:
+                    # Look for month display elements
+                    month_elements = page.locator(".ui-datepicker-month, .month, [class*='month']")
+                    if month_elements.count() > 0:
+                        current_month_text = month_elements.first.text_content().strip().lower()
                     
-                    if current_month == 0:
-                        # Try English month names
-                        en_month_names = [
-                            'january', 'february', 'march', 'april', 'may', 'june',
-                            'july', 'august', 'september', 'october', 'november', 'december'
+                        # Month name to number mapping
+                        month_names = [
+                            'januari', 'februari', 'maret', 'april', 'mei', 'juni',
+                            'juli', 'agustus', 'september', 'oktober', 'november', 'desember'
                         ]
-                        for i, month_name in enumerate(en_month_names, 1):
+                    
+                        current_month = 0
+                        for i, month_name in enumerate(month_names, 1):
                             if month_name in current_month_text:
                                 current_month = i
                                 break
                     
-                    if current_month == target_month:
-                        print(f"✅ Month {target_month} found!")
+                        if current_month == 0:
+                            # Try English month names
+                            en_month_names = [
+                                'january', 'february', 'march', 'april', 'may', 'june',
+                                'july', 'august', 'september', 'october', 'november', 'december'
+                            ]
+                            for i, month_name in enumerate(en_month_names, 1):
+                                if month_name in current_month_text:
+                                    current_month = i
+                                    break
+                    
+                        if current_month == target_month:
+                            print(f"✅ Month {target_month} found!")
+                            break
+                        elif current_month < target_month:
+                            # Need to go forward
+                            next_month_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
+                            if next_month_btn.is_visible():
+                                next_month_btn.click()
+                        elif current_month > target_month:
+                            # Need to go backward
+                            prev_month_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
+                            if prev_month_btn.is_visible():
+                                prev_month_btn.click()
+                    else:
                         break
-                    elif current_month < target_month:
-                        # Need to go forward
-                        next_month_btn = page.locator(".ui-datepicker-next, .next, [class*='next']").first
-                        if next_month_btn.is_visible():
-                            next_month_btn.click()
-                    elif current_month > target_month:
-                        # Need to go backward
-                        prev_month_btn = page.locator(".ui-datepicker-prev, .prev, [class*='prev']").first
-                        if prev_month_btn.is_visible():
-                            prev_month_btn.click()
-                else:
-                    break
                     
-            except Exception as month_error:
-                print(f"⚠️ Month navigation error: {month_error}")
-                break
+                except Exception as month_error:
+                    print(f"⚠️ Month navigation error: {month_error}")
+                    break
                 
-            month_navigation_attempts += 1
+                month_navigation_attempts += 1
         
         # Click target day
         print(f"📅 Clicking day {target_day}...")
@@ -549,7 +520,7 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
             f"[data-date='{target_day}']"
         ]
         
-        for selector in day_selectors:
+        for selector in selectors.ordered('ikk.expiry_calendar_day', day_selectors):
             try:
                 day_elements = page.locator(selector)
                 if day_elements.count() > 0:
@@ -562,6 +533,7 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
                             if "disabled" not in classes and "other-month" not in classes:
                                 day_element.click()
                                 print(f"✅ Day {target_day} clicked successfully!")
+                                selectors.found('ikk.expiry_calendar_day', selector)
                                 day_clicked = True
                                 break
                 
@@ -571,103 +543,205 @@ def set_expiry_date_field(page, date_str, input_id='ahmgawpm003_tanggal_akhir_be
             except Exception as day_error:
                 print(f"⚠️ Day selector {selector} failed: {day_error}")
                 continue
-        
-        if not day_clicked:
-            print(f"⚠️ Could not click day {target_day}, trying JavaScript fallback...")
-            # JavaScript fallback: Set the date directly without Playwright interactions
-            fallback_success = page.evaluate(f"""
-                (function() {{
-                    try {{
-                        const field = document.getElementById('{input_id}');
-                        if (field) {{
-                            field.value = '{date_str}';
-                            field.setAttribute('value', '{date_str}');
-                            
-                            // Fire events
-                            const inputEvent = new Event('input', {{bubbles: true}});
-                            const changeEvent = new Event('change', {{bubbles: true}});
-                            field.dispatchEvent(inputEvent);
-                            field.dispatchEvent(changeEvent);
-                            
-                            return {{success: true, value: field.value}};
-                        }}
-                        return {{success: false, reason: 'field_not_found'}};
-                    }} catch(e) {{
-                        return {{success: false, reason: 'error', error: e.message}};
-                    }}
-                }})()
-            """)
-            print(f"      JavaScript fallback result: {fallback_success}")
-        
-        # Verify final result (PURE JAVASCRIPT - no Playwright locator)
-        page.wait_for_timeout(500)
-        final_value = page.evaluate(f"""
-            (function() {{
-                try {{
-                    const field = document.getElementById('{input_id}');
-                    return field ? field.value : 'field_not_found';
-                }} catch(e) {{
-                    return 'verification_error';
-                }}
-            }})()
-        """)
-        print(f"✅ Final expiry date value: '{final_value}'")
-        # Force set value if not as expected
-        if final_value != date_str:
-            print(f"⚠️ Final value '{final_value}' tidak sesuai target '{date_str}', force set via JS (all events)")
-            page.evaluate(f"""
-                (function() {{
-                    const field = document.getElementById('{input_id}');
-                    if (field) {{
-                        field.value = '{date_str}';
-                        field.setAttribute('value', '{date_str}');
-                        ['input', 'change', 'blur', 'focus', 'keydown', 'keyup'].forEach(eventType => {{
-                            field.dispatchEvent(new Event(eventType, {{bubbles: true}}));
-                        }});
-                        // Blur ke field lain
-                        field.blur();
-                        setTimeout(() => {{
-                            field.focus();
-                        }}, 100);
-                    }}
-                }})()
-            """)
-            # Re-verify
-            import time
-            time.sleep(0.2)
-            final_value2 = page.evaluate(f"""
-                (function() {{
-                    try {{
-                        const field = document.getElementById('{input_id}');
-                        return field ? field.value : 'field_not_found';
-                    }} catch(e) {{
-                        return 'verification_error';
-                    }}
-                }})()
-            """)
-            print(f"✅ Final expiry date value after force set (all events): '{final_value2}'")
-        
+        return day_clicked
+    
+    def by_javascript():
+        print(f"🔧 Setting expiry date {date_str} via JavaScript (all events)...")
+        # All events, then blur to another field
+        call_helper(page, 'setField', input_id, date_str, ['input', 'change', 'blur', 'focus', 'keydown', 'keyup'],
+                    {'attribute': True, 'blur': True})
+        page.wait_for_timeout(200)
         return True
-        
-    except Exception as e:
-        print(f"⚠️ Human mimic expiry date setting error: {e}")
-        
+    
+    def by_fill():
         # Emergency fallback: direct input
         print(f"🚨 EMERGENCY FALLBACK: Direct expiry input...")
-        try:
-            input_element = page.locator(f"#{input_id}")
-            input_element.click()
-            input_element.fill(date_str)
-            input_element.press("Tab")
-            return True
-        except:
-            return False
+        input_element = page.locator(f"#{input_id}")
+        input_element.click()
+        input_element.fill(date_str)
+        input_element.press("Tab")
+        return True
+    
+    return set_date_with_strategies(page, input_id, date_str, [
+        ('widget', by_widget),
+        ('calendar', by_calendar),
+        ('javascript', by_javascript),
+        ('fill', by_fill)
+    ])
+
+FORM_ID_PREFIX = "ahmgawpm003_"
+WORK_DATE_INPUT_ID = "ahmgawpm003_tanggal_pelaksanaan_pekerjaan_khusus_request_kontraktor"
+
+# Logical fields of the request form, discovered once per form fingerprint (see form_schema.py)
+IKK_FORM_RULES = {
+    'shift': {
+        'known': ['ahmgawpm003_shift', 'ahmgawpm003_shift_request_kontraktor', 'ahmgawpm003_shift_kerja',
+                  'ahmgawpm003_shift_kerja_request_kontraktor', 'ahmgawpm003_waktu_shift', 'ahmgawpm003_jam_shift',
+                  'ahmgawpm003_shift_pekerjaan', 'ahmgawpm003_jadwal_shift', 'ahmgawpm003_waktu_pelaksanaan_shift'],
+        'keywords': [['shift']],
+        'tags': ['select', 'input'],
+        'options': ['1', '2', '3']
+    },
+    'description': {
+        'known': ['ahmgawpm003_deskripsi_pekerjaan_khusus_request_kontraktor'],
+        'keywords': [['deskripsi']],
+        'tags': ['textarea', 'input']
+    },
+    'work_date': {
+        'known': [WORK_DATE_INPUT_ID],
+        'keywords': [['tanggal', 'pelaksanaan']],
+        'tags': ['input']
+    }
+}
+
+# Logical fields of the Add Personnel modal
+IKK_PERSONNEL_RULES = {
+    'nik': {'known': ['ahmgawpm003_nik_paspor_pekerja_add'], 'keywords': [['nik', 'add']], 'tags': ['input']},
+    'cert_number': {'known': ['ahmgawpm003_nomor_sertifikasi_add'], 'keywords': [['nomor', 'sertifikasi']],
+                    'tags': ['input']},
+    'expiry': {'known': ['ahmgawpm003_tanggal_akhir_berlaku_izin_add'], 'keywords': [['akhir', 'berlaku']],
+               'tags': ['input']}
+}
+
+# Modal and header form specs: each filled and verified in one call (see form_specs.py)
+IKK_HEADER_SPEC = {
+    'name': 'ikk.header',
+    'fields': [
+        {'name': 'work_category', 'value': 'Internal', 'target': 'ahmgawpm003_kategori_pekerjaan_request_kontraktor',
+         'events': ['change']},
+        # The IKK category options depend on the work category
+        {'name': 'ikk_category', 'source': 'ikk_category', 'target': 'ahmgawpm003_kategori_ikk_request_kontraktor',
+         'events': ['change'], 'delay': 50}
+    ]
+}
+
+IKK_SAFETY_SPEC = {
+    'name': 'ikk.safety_induction',
+    'fields': [
+        {'name': 'status', 'choose': ['Sudah', 'Aktif'], 'target': 'ahmgawpm003_status_safety_induction_edit',
+         'optional': True},
+        {'name': 'date', 'source': 'date', 'target': 'ahmgawpm003_tanggal_safety_induction_edit', 'events': ['input'],
+         'optional': True}
+    ]
+}
+
+# Certification Y/N decides whether the certificate fields apply
+IKK_PERSONNEL_SPEC = {
+    'name': 'ikk.personnel',
+    'fields': [
+        {'name': 'nik', 'source': 'nik', 'target': 'ahmgawpm003_nik_paspor_pekerja_add', 'fallback': True},
+        {'name': 'name', 'source': 'name', 'target': 'ahmgawpm003_nama_pekerja_add', 'fallback': True},
+        {'name': 'phone', 'source': 'phone', 'target': 'ahmgawpm003_nomor_hp_pekerja_add', 'optional': True},
+        {'name': 'email', 'source': 'email', 'target': 'ahmgawpm003_email_pekerja_add', 'optional': True},
+        {'name': 'section', 'source': 'unit', 'target': 'ahmgawpm003_seksi_add', 'optional': True},
+        {'name': 'department', 'source': 'unit', 'target': 'ahmgawpm003_departemen_add', 'optional': True},
+        {'name': 'division', 'source': 'unit', 'target': 'ahmgawpm003_divisi_add', 'optional': True},
+        {'name': 'cert_required', 'source': 'cert_required', 'target': 'ahmgawpm003_kebutuhan_sertifikasi_add',
+         'events': ['change'], 'optional': True}
+    ]
+}
+
+IKK_CERT_SPEC = {
+    'name': 'ikk.certificate',
+    'fields': [
+        {'name': 'cert_number', 'source': 'cert', 'target': 'ahmgawpm003_nomor_sertifikasi_add', 'fallback': True}
+    ]
+}
+
+# Tool ID and quantity are both "1"; remaining empty inputs of the modal are filled too
+TOOL_MODAL_INPUTS = '#ahmgawpm003_add_tool_modal input[type="text"], #ahmgawpm003_add_tool_modal input[type="number"]'
+IKK_TOOL_SPEC = {
+    'name': 'ikk.tool',
+    'fields': [
+        {'name': 'tool_id', 'value': '1', 'target': 'ahmgawpm003_tool_id_add', 'optional': True},
+        {'name': 'quantity', 'value': '1', 'optional': True,
+         'target': ['#ahmgawpm003_jumlah_add', 'input[name*="jumlah"]', '#ahmgawpm003_add_tool_modal input[type="number"]',
+                    '#ahmgawpm003_add_tool_modal input:nth-of-type(2)']},
+        {'name': 'description', 'value': 'BASIC TOOLS', 'target': 'ahmgawpm003_deskripsi_alat_add', 'optional': True},
+        {'name': 'permit_flag', 'value': 'Tidak', 'target': 'ahmgawpm003_permit_flag_add', 'events': ['change'],
+         'optional': True}
+    ],
+    'after': [('fillEmpty', TOOL_MODAL_INPUTS, {'number': '1', 'text': 'BASIC TOOLS'})]
+}
 
-def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30", deskripsi="MELTING REPAIR", selected_shift=1):
+def logged_in(page):
+    """Verification: the portal dashboard is shown after login."""
+    try:
+        page.wait_for_url("**/dashboard.htm**", timeout=15000)
+        return True
+    except Exception:
+        return False
+
+def form_category_set(page, ikk_category):
+    """Verification: the IKK request form is open with the category selected."""
+    return page.locator("#ahmgawpm003_kategori_ikk_request_kontraktor").input_value() == ikk_category
+
+# Value and label of a shift field (the checked radio of its group for a radio)
+SHIFT_STATE_SCRIPT = """
+(id) => {
+    const el = document.getElementById(id);
+    if (!el) return null;
+    if (el.type === 'radio') {
+        const radio = Array.from(document.getElementsByName(el.name)).find((r) => r.checked);
+        return {value: radio ? radio.value : '', text: ''};
+    }
+    const option = el.tagName === 'SELECT' ? el.options[el.selectedIndex] : null;
+    return {value: el.value, text: option ? option.text : ''};
+}
+"""
+
+def shift_options(selected_shift):
+    """Option values and label that setShift picks for a shift."""
+    return [str(selected_shift), f"shift{selected_shift}", f"Shift {selected_shift}"]
+
+def shift_set(page, shift_id, selected_shift):
+    """Verification: the shift field reads back as the selected shift."""
+    state = page.evaluate(SHIFT_STATE_SCRIPT, shift_id)
+    return bool(state) and any(option_matches(text, state['value'], state['text'])
+                               for text in shift_options(selected_shift))
+
+def work_date_set(page, date_str, input_id=WORK_DATE_INPUT_ID):
+    """Verification: the work date field holds the requested day, month and year."""
+    day, month, year = (int(part) for part in date_str.split('/'))
+    return date_value_matches(page.locator(f"#{input_id}").input_value(), day, month, year)
+
+def modal_hidden(page, submit_selector):
+    """Verification: a modal was accepted and closed (its submit button is hidden)."""
+    try:
+        page.locator(submit_selector).wait_for(state="hidden", timeout=3000)
+        return True
+    except Exception:
+        return False
+
+def personnel_listed(page, nik):
+    """Check: the personnel table already has a row with the NIK (e.g. added by an attempt whose modal hung)."""
+    return page.evaluate(
+        "(nik) => Array.from(document.querySelectorAll('table td')).some((cell) => cell.textContent.trim() === nik)",
+        nik)
+
+def close_open_modal(page):
+    """Recovery: discard a half-filled modal so the step can start over."""
+    page.keyboard.press("Escape")
+    page.wait_for_timeout(200)
+
+def save_step_screenshot(page, step, detail=None):
+    """Save a screenshot of a step that ran out of attempts."""
+    name = f"{step}_{detail.replace('/', '_')}" if detail else step
+    page.screenshot(path=artifact_path(f"error_{name}.png"))
+    print(f"📸 Screenshot saved: error_{name}.png")
+
+def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30", deskripsi="MELTING REPAIR", selected_shift=1, dry_run=False):
     """⚡ MERGED IKK AUTOMATION - Best of Both Worlds! ⚡"""
     print(f"🚀 MERGED IKK START - Category: {ikk_category}, Shift: {selected_shift}")
     print(f"👥 Personnel: {len(personnel_data)} people")
     
+    # Expiry dates were parsed when the roster was loaded: stop before login, not mid-run
+    bad_dates = invalid_expiries(personnel_data)
+    if bad_dates:
+        for person in bad_dates:
+            print(f"❌ Row {person['row']} {person['name']}: {expiry_problem(person)}")
+        raise ValueError(f"{len(bad_dates)} personnel have a missing or unreadable certificate expiry date")
+    
     # Get browser configuration from config file
     browser_config = get_browser_config()
     print(f"🖥️ Browser mode: {get_browser_mode_description()}")
@@ -678,6 +752,7 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         slow_mo=browser_config['slow_mo']
     )
     context = browser.new_context()
+    install_helpers(context)
     page = context.new_page()
     
     # Set timeout configurations
@@ -686,255 +761,88 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
 
     try:
         # ⚡ INSTANT LOGIN
+        steps = StepRunner(on_failure=lambda step, detail: save_step_screenshot(page, step, detail))
+        username, password = portal_credentials()
+        company = tenant_company()
         print("⚡ INSTANT LOGIN...")
-        page.goto("https://portal2.ahm.co.id/jx02/ahmipdsh000-pst/login.htm#AHMGAWPM003:1")
-        page.get_by_role("textbox", name="Username").fill("KONTRAKTOR_P4_02")
-        page.get_by_role("textbox", name="Password").fill("H0nd42025!")
-        page.get_by_role("button", name=" LOGIN").click()
-        page.wait_for_url("**/dashboard.htm**", timeout=60000)
+
+        def login():
+            with portal_call("login"):
+                page.goto("https://portal2.ahm.co.id/jx02/ahmipdsh000-pst/login.htm#AHMGAWPM003:1")
+                page.get_by_role("textbox", name="Username").fill(username)
+                page.get_by_role("textbox", name="Password").fill(password)
+                page.get_by_role("button", name=" LOGIN").click()
+                page.wait_for_url("**/dashboard.htm**", timeout=60000)
+
+        steps.run("login", login, verify=lambda: logged_in(page))
         print("✅ LOGIN SUCCESS")
 
-        # ⚡ INSTANT NAVIGATION
-        print("⚡ INSTANT NAVIGATION...")
-        page.get_by_role("link", name=" IZIN KERJA ").click()
-        page.get_by_role("link", name="Maintain Izin Kerja Khusus").click()
-        page.get_by_role("button", name="+ Request IKK").click()
-        
-        # ⚡ INSTANT FORM SETUP
-        print("⚡ INSTANT FORM SETUP...")
-        page.wait_for_selector("#ahmgawpm003_kategori_pekerjaan_request_kontraktor", timeout=10000)
-        
-        # Ultra-fast form filling with JavaScript - semua sekaligus!
-        page.evaluate(f"""
-            // INSTANT form setup - all at once
-            document.getElementById('ahmgawpm003_kategori_pekerjaan_request_kontraktor').value = 'Internal';
-            document.getElementById('ahmgawpm003_kategori_pekerjaan_request_kontraktor').dispatchEvent(new Event('change', {{bubbles: true}}));
-            
-            setTimeout(() => {{
-                document.getElementById('ahmgawpm003_kategori_ikk_request_kontraktor').value = '{ikk_category}';
-                document.getElementById('ahmgawpm003_kategori_ikk_request_kontraktor').dispatchEvent(new Event('change', {{bubbles: true}}));
-            }}, 50);
-        """)
-        
-        page.wait_for_timeout(200)  # Minimal wait
-        
-        # ⚡ INSTANT AREA SELECTION
-        print("⚡ INSTANT AREA...")
-        page.locator("#ahmgawpm003_nomor_ikp_request_kontraktor_lov_kontraktor").get_by_role("button", name="").click()
-        page.wait_for_timeout(100)
-        
-        try:
-            page.get_by_text("REPAIR MELTING", exact=False).first.click()
-        except:
+        def open_form():
+            # ⚡ INSTANT NAVIGATION
+            print("⚡ INSTANT NAVIGATION...")
+            with portal_call("navigate"):
+                page.get_by_role("link", name=" IZIN KERJA ").click()
+                page.get_by_role("link", name="Maintain Izin Kerja Khusus").click()
+                page.get_by_role("button", name="+ Request IKK").click()
+
+            # ⚡ INSTANT FORM SETUP
+            print("⚡ INSTANT FORM SETUP...")
+            page.wait_for_selector("#ahmgawpm003_kategori_pekerjaan_request_kontraktor", timeout=10000)
+
+            # Ultra-fast form filling with JavaScript - semua sekaligus!
+            fill_form(page, IKK_HEADER_SPEC, {'ikk_category': ikk_category})
+
+            page.wait_for_timeout(200)  # Minimal wait
+
+            # ⚡ INSTANT AREA SELECTION
+            print("⚡ INSTANT AREA...")
+            page.locator("#ahmgawpm003_nomor_ikp_request_kontraktor_lov_kontraktor").get_by_role("button", name="").click()
+            page.wait_for_timeout(100)
+
             try:
-                page.get_by_text("REPAIR").first.click()
+                page.get_by_text("REPAIR MELTING", exact=False).first.click()
             except:
-                page.locator('td[role="cell"]').first.click()
+                try:
+                    page.get_by_text("REPAIR").first.click()
+                except:
+                    page.locator('td[role="cell"]').first.click()
+
+        steps.run("form_setup", open_form, verify=lambda: form_category_set(page, ikk_category),
+                  recover=lambda: close_open_modal(page))
 
         # 🔄 ENHANCED SHIFT DETECTION & SETTING - From ori.py 🔄
         print(f"🔄 ENHANCED SHIFT SETTING: {selected_shift}")
         
-        # Check if shift field exists in IKK form and set it
-        shift_set_success = page.evaluate(f"""
-            (function() {{
-                try {{
-                    // Look for possible shift field IDs in IKK form
-                    const possibleShiftIds = [
-                        'ahmgawpm003_shift',
-                        'ahmgawpm003_shift_request_kontraktor', 
-                        'ahmgawpm003_shift_kerja',
-                        'ahmgawpm003_shift_kerja_request_kontraktor',
-                        'ahmgawpm003_waktu_shift',
-                        'ahmgawpm003_jam_shift',
-                        'ahmgawpm003_shift_pekerjaan',
-                        'ahmgawpm003_jadwal_shift',
-                        'ahmgawpm003_waktu_pelaksanaan_shift'
-                    ];
-                    
-                    let shiftFieldFound = false;
-                    let fieldsSet = 0;
-                    let debugInfo = [];
-                    
-                    // First, scan ALL form fields to find shift-related ones
-                    const allInputs = document.querySelectorAll('input, select, textarea');
-                    const shiftRelatedFields = Array.from(allInputs).filter(field => {{
-                        const id = field.id || '';
-                        const name = field.name || '';
-                        const label = field.getAttribute('aria-label') || '';
-                        const placeholder = field.getAttribute('placeholder') || '';
-                        
-                        return id.toLowerCase().includes('shift') || 
-                               name.toLowerCase().includes('shift') ||
-                               label.toLowerCase().includes('shift') ||
-                               placeholder.toLowerCase().includes('shift');
-                    }});
-                    
-                    debugInfo.push(`Found ${{shiftRelatedFields.length}} shift-related fields`);
-                    shiftRelatedFields.forEach(field => {{
-                        debugInfo.push(`Field: id=${{field.id}}, name=${{field.name}}, type=${{field.type}}, tagName=${{field.tagName}}`);
-                    }});
-                    
-                    // Try exact IDs first
-                    for (let id of possibleShiftIds) {{
-                        const field = document.getElementById(id);
-                        if (field && field.offsetParent !== null) {{
-                            debugInfo.push(`Found exact shift field: ${{id}}`);
-                            
-                            if (field.tagName === 'SELECT') {{
-                                // For dropdown, try to set the value
-                                const originalValue = field.value;
-                                field.value = '{selected_shift}';
-                                field.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                field.dispatchEvent(new Event('blur', {{ bubbles: true }}));
-                                debugInfo.push(`Shift dropdown ${{id}}: ${{originalValue}} -> ${{field.value}}`);
-                            }} else if (field.tagName === 'INPUT') {{
-                                // For input field
-                                const originalValue = field.value;
-                                field.value = '{selected_shift}';
-                                field.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                                field.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                field.dispatchEvent(new Event('blur', {{ bubbles: true }}));
-                                debugInfo.push(`Shift input ${{id}}: ${{originalValue}} -> ${{field.value}}`);
-                            }}
-                            
-                            shiftFieldFound = true;
-                            fieldsSet++;
-                        }}
-                    }}
-                    
-                    // If no exact match, try the discovered shift-related fields
-                    if (!shiftFieldFound && shiftRelatedFields.length > 0) {{
-                        shiftRelatedFields.forEach(field => {{
-                            if (field.tagName === 'SELECT') {{
-                                // Try to find shift options
-                                const options = Array.from(field.options);
-                                const shiftOption = options.find(opt => 
-                                    opt.value === '{selected_shift}' || 
-                                    opt.value === 'shift{selected_shift}' ||
-                                    opt.text.toLowerCase().includes('shift') && opt.text.includes('{selected_shift}')
-                                );
-                                
-                                if (shiftOption) {{
-                                    const originalValue = field.value;
-                                    field.value = shiftOption.value;
-                                    field.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                    debugInfo.push(`Found and set shift option: ${{originalValue}} -> ${{field.value}}`);
-                                    shiftFieldFound = true;
-                                    fieldsSet++;
-                                }} else {{
-                                    // Try setting directly
-                                    const originalValue = field.value;
-                                    field.value = '{selected_shift}';
-                                    field.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                    debugInfo.push(`Direct set shift dropdown: ${{originalValue}} -> ${{field.value}}`);
-                                    shiftFieldFound = true;
-                                    fieldsSet++;
-                                }}
-                            }} else if (field.tagName === 'INPUT') {{
-                                const originalValue = field.value;
-                                field.value = '{selected_shift}';
-                                field.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                                field.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                debugInfo.push(`Set shift input field: ${{originalValue}} -> ${{field.value}}`);
-                                shiftFieldFound = true;
-                                fieldsSet++;
-                            }}
-                        }});
-                    }}
-                    
-                    // Also look for radio buttons with shift values
-                    const shiftRadios = document.querySelectorAll(`
-                        input[type="radio"][name*="shift"], 
-                        input[type="radio"][value="{selected_shift}"], 
-                        input[type="radio"][value="shift{selected_shift}"]
-                    `);
-                    
-                    shiftRadios.forEach(function(radio) {{
-                        if (radio.value === '{selected_shift}' || 
-                            radio.value === 'shift{selected_shift}' ||
-                            radio.value.includes('{selected_shift}')) {{
-                            radio.checked = true;
-                            radio.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                            debugInfo.push(`Shift radio selected: ${{radio.value}}`);
-                            shiftFieldFound = true;
-                            fieldsSet++;
-                        }}
-                    }});
-                    
-                    // Special handling for common shift patterns
-                    if (!shiftFieldFound) {{
-                        // Look for dropdown with options 1, 2, 3
-                        const dropdowns = document.querySelectorAll('select');
-                        dropdowns.forEach(dropdown => {{
-                            const hasShiftOptions = Array.from(dropdown.options).some(opt => 
-                                opt.value === '1' || opt.value === '2' || opt.value === '3'
-                            );
-                            
-                            if (hasShiftOptions && dropdown.options.length <= 5) {{ // Likely a shift dropdown
-                                const originalValue = dropdown.value;
-                                dropdown.value = '{selected_shift}';
-                                dropdown.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                                debugInfo.push(`Detected shift dropdown by pattern: ${{originalValue}} -> ${{dropdown.value}}`);
-                                shiftFieldFound = true;
-                                fieldsSet++;
-                            }}
-                        }});
-                    }}
-                    
-                    return {{
-                        found: shiftFieldFound,
-                        fieldsSet: fieldsSet,
-                        debugInfo: debugInfo,
-                        message: shiftFieldFound ? `Shift {selected_shift} set successfully` : 'No shift field found in form'
-                    }};
-                    
-                }} catch(e) {{
-                    return {{
-                        found: false,
-                        fieldsSet: 0,
-                        debugInfo: [`Error: ${{e.message}}`],
-                        message: 'Error setting shift: ' + e.message
-                    }};
-                }}
-            }})()
-        """)
-        
-        print(f"Shift debug info:")
-        for info in shift_set_success.get('debugInfo', []):
-            print(f"    {info}")
-            
-        if shift_set_success.get('found'):
+        # Field IDs come from the form schema (rediscovered only when the form changes)
+        fields = form_fields(page, 'ikk', FORM_ID_PREFIX, IKK_FORM_RULES)
+
+        def set_shift():
+            return call_helper(page, 'setShift', fields['shift'], selected_shift)
+
+        if fields['shift']:
+            shift_set_success = steps.run("set_shift", set_shift,
+                                          verify=lambda: shift_set(page, fields['shift'], selected_shift),
+                                          required=False)
+        else:
+            shift_set_success = None
+            print(f"  ℹ️  SHIFT INFO: Form schema has no shift field")
+
+        if shift_set_success is not None:
+            print(f"Shift debug info:")
+            for info in shift_set_success.get('debugInfo', []):
+                print(f"    {info}")
             print(f"  ✅ SHIFT SET: {shift_set_success['message']} ({shift_set_success['fieldsSet']} fields)")
+        elif fields['shift']:
+            print(f"  ⚠️ Shift {selected_shift} not confirmed in the form, continuing (checked again before Submit)")
         else:
-            print(f"  ℹ️  SHIFT INFO: {shift_set_success['message']}")
             print(f"  📝 Note: Shift {selected_shift} will be noted in automation log but form may not have shift field")
 
         # ⚡ INSTANT DESCRIPTION FILLING ⚡
         print(f"📝 INSTANT DESCRIPTION: {deskripsi}")
         
         # Instant description with JavaScript
-        desc_success = page.evaluate(f"""
-            (function() {{
-                try {{
-                    // Try multiple description field selectors
-                    var descField = document.querySelector('textarea[aria-label*="Deskripsi"]') ||
-                                   document.getElementById('ahmgawpm003_deskripsi_pekerjaan_khusus_request_kontraktor') ||
-                                   document.querySelector('textarea');
-                    
-                    if (descField) {{
-                        descField.value = '{deskripsi}';
-                        descField.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                        descField.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                        console.log('Description filled instantly');
-                        return true;
-                    }}
-                    return false;
-                }} catch(e) {{
-                    console.log('Description fill error:', e);
-                    return false;
-                }}
-            }})()
-        """)
+        desc_success = call_helper(page, 'setField', [f"#{fields['description']}"] if fields['description'] else
+                                   ['textarea[aria-label*="Deskripsi"]', 'textarea'], deskripsi)['found']
         
         if not desc_success:
             # Fallback description filling
@@ -952,9 +860,12 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         print(f"⚡ Formatted work date: {date_str}")
         
         print(f"👨‍💻 Setting WORK DATE with human mimic calendar navigation...")
-        work_date_success = set_date_field(page, date_str)
+        work_date_id = fields['work_date'] or WORK_DATE_INPUT_ID
+        # Checked here so a retry can fix it, and again with the whole form before Submit
+        work_date_success = steps.run("set_work_date", lambda: set_date_field(page, date_str, work_date_id),
+                                      verify=lambda: work_date_set(page, date_str, work_date_id), required=False)
         
-        if work_date_success:
+        if work_date_success is not None:
             print(f"✅ Work date set successfully with human mimic: {date_str}")
         else:
             print(f"⚠️ Work date setting failed, but continuing...")
@@ -962,33 +873,7 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         # 🛡️ ENHANCED SAFETY INDUCTION - From ori.py
         print("🛡️ ENHANCED SAFETY INDUCTION...")
         
-        safety_induction_result = page.evaluate(f"""
-            (function() {{
-                try {{
-                    const safetyField = document.getElementById('ahmgawpm003_status_safety_induction_edit');
-                    if (safetyField) {{
-                        const targetOption = Array.from(safetyField.options).find(opt => 
-                            opt.value === 'Sudah' || opt.text.includes('Sudah') || 
-                            opt.value === 'Aktif' || opt.text.includes('Aktif')
-                        );
-                        if (targetOption) {{
-                            safetyField.value = targetOption.value;
-                            safetyField.dispatchEvent(new Event('change', {{bubbles: true}}));
-                        }}
-                    }}
-                    
-                    const safetyDateField = document.getElementById('ahmgawpm003_tanggal_safety_induction_edit');
-                    if (safetyDateField) {{
-                        safetyDateField.value = '{date_str}';
-                        safetyDateField.dispatchEvent(new Event('input', {{bubbles: true}}));
-                    }}
-                    
-                    return true;
-                }} catch(e) {{
-                    return false;
-                }}
-            }})()
-        """)
+        safety_induction_result = all(result['ok'] for result in fill_form(page, IKK_SAFETY_SPEC, {'date': date_str}).values())
         
         if safety_induction_result:
             print("✅ Safety induction set successfully")
@@ -998,42 +883,34 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         # ⚡ ULTRA-FAST PERSONNEL PROCESSING
         print(f"⚡ ULTRA-FAST PERSONNEL: {len(personnel_data)} people")
         
-        # Load certificate data
-        csv_map = {
-            "IA": "personnel_list_IA.csv",
-            "IR": "personnel_list_IR.csv", 
-            "IK": "personnel_list_IK.csv"
-        }
-        csv_file_path = csv_map.get(ikk_category, csv_map["IA"])
-        
-        cert_lookup = {}
-        try:
-            with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    nik = str(row.get('Nomor', '')).strip()
-                    cert = str(row.get('Sertif', '')).strip()
-                    exp_cert = str(row.get('Expsertif', '')).strip()
-                    
-                    if (cert and exp_cert and cert not in ['', 'n/a', 'none', '-', 'null', 'None'] 
-                        and exp_cert not in ['', 'n/a', 'none', '-', 'null', 'None']):
-                        cert_lookup[nik] = {'cert': cert, 'exp_cert': exp_cert}
-        except Exception:
-            cert_lookup = {}
+        # Certificate data comes with the personnel records (snapshotted at submit)
+        cert_lookup = {person['nik']: {'cert': person['cert'], 'exp_cert': person['cert_expiry'],
+                                       'exp_text': person['cert_expiry_text']}
+                       for person in personnel_data if person['cert']}
 
         success_count = 0
+        person_fields = {}  # Add Personnel modal fields, discovered when the modal first opens
         
-        for i, (name, nik) in enumerate(personnel_data, 1):
+        for i, person in enumerate(personnel_data, 1):
+            name, nik = person['name'], person['nik']
             print(f"⚡ Person {i}: {name}")
-            
-            try:
+
+            attempted = []
+
+            def add_person():
+                # A retry must not add the person twice: the earlier attempt may have saved the row
+                if attempted and personnel_listed(page, nik):
+                    print(f"    ✅ {name} already in the personnel table, not adding again")
+                    return
+                attempted.append(True)
+                nik_id = person_fields.get('nik') or 'ahmgawpm003_nik_paspor_pekerja_add'
                 # 🔧 FIXED: Handle first person modal access properly
                 if i == 1:
                     # For first person, try to access existing modal or trigger it
                     print(f"    📝 Person 1: Accessing personnel modal...")
                     try:
                         # Check if modal is already visible
-                        page.wait_for_selector("#ahmgawpm003_nik_paspor_pekerja_add", state="visible", timeout=2000)
+                        page.wait_for_selector(f"#{nik_id}", state="visible", timeout=2000)
                         print(f"    ✅ Personnel modal already visible for person 1")
                     except:
                         # Modal not visible, try to trigger it
@@ -1064,241 +941,74 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
                 
                 # Wait for modal to be ready
                 try:
-                    page.wait_for_selector("#ahmgawpm003_nik_paspor_pekerja_add", state="visible", timeout=3000)
+                    page.wait_for_selector(f"#{nik_id}", state="visible", timeout=3000)
                     print(f"    ✅ Personnel modal ready for person {i}")
                 except Exception as modal_wait_error:
                     print(f"    ⚠️ Modal wait failed for person {i}: {modal_wait_error}")
                     # Continue anyway, might still work
+
+                if not person_fields:
+                    person_fields.update(form_fields(page, 'ikk.personnel', FORM_ID_PREFIX, IKK_PERSONNEL_RULES))
+                nik_id = person_fields['nik'] or nik_id
+                cert_number_id = person_fields['cert_number'] or 'ahmgawpm003_nomor_sertifikasi_add'
+                expiry_id = person_fields['expiry'] or 'ahmgawpm003_tanggal_akhir_berlaku_izin_add'
                 
                 has_cert = nik in cert_lookup
                 
                 # Fill basic fields instantly
+                fill_form(page, IKK_PERSONNEL_SPEC, dict(company, name=name, nik=nik, cert_required='Y' if has_cert else 'N'),
+                          targets={'nik': nik_id})
+                
                 if has_cert:
                     cert_data = cert_lookup[nik]
-                    cert_escaped = cert_data['cert'].replace("'", "\\'")
-                    
-                    fill_result = page.evaluate(f"""
-                        (function() {{
-                            try {{
-                                const fields = [
-                                    {{id: 'ahmgawpm003_nik_paspor_pekerja_add', value: '{nik}'}},
-                                    {{id: 'ahmgawpm003_nama_pekerja_add', value: '{name}'}},
-                                    {{id: 'ahmgawpm003_nomor_hp_pekerja_add', value: '082129002163'}},
-                                    {{id: 'ahmgawpm003_email_pekerja_add', value: 'Hirochiku-indonesia@co.id'}},
-                                    {{id: 'ahmgawpm003_seksi_add', value: 'HAI member'}},
-                                    {{id: 'ahmgawpm003_departemen_add', value: 'HAI member'}},
-                                    {{id: 'ahmgawpm003_divisi_add', value: 'HAI member'}}
-                                ];
-                                
-                                fields.forEach(field => {{
-                                    const element = document.getElementById(field.id);
-                                    if (element) {{
-                                        element.value = field.value;
-                                        element.dispatchEvent(new Event('input', {{bubbles: true}}));
-                                        element.dispatchEvent(new Event('change', {{bubbles: true}}));
-                                    }}
-                                }});
-                                
-                                // Set certification to Y
-                                const certField = document.getElementById('ahmgawpm003_kebutuhan_sertifikasi_add');
-                                if (certField) {{
-                                    certField.value = 'Y';
-                                    certField.dispatchEvent(new Event('change', {{bubbles: true}}));
-                                }}
-                                
-                                return {{success: true}};
-                            }} catch(e) {{
-                                return {{success: false, error: e.message}};
-                            }}
-                        }})()
-                    """)
-                    
                     page.wait_for_timeout(400)
                     
                     # Fill certificate fields
                     try:
-                        cert_num_field = page.locator("#ahmgawpm003_nomor_sertifikasi_add")
-                        cert_num_field.fill(cert_data['cert'])
-                        
-                        # 📅 ENHANCED: Parse Indonesian date format from CSV
-                        actual_expiry_date = cert_data['exp_cert']  # Use actual date from CSV
-                        print(f"📅 ACTUAL EXPIRY DATE from CSV: {actual_expiry_date}")
-                        
-                        # Convert Indonesian date format to DD/MM/YYYY
-                        def parse_indonesian_date(date_str):
-                            """Convert Indonesian date format to DD/MM/YYYY"""
-                            try:
-                                # Handle format like "5 Agustus 2027"
-                                if any(month in date_str.lower() for month in ['januari', 'februari', 'maret', 'april', 'mei', 'juni', 'juli', 'agustus', 'september', 'oktober', 'november', 'desember']):
-                                    # Indonesian month names mapping
-                                    month_mapping = {
-                                        'januari': '01', 'februari': '02', 'maret': '03', 'april': '04',
-                                        'mei': '05', 'juni': '06', 'juli': '07', 'agustus': '08',
-                                        'september': '09', 'oktober': '10', 'november': '11', 'desember': '12'
-                                    }
-                                    
-                                    parts = date_str.strip().split()
-                                    if len(parts) >= 3:
-                                        day = parts[0].strip()
-                                        month_name = parts[1].strip().lower()
-                                        year = parts[2].strip()
-                                        
-                                        if month_name in month_mapping:
-                                            month_num = month_mapping[month_name]
-                                            # Format as DD/MM/YYYY
-                                            formatted_date = f"{day.zfill(2)}/{month_num}/{year}"
-                                            print(f"🔄 Converted Indonesian date: '{date_str}' -> '{formatted_date}'")
-                                            return formatted_date
-                                
-                                # Handle DD/MM/YYYY format (already correct)
-                                elif '/' in date_str and len(date_str.split('/')) == 3:
-                                    return date_str
-                                
-                                # Handle YYYY-MM-DD format
-                                elif '-' in date_str and len(date_str.split('-')) == 3:
-                                    date_parts = date_str.split('-')
-                                    return f"{date_parts[2]}/{date_parts[1]}/{date_parts[0]}"
-                                
-                                # Fallback: return original
-                                else:
-                                    print(f"⚠️ Unknown date format: {date_str}, using fallback")
-                                    return "31/07/2027"  # Safe fallback
-                                    
-                            except Exception as e:
-                                print(f"⚠️ Date parsing error: {e}, using fallback")
-                                return "31/07/2027"  # Safe fallback
-                        
-                        expiry_date_value = parse_indonesian_date(actual_expiry_date)
-                        
-                        # Validate the parsed date format
-                        def validate_date_format(date_str):
-                            """Validate DD/MM/YYYY format"""
-                            try:
-                                parts = date_str.split('/')
-                                if len(parts) != 3:
-                                    return False
-                                
-                                day, month, year = parts
-                                day_int = int(day)
-                                month_int = int(month)
-                                year_int = int(year)
-                                
-                                # Basic validation
-                                if not (1 <= day_int <= 31):
-                                    return False
-                                if not (1 <= month_int <= 12):
-                                    return False
-                                if not (2020 <= year_int <= 2030):  # Reasonable year range
-                                    return False
-                                
-                                return True
-                            except:
-                                return False
-                        
-                        # Validate and fix if needed
-                        if not validate_date_format(expiry_date_value):
-                            print(f"⚠️ Invalid date format detected: {expiry_date_value}")
-                            expiry_date_value = "31/07/2027"  # Safe fallback
-                            print(f"🔧 Using safe fallback date: {expiry_date_value}")
+                        fill_form(page, IKK_CERT_SPEC, cert_data, targets={'cert_number': cert_number_id})
                         
-                        print(f"👨‍💻 Setting VALIDATED CERTIFICATE EXPIRY DATE: {expiry_date_value}")
-                        print(f"🎯 Target year: {expiry_date_value.split('/')[-1]} (validated DD/MM/YYYY format)")
+                        # Expiry parsed and validated (DD/MM/YYYY) when the roster was loaded
+                        expiry_date_value = cert_data['exp_cert']
+                        print(f"👨‍💻 Setting CERTIFICATE EXPIRY DATE: {expiry_date_value} (roster: {cert_data['exp_text']})")
                         
                         # Use HUMAN MIMIC calendar navigation with actual date
-                        expiry_success = set_expiry_date_field(page, expiry_date_value)
+                        expiry_success = set_expiry_date_field(page, expiry_date_value, expiry_id)
                         
                         if expiry_success:
                             print(f"✅ Certificate expiry date set successfully with human mimic: {expiry_date_value}")
                         else:
                             print(f"⚠️ Human mimic expiry date failed, trying emergency fallback with actual date...")
                             # Emergency fallback expiry date setting with ACTUAL date
-                            fallback_result = page.evaluate(f"""
-                                (function() {{
-                                    try {{
-                                        const expiryField = document.getElementById('ahmgawpm003_tanggal_akhir_berlaku_izin_add');
-                                        if (expiryField) {{
-                                            expiryField.value = '{expiry_date_value}';
-                                            expiryField.setAttribute('value', '{expiry_date_value}');
-                                            expiryField.dispatchEvent(new Event('input', {{bubbles: true}}));
-                                            expiryField.dispatchEvent(new Event('change', {{bubbles: true}}));
-                                            return {{success: true, value: expiryField.value, actualDate: '{expiry_date_value}'}};
-                                        }}
-                                        return {{success: false, reason: 'field_not_found'}};
-                                    }} catch(e) {{
-                                        return {{success: false, error: e.message}};
-                                    }}
-                                }})()
-                            """)
+                            fallback_result = call_helper(page, 'setField', expiry_id, expiry_date_value,
+                                                          ['input', 'change'], {'attribute': True})
                             print(f"🚨 Emergency fallback with ACTUAL date result: {fallback_result}")
                         
                     except Exception as cert_error:
                         print(f"⚠️ Certificate error: {cert_error}")
-                    
-                else:
-                    # No certificate
-                    fill_result = page.evaluate(f"""
-                        (function() {{
-                            try {{
-                                const fields = [
-                                    {{id: 'ahmgawpm003_nik_paspor_pekerja_add', value: '{nik}'}},
-                                    {{id: 'ahmgawpm003_nama_pekerja_add', value: '{name}'}},
-                                    {{id: 'ahmgawpm003_nomor_hp_pekerja_add', value: '082129002163'}},
-                                    {{id: 'ahmgawpm003_email_pekerja_add', value: 'Hirochiku-indonesia@co.id'}},
-                                    {{id: 'ahmgawpm003_seksi_add', value: 'HAI member'}},
-                                    {{id: 'ahmgawpm003_departemen_add', value: 'HAI member'}},
-                                    {{id: 'ahmgawpm003_divisi_add', value: 'HAI member'}}
-                                ];
-                                
-                                fields.forEach(field => {{
-                                    const element = document.getElementById(field.id);
-                                    if (element) {{
-                                        element.value = field.value;
-                                        element.dispatchEvent(new Event('input', {{bubbles: true}}));
-                                        element.dispatchEvent(new Event('change', {{bubbles: true}}));
-                                    }}
-                                }});
-                                
-                                // Set certification to N
-                                const certField = document.getElementById('ahmgawpm003_kebutuhan_sertifikasi_add');
-                                if (certField) {{
-                                    certField.value = 'N';
-                                    certField.dispatchEvent(new Event('change', {{bubbles: true}}));
-                                }}
-                                
-                                return {{success: true}};
-                            }} catch(e) {{
-                                return {{success: false, error: e.message}};
-                            }}
-                        }})()
-                    """)
                 
                 page.wait_for_timeout(300)
                 
                 # Submit person
+                submit_btn = page.locator("#ahmgawpm003_submit_button_add_modal")
+                submit_btn.click()
+                page.wait_for_timeout(600)
+
+                # Handle notification modal
                 try:
-                    submit_btn = page.locator("#ahmgawpm003_submit_button_add_modal")
-                    submit_btn.click()
-                    page.wait_for_timeout(600)
-                    
-                    # Handle notification modal
-                    try:
-                        notification_modal = page.locator("#ahmgawpm003_notification_modal")
-                        if notification_modal.is_visible():
-                            ok_btn = notification_modal.locator("button")
-                            ok_btn.click()
-                            page.wait_for_selector("#ahmgawpm003_notification_modal", state="hidden", timeout=2000)
-                    except:
-                        pass
-                    
-                    success_count += 1
-                    print(f"✅ Person {i} SUCCESS: {name}")
-                    
-                except Exception as submit_error:
-                    print(f"❌ Person {i} SUBMIT FAILED: {submit_error}")
-                
-            except Exception as e:
-                print(f"❌ Person {i} FAILED: {name} - {e}")
-                continue
+                    notification_modal = page.locator("#ahmgawpm003_notification_modal")
+                    if notification_modal.is_visible():
+                        ok_btn = notification_modal.locator("button")
+                        ok_btn.click()
+                        page.wait_for_selector("#ahmgawpm003_notification_modal", state="hidden", timeout=2000)
+                except:
+                    pass
+
+            steps.run("add_personnel", add_person,
+                      verify=lambda: modal_hidden(page, "#ahmgawpm003_submit_button_add_modal"),
+                      recover=lambda: close_open_modal(page),
+                      detail=f"{i}/{len(personnel_data)}")
+            success_count += 1
+            print(f"✅ Person {i} SUCCESS: {name}")
 
         print(f"⚡ PERSONNEL COMPLETE: {success_count}/{len(personnel_data)}")
 
@@ -1307,7 +1017,7 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         page.wait_for_timeout(50)
         
         # Area
-        try:
+        def add_area():
             page.get_by_role("button", name="+ Add Area").click()
             page.wait_for_timeout(30)
             page.locator("#ahmgawpm003_add_area_modal .btn-lookup").click()
@@ -1316,124 +1026,74 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
             page.locator("#ahmgawpm003_submit_button_add_area_modal").click()
             page.wait_for_timeout(30)
             print("  ✅ AREA")
-        except:
-            print("  ⚠️ AREA SKIP")
+
+        steps.run("add_area", add_area, verify=lambda: modal_hidden(page, "#ahmgawpm003_submit_button_add_area_modal"),
+                  recover=lambda: close_open_modal(page), required=False)
 
         # Tools - FIXED: Field kedua juga harus "1"
-        try:
+        def add_tool():
             page.get_by_role("button", name="+ Add Tool").click()
             page.wait_for_timeout(30)
             
             # ENHANCED: Fill semua field yang diperlukan dengan benar
-            tool_fill_success = page.evaluate("""
-                (function() {
-                    try {
-                        // Field pertama: Tool ID = "1"
-                        const toolIdField = document.getElementById('ahmgawpm003_tool_id_add');
-                        if (toolIdField) {
-                            toolIdField.value = '1';
-                            toolIdField.dispatchEvent(new Event('input', {bubbles: true}));
-                            toolIdField.dispatchEvent(new Event('change', {bubbles: true}));
-                            console.log('Tool ID set: 1');
-                        }
-                        
-                        // Field kedua: Juga harus "1" (sesuai feedback user)
-                        const toolSecondField = document.getElementById('ahmgawpm003_jumlah_add') ||
-                                               document.querySelector('input[name*="jumlah"]') ||
-                                               document.querySelector('#ahmgawpm003_add_tool_modal input[type="number"]') ||
-                                               document.querySelector('#ahmgawpm003_add_tool_modal input:nth-of-type(2)');
-                        
-                        if (toolSecondField) {
-                            toolSecondField.value = '1';
-                            toolSecondField.dispatchEvent(new Event('input', {bubbles: true}));
-                            toolSecondField.dispatchEvent(new Event('change', {bubbles: true}));
-                            console.log('Tool second field set: 1');
-                        }
-                        
-                        // Description field
-                        const toolDescField = document.getElementById('ahmgawpm003_deskripsi_alat_add');
-                        if (toolDescField) {
-                            toolDescField.value = 'BASIC TOOLS';
-                            toolDescField.dispatchEvent(new Event('input', {bubbles: true}));
-                            toolDescField.dispatchEvent(new Event('change', {bubbles: true}));
-                            console.log('Tool description set: BASIC TOOLS');
-                        }
-                        
-                        // Permit flag
-                        const permitField = document.getElementById('ahmgawpm003_permit_flag_add');
-                        if (permitField) {
-                            permitField.value = 'Tidak';
-                            permitField.dispatchEvent(new Event('change', {bubbles: true}));
-                            console.log('Permit flag set: Tidak');
-                        }
-                        
-                        // Cari dan isi semua field yang mungkin diperlukan
-                        const allToolInputs = document.querySelectorAll('#ahmgawpm003_add_tool_modal input[type="text"], #ahmgawpm003_add_tool_modal input[type="number"]');
-                        let fieldsProcessed = 0;
-                        
-                        allToolInputs.forEach((input, index) => {
-                            if (!input.value && input.type !== 'hidden') {
-                                if (input.type === 'number' || input.name?.includes('jumlah') || input.placeholder?.includes('jumlah')) {
-                                    input.value = '1';
-                                    input.dispatchEvent(new Event('input', {bubbles: true}));
-                                    input.dispatchEvent(new Event('change', {bubbles: true}));
-                                    console.log('Tool numeric field ' + index + ' set: 1');
-                                    fieldsProcessed++;
-                                } else if (input.type === 'text' && !input.value) {
-                                    input.value = 'BASIC TOOLS';
-                                    input.dispatchEvent(new Event('input', {bubbles: true}));
-                                    input.dispatchEvent(new Event('change', {bubbles: true}));
-                                    console.log('Tool text field ' + index + ' set: BASIC TOOLS');
-                                    fieldsProcessed++;
-                                }
-                            }
-                        });
-                        
-                        console.log('Total tool fields processed: ' + fieldsProcessed);
-                        return {success: true, fieldsProcessed: fieldsProcessed};
-                        
-                    } catch(e) {
-                        console.log('Tool fill error:', e);
-                        return {success: false, error: e.message};
-                    }
-                })()
-            """)
-            
-            print(f"    🔧 Tool fields filled: {tool_fill_success}")
+            fill_form(page, IKK_TOOL_SPEC)
             
             page.wait_for_timeout(50)  # Wait for all fields to process
             
             # FORCE ENABLE submit button
-            page.evaluate("""
-                const submitBtn = document.getElementById('ahmgawpm003_submit_button_add_tool_modal');
-                if (submitBtn) {
-                    submitBtn.removeAttribute('disabled');
-                    submitBtn.disabled = false;
-                    submitBtn.style.pointerEvents = 'auto';
-                    submitBtn.style.opacity = '1';
-                    submitBtn.classList.remove('disabled');
-                }
-            """)
+            call_helper(page, 'enable', 'ahmgawpm003_submit_button_add_tool_modal', True)
             
             page.locator("#ahmgawpm003_submit_button_add_tool_modal").click()
             page.wait_for_timeout(30)
             print("  ✅ TOOLS (Field 1='1', Field 2='1')")
-        except Exception as tool_error:
-            print(f"  ⚠️ TOOLS ERROR: {tool_error}")
+
+        steps.run("add_tool", add_tool, verify=lambda: modal_hidden(page, "#ahmgawpm003_submit_button_add_tool_modal"),
+                  recover=lambda: close_open_modal(page), required=False)
 
         # ⚡ ULTRA-FAST FINAL SUBMIT
         print("⚡ INSTANT FINAL SUBMIT...")
-        
-        page.evaluate("""
-            const checkbox = document.getElementById('ahmgawpm003_checkbox_persetujuan');
-            if (checkbox) {
-                checkbox.checked = true;
-                checkbox.dispatchEvent(new Event('change', {bubbles: true}));
-            }
-        """)
-        
-        page.get_by_role("button", name=" Submit").click()
-        
+
+        def accept_terms():
+            call_helper(page, 'check', 'ahmgawpm003_checkbox_persetujuan')
+
+        steps.run("accept_terms", accept_terms, verify=lambda: page.locator("#ahmgawpm003_checkbox_persetujuan").is_checked())
+
+        # One snapshot of the whole form against the job; header fields and agreement are repaired once
+        expected = {
+            'fields': {
+                'ahmgawpm003_kategori_ikk_request_kontraktor': {'value': ikk_category, 'owner': 'form_setup'},
+                work_date_id: {'date': date_str, 'owner': 'set_work_date'},
+                'ahmgawpm003_checkbox_persetujuan': {'checked': True, 'owner': 'accept_terms'}
+            },
+            'rows': [{'cells': [person['nik']], 'owner': 'add_personnel', 'key': person['nik']}
+                     for person in personnel_data]
+                    + [{'cells': ['G'], 'owner': 'add_area'}, {'cells': ['BASIC TOOLS'], 'owner': 'add_tool'}]
+        }
+        if fields['shift']:
+            expected['fields'][fields['shift']] = {'option': shift_options(selected_shift), 'owner': 'set_shift'}
+        if fields['description']:
+            expected['fields'][fields['description']] = {'value': deskripsi, 'owner': 'description'}
+        repairs = {
+            'set_work_date': lambda mismatches: set_date_field(page, date_str, work_date_id),
+            'set_shift': lambda mismatches: set_shift(),
+            'description': lambda mismatches: call_helper(page, 'setField', fields['description'], deskripsi),
+            'accept_terms': lambda mismatches: accept_terms()
+        }
+        # A dry run reports mismatches in form_check.json instead of failing before its artifacts
+        form_state, _ = steps.run("verify_form", lambda: verify_form(page, FORM_ID_PREFIX, expected, repairs,
+                                                                     mode='warn' if dry_run else None))
+
+        def submit():
+            with portal_call("submit"):
+                page.get_by_role("button", name=" Submit").click()
+
+        if dry_run:
+            finish_dry_run(page, FORM_ID_PREFIX, form_state)
+            browser.close()
+            return
+
+        steps.run("submit", submit)
+
         # 🔔 ENHANCED SUCCESS CHECK - Wait for notification properly
         print("🔔 WAITING FOR SUCCESS NOTIFICATION...")
         success_found = False
@@ -1539,12 +1199,18 @@ def run(playwright: Playwright, personnel_data, ikk_category="IA", work_date="30
         # FASTPATH: Hapus random wait di akhir proses, close browser segera setelah proses selesai.
         browser.close()
 
+    except JobCancelled:
+        # Only this job's context is closed; nothing is killed
+        print("🛑 IKK automation cancelled - closing job context")
+        context.close()
+        raise
     except Exception as e:
         print(f"❌ ERROR: {e}")
         try:
-            page.screenshot(path='ikk_merged_error.png')
+            page.screenshot(path=artifact_path('ikk_merged_error.png'))
         except:
             pass
+        raise
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -1554,23 +1220,32 @@ if __name__ == "__main__":
     selected_shift = int(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4].isdigit() else 1
     # Parse selected_indices (mulai dari arg ke-5)
     selected_indices = [int(x) for x in sys.argv[5:] if x.isdigit()]
+    # Tenant roster passed by the job runner
+    csv_arg = next((x[len('--csv='):] for x in sys.argv[5:] if x.startswith('--csv=')), None)
+    # Personnel records snapshotted by the app (the CSV is only read when run by hand)
+    roster_path = roster_arg(sys.argv[5:])
+    # Fill the form but stop before Submit
+    dry_run = DRY_RUN_FLAG in sys.argv[5:]
     
     if selected_shift not in [1, 2, 3]:
         print(f"⚠️ Invalid shift {selected_shift}, using shift 1")
         selected_shift = 1
     
-    # Map categories to CSV files
-    csv_map = {
-        "IA": "personnel_list_IA.csv",
-        "IR": "personnel_list_IR.csv",
-        "IK": "personnel_list_IK.csv"
-    }
-    csv_file_path = csv_map.get(ikk_category, csv_map["IA"])
-    personnel_data = read_csv(csv_file_path, selected_indices=selected_indices if selected_indices else None, selected_shift=selected_shift)
+    csv_file_path = csv_arg or CSV_MAP.get(ikk_category, CSV_MAP["IA"])
+    if roster_path:
+        personnel_data = read_roster(roster_path)
+    else:
+        personnel_data = snapshot_personnel(csv_file_path, selected_indices)
+    print(f"⚡ LOADED: {len(personnel_data)} personnel records")
     
     print(f"🚀 Starting MERGED IKK Automation - Category: {ikk_category}, Date: {work_date}, Shift: {selected_shift}")
     print(f"📄 CSV file: {csv_file_path}")
     print(f"👥 Personnel count: {len(personnel_data)}")
+    if dry_run:
+        print("🧪 Dry run: the form will not be submitted")
     
     with sync_playwright() as playwright:
-        run(playwright, personnel_data, ikk_category, work_date, deskripsi, selected_shift)
\ No newline at end of file
+        try:
+            run(playwright, personnel_data, ikk_category, work_date, deskripsi, selected_shift, dry_run)
+        except JobCancelled:
+            sys.exit(CANCELLED_EXIT_CODE)
\ No newline at end of file
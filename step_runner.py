@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Step Runner for the Portaliano Automation Scripts
+=================================================
+
+Runs each automation step (login, form setup, set date, set shift, add
+person N, add area, add tool, accept terms, verify form, submit) with its
+own retry policy instead of failing or silently skipping on the first error:
+
+- The step action runs, then its verification predicate checks that the
+  step actually took effect in the form.
+- On an exception or a failed verification the step is retried in place
+  after a short backoff (milliseconds, doubling per attempt), optionally
+  after a recovery action such as closing a half-filled modal.
+- When the attempts run out, a required step raises StepFailed naming the
+  step; an optional one logs a warning and the run continues.
+
+Every attempt restarts the step's watchdog budget (job_runtime.retry_step),
+so a retried step is not killed for the time the failed attempt used.
+"""
+
+import os
+import time
+
+from job_runtime import start_step, retry_step
+
+STEP_RETRY_ATTEMPTS = int(os.environ.get('STEP_RETRY_ATTEMPTS', 3))
+STEP_RETRY_BACKOFF_MS = int(os.environ.get('STEP_RETRY_BACKOFF_MS', 200))
+MAX_RETRY_BACKOFF_MS = 2000
+
+# Retry policy per step: attempts and first backoff in milliseconds (doubles per retry)
+RETRY_POLICIES = {
+    'login': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': 1000},
+    'form_setup': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': 500},
+    'set_date': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'set_work_date': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'set_shift': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'add_personnel': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'add_area': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'add_tool': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'accept_terms': {'attempts': STEP_RETRY_ATTEMPTS, 'backoff_ms': STEP_RETRY_BACKOFF_MS},
+    'verify_form': {'attempts': 1, 'backoff_ms': 0},  # Repairs and re-checks by itself
+    'submit': {'attempts': 1, 'backoff_ms': 0}  # Not idempotent: a retry could file the permit twice
+}
+DEFAULT_RETRY_POLICY = {'attempts': 1, 'backoff_ms': 0}
+
+
+class StepFailed(Exception):
+    """Raised when a required step still fails after all its attempts."""
+
+    def __init__(self, step, detail, attempts, error):
+        label = f"{step} {detail}" if detail else step
+        super().__init__(f"Step '{label}' failed after {attempts} attempt(s): {error}")
+        self.step = step
+        self.detail = detail
+        self.attempts = attempts
+        self.error = error
+
+
+class StepRunner:
+    """Runs automation steps with retries, backoff and verification."""
+
+    def __init__(self, on_failure=None):
+        """
+        Args:
+            on_failure (callable): Called with (step, detail) when a step runs out
+                of attempts, e.g. to save a screenshot
+        """
+        self.on_failure = on_failure
+        self.retries = 0
+
+    def run(self, step, action, verify=None, recover=None, detail=None, required=True):
+        """
+        Run one step under its retry policy.
+
+        Args:
+            step (str): Step kind (RETRY_POLICIES key, also used for the watchdog budget)
+            action (callable): Performs the step, returns its result
+            verify (callable): Returns True once the step has taken effect
+                (False or an exception otherwise)
+            recover (callable): Brings the page back to a retryable state before a retry
+            detail (str): Extra info for the log, e.g. "3/25" for personnel
+            required (bool): Raise StepFailed when out of attempts (else warn and go on)
+
+        Returns:
+            The action's result, or None if the step did not succeed
+
+        Raises:
+            StepFailed: If a required step fails every attempt
+            JobCancelled: If the job is cancelled between attempts
+        """
+        policy = RETRY_POLICIES.get(step, DEFAULT_RETRY_POLICY)
+        attempts = max(1, policy['attempts'])
+        backoff_ms = policy['backoff_ms']
+        label = f"{step} {detail}" if detail else step
+
+        start_step(step, detail)
+        error = None
+        for attempt in range(1, attempts + 1):
+            try:
+                result = action()
+                if verify is None or self._verified(verify):
+                    if attempt > 1:
+                        print(f"✅ {label} succeeded on attempt {attempt}/{attempts}")
+                    return result
+                error = "verification failed"
+            except Exception as e:
+                error = e
+
+            if attempt == attempts:
+                break
+            print(f"🔁 {label} attempt {attempt}/{attempts} failed: {error} - retrying in {backoff_ms}ms")
+            self.retries += 1
+            if recover:
+                try:
+                    recover()
+                except Exception as e:
+                    print(f"⚠️ Recovery before retrying {label} failed: {e}")
+            time.sleep(backoff_ms / 1000)
+            backoff_ms = min(max(backoff_ms * 2, 1), MAX_RETRY_BACKOFF_MS)
+            retry_step(f"{detail} retry {attempt + 1}" if detail else f"retry {attempt + 1}")
+
+        if self.on_failure:
+            try:
+                self.on_failure(step, detail)
+            except Exception:
+                pass
+        if required:
+            raise StepFailed(step, detail, attempts, error)
+        print(f"⚠️ {label} failed after {attempts} attempt(s): {error} - continuing")
+        return None
+
+    @staticmethod
+    def _verified(verify):
+        try:
+            return bool(verify())
+        except Exception:
+            return False
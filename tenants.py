@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tenant Profiles for Portaliano Automation
+=========================================
+
+One deployment serves several contractor companies. Each tenant profile in
+TENANTS_FILE (default tenants.json) holds what used to be hard-coded in the
+automation scripts:
+
+    {
+        "hirochiku": {
+            "display_name": "Hirochiku Indonesia",
+            "company": {"address": "...", "phone": "...", "email": "...", "unit": "HAI member"},
+            "accounts": ["KONTRAKTOR_P4_02"],
+            "rosters": {"ikh": "personnel_list_ALL.csv", "ikk-api": "personnel_list_IA.csv", ...}
+        }
+    }
+
+- company: data filled into every personnel entry of the tenant's permits
+- accounts: usernames from the credential pool the tenant's jobs may lease
+  (passwords stay in the accounts secrets file; empty means any account)
+- rosters: personnel CSV per category (ikh, ikk-api, ikk-ruang-terbatas,
+  ikk-ketinggian)
+
+Jobs carry their tenant name; the runner hands it to the scripts through
+PORTALIANO_TENANT and the job queue shares the slots fairly across tenants.
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+TENANTS_FILE = os.environ.get('TENANTS_FILE', 'tenants.json')
+DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+
+# Environment variable carrying the job's tenant to the automation script
+TENANT_ENV = 'PORTALIANO_TENANT'
+
+COMPANY_FIELDS = ('address', 'phone', 'email', 'unit')
+
+# Roster categories and the job modes using them
+ROSTER_CATEGORIES = {
+    'IKH': 'ikh',
+    'IKK-API': 'ikk-api',
+    'IKK-RUANG-TERBATAS': 'ikk-ruang-terbatas',
+    'IKK-KETINGGIAN': 'ikk-ketinggian'
+}
+
+_cache = {'mtime': None, 'tenants': {}}
+
+
+def load_tenants():
+    """
+    Load the tenant profiles (reloaded when TENANTS_FILE changes).
+
+    Returns:
+        dict: Tenant name -> profile
+
+    Raises:
+        ValueError: If the file is invalid or a tenant misses company data
+    """
+    try:
+        mtime = os.path.getmtime(TENANTS_FILE)
+    except OSError:
+        return {}
+    if mtime == _cache['mtime']:
+        return _cache['tenants']
+
+    try:
+        with open(TENANTS_FILE, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except ValueError as e:
+        raise ValueError(f"Invalid tenant profiles in {TENANTS_FILE}: {e}")
+
+    tenants = {}
+    for name, profile in raw.items():
+        company = profile.get('company') or {}
+        missing = [field for field in COMPANY_FIELDS if not company.get(field)]
+        if missing:
+            raise ValueError(f"Tenant '{name}' in {TENANTS_FILE} misses company {', '.join(missing)}")
+        tenants[name] = {
+            'name': name,
+            'display_name': profile.get('display_name', name),
+            'company': {field: company[field] for field in COMPANY_FIELDS},
+            'accounts': list(profile.get('accounts') or []),
+            'rosters': dict(profile.get('rosters') or {})
+        }
+    _cache['mtime'] = mtime
+    _cache['tenants'] = tenants
+    return tenants
+
+
+def get_tenant(name=None):
+    """
+    Get a tenant profile.
+
+    Args:
+        name (str): Tenant name, DEFAULT_TENANT if empty
+
+    Raises:
+        KeyError: If the tenant is not configured
+    """
+    name = name or DEFAULT_TENANT
+    tenants = load_tenants()
+    if name not in tenants:
+        raise KeyError(f"Unknown tenant '{name}' (configure it in {TENANTS_FILE})")
+    return tenants[name]
+
+
+def tenant_roster(name, category):
+    """
+    Get a tenant's personnel CSV for a roster category or job mode.
+
+    Returns:
+        str: CSV path, or None if the tenant has no roster for the category
+    """
+    category = ROSTER_CATEGORIES.get(category, category)
+    return get_tenant(name)['rosters'].get(category)
+
+
+def tenant_accounts(name):
+    """Usernames a tenant's jobs may lease (None: any account)."""
+    try:
+        return get_tenant(name)['accounts'] or None
+    except KeyError:
+        return None
+
+
+def tenant_company():
+    """
+    Get the company data of the running automation script's tenant.
+
+    Returns:
+        dict: address, phone, email and unit
+    """
+    return get_tenant(os.environ.get(TENANT_ENV))['company']
+
+
+def list_tenants():
+    """Tenant profiles for the UI and API."""
+    return [{'name': tenant['name'],
+             'display_name': tenant['display_name'],
+             'accounts': tenant['accounts'],
+             'rosters': tenant['rosters']}
+            for tenant in load_tenants().values()]
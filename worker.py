@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Portaliano Automation Worker
+============================
+
+Pulls jobs from a shared job queue backend and runs the automation scripts.
+The Flask app only submits jobs and reports their status when JOB_BACKEND
+points at a shared backend.
+
+Usage:
+    JOB_BACKEND=sqlite:///jobs/queue.db python3 worker.py --slots 2
+    JOB_BACKEND=redis://redis:6379/0 python3 worker.py
+
+Run several workers (processes or containers) against the same backend to
+scale out; each one claims jobs with the queue's priority and fair-share
+rules. Uploads, JOBS_DIR and the history files should live on storage
+shared with the Flask app so CSV paths, artifacts and estimates match.
+"""
+
+import os
+import sys
+import signal
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from job_backend import create_backend, JOB_BACKEND
+from job_queue import JobQueue
+from job_runtime import CANCELLED_EXIT_CODE
+from job_runner import run_automation_job, request_job_cancel, step_history, credential_pool, admission
+from job_admission import chain_gates, ADMISSION_ENABLED
+from job_concurrency import AIMDController, AIMD_ENABLED, AIMD_MAX_CONCURRENCY
+from job_retention import RetentionSweeper
+from portal_guard import portal_guard, job_gate
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# Jobs run at once by one worker
+WORKER_SLOTS = int(os.environ.get('WORKER_SLOTS', 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Portaliano automation worker')
+    parser.add_argument('--backend', default=JOB_BACKEND, help='Job queue backend (sqlite:///path or redis://host:port/db)')
+    parser.add_argument('--slots', type=int, default=WORKER_SLOTS, help='Jobs run at once by this worker')
+    parser.add_argument('--worker-id', default=None, help='Name shown in /workers (default: host-pid)')
+    args = parser.parse_args()
+
+    backend = create_backend(args.backend)
+    if not backend.shared:
+        print("❌ worker.py needs a shared backend, e.g. --backend sqlite:///jobs/queue.db")
+        sys.exit(1)
+
+    # With AIMD, --slots is the starting limit and the pool covers the ceiling
+    concurrency = AIMDController(step_history, initial=args.slots) if AIMD_ENABLED else None
+    executor = ThreadPoolExecutor(max_workers=max(args.slots, AIMD_MAX_CONCURRENCY) if AIMD_ENABLED else args.slots)
+    job_queue = JobQueue(executor, run_automation_job, max_running=args.slots,
+                         canceller=request_job_cancel, cancelled_exit_code=CANCELLED_EXIT_CODE,
+                         backend=backend, worker_id=args.worker_id,
+                         gate=chain_gates(job_gate, admission.gate if ADMISSION_ENABLED else None),
+                         concurrency=concurrency, credentials=credential_pool)
+    retention_sweeper = RetentionSweeper(job_queue.active_job_ids)
+    portal_guard.attach(backend)
+    if not credential_pool.accounts:
+        logger.warning("No portal accounts configured (PORTAL_ACCOUNTS or PORTAL_ACCOUNTS_FILE) - jobs will wait")
+
+    def shutdown(sig, frame):
+        logger.info("Shutdown requested - finishing running jobs")
+        job_queue.stop()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print(f"👷 Worker {job_queue.worker_id} started ({args.slots} slots, backend: {args.backend})")
+    job_queue.start()
+    retention_sweeper.start()
+
+    # Returns after a shutdown signal, once the running jobs have finished
+    job_queue.join()
+    retention_sweeper.stop()
+    executor.shutdown(wait=True)
+    print(f"👋 Worker {job_queue.worker_id} stopped")
+
+
+if __name__ == "__main__":
+    main()